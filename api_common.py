@@ -0,0 +1,339 @@
+"""
+Request parsing and response bodies shared by app.py (Flask) and asgi_app.py (FastAPI).
+
+The two apps differ only in how they do I/O (pymongo and threads vs Motor and the event loop).
+What a request must contain and what the client gets back is decided here, once, so the
+serving modes cannot drift apart. Helpers return plain bodies / (body, status, headers) tuples
+or raise Reject; each app registers a handler that turns a Reject into its JSON response.
+"""
+import json
+import os
+import re
+
+from auth import AuthError, get_token_service
+from feedback_export import FEEDBACK_PAGE_SIZE, decode_cursor, export_csv, export_ndjson, parse_time, serialize
+from feedback_pipeline import FeedbackBackpressure, feedback_document
+from treatment_cache import treatment_cache_key
+from upstream_client import UpstreamUnavailable
+from your_gemini_util import build_treatment_prompt
+
+# Most prescriptions one bulk download may render; every item is a full layout pass
+PDF_BULK_MAX_ITEMS = int(os.getenv("PDF_BULK_MAX_ITEMS", "50"))
+
+BULK_FORMATS = {
+    "pdf": ("application/pdf", "prescriptions.pdf"),
+    "zip": ("application/zip", "prescriptions.zip"),
+}
+STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+class Reject(Exception):
+    """Short-circuits a handler with a JSON body; both apps render it with the given status."""
+
+    def __init__(self, status, body, headers=None):
+        super().__init__(status, body)
+        self.status, self.body, self.headers = status, body, headers
+
+
+def busy():
+    return Reject(503, {"message": "Server busy, please retry"}, {"Retry-After": "1"})
+
+
+# === Request bodies ===
+def json_object(data):
+    """The decoded body if it is a JSON object; anything else (including unparsable JSON) is a 400."""
+    if not isinstance(data, dict):
+        raise Reject(400, {"message": "Invalid JSON body"})
+    return data
+
+
+def string_fields(data, names, message):
+    """The named fields as a tuple, all of which must be strings; a 400 carrying `message` otherwise."""
+    values = tuple(data.get(name) for name in names)
+    if not all(isinstance(value, str) for value in values):
+        raise Reject(400, {"message": message})
+    return values
+
+
+# === Auth ===
+def verification_email(code):
+    return "🔐 Your Verification Code", f"Your verification code is {code}. It will expire in 10 minutes."
+
+
+def login_code_email(code):
+    return "Your MEDICA Verification Code", f"Your verification code is: {code}"
+
+
+def reset_code_email(code):
+    return "MEDICA Password Reset Code", f"Your password reset code is: {code}"
+
+
+def requested_email(data):
+    email = data.get("email")
+    if not isinstance(email, str) or not email.strip():
+        raise Reject(400, {"error": "Email is required"})
+    return email
+
+
+def stored_hash(user):
+    """The password hash from get_credentials(), or the 401 for a missing user / unusable record."""
+    if not user:
+        raise Reject(401, {"message": "User not found"})
+    password_hash = user.get("password")
+    if not password_hash or not isinstance(password_hash, str):
+        raise Reject(401, {"message": "Invalid credentials"})
+    return password_hash
+
+
+def token_pair(email):
+    tokens = get_token_service()
+    return {"token": tokens.issue_access_token(email), "refresh_token": tokens.issue_refresh_token(email)}
+
+
+def login_code_rejection(status, verified):
+    """Why a login code was not accepted; `verified` is users.is_verified (None when there is no user)."""
+    if verified is None:
+        return Reject(404, {"message": "User not found"})
+    if verified:
+        # Verified users get their tokens from login-step1 (password); a code is not a password
+        return Reject(400, {"message": "Already verified"})
+    if status == "expired":
+        return Reject(401, {"message": "Code expired"})
+    return Reject(401, {"message": "Invalid verification code"})
+
+
+def reset_code_rejection(status, user_exists):
+    if not user_exists:
+        return Reject(404, {"message": "User not found"})
+    if status == "expired":
+        return Reject(401, {"message": "Reset code expired"})
+    return Reject(401, {"message": "Invalid reset code"})
+
+
+def refreshed_tokens(data):
+    """New access + refresh tokens for a valid refresh token (no database access involved)."""
+    token = data.get("refresh_token")
+    if not isinstance(token, str):
+        raise Reject(400, {"message": "refresh_token is required"})
+    try:
+        claims = get_token_service().verify(token, expected_type="refresh")
+    except AuthError as e:
+        raise Reject(401, {"message": str(e)})
+    return token_pair(claims["sub"])
+
+
+# === Prediction ===
+def prediction_failure(error, label):
+    """(body, status) for a failed prediction: 503 while the upstream is unavailable, 500 otherwise."""
+    if isinstance(error, UpstreamUnavailable):
+        print(f"❌ {label} unavailable:", str(error))
+        return {"error": str(error)}, 503
+    print(f"❌ {label} error:", str(error))
+    return {"error": str(error)}, 500
+
+
+def cache_hit_headers(tier):
+    return {"X-Cache": f"HIT-{tier.upper()}"}
+
+
+def session_body(session, result):
+    return {**session.describe(), "result": result}
+
+
+def session_not_found():
+    return Reject(404, {"error": "Prediction session not found or expired"})
+
+
+# === Treatment ===
+def patient_fields(data):
+    """(disease, symptoms, age, blood_group, duration); disease, symptoms and age are required."""
+    disease = data.get("disease", "")
+    disease = disease.strip() if isinstance(disease, str) else ""
+    symptoms = data.get("symptoms", [])
+    age = data.get("age")
+    if not disease or not symptoms or not age:
+        raise Reject(400, {"error": "Missing required patient information"})
+    return disease, symptoms, age, data.get("blood_group", ""), data.get("duration")
+
+
+def treatment_request(fields):
+    """(prompt, cache_key) for the fields returned by patient_fields()."""
+    disease, symptoms, age, blood_group, duration = fields
+    return (build_treatment_prompt(disease, age, blood_group, symptoms, duration),
+            treatment_cache_key(disease, age, blood_group, symptoms, duration))
+
+
+def annotate_plan(medication_store, treatment_data):
+    """Add intake/timing to every medication of a plan from the live pattern catalog."""
+    for med in treatment_data.get("medications", []):
+        medication_store.annotate(med)
+    return treatment_data
+
+
+def prescription(fields, treatment_data):
+    disease, symptoms, age, blood_group, duration = fields
+    return {
+        "disease": disease,
+        "age": age,
+        "symptoms": symptoms,
+        "blood_group": blood_group,
+        "duration": duration,
+        "treatment": treatment_data
+    }
+
+
+def event(kind, payload):
+    """One NDJSON line of the streamed treatment plan."""
+    return json.dumps({"type": kind, "data": payload}) + "\n"
+
+
+def closing_events(fields, treatment_data):
+    """The events after the medications: lifestyle, followup and the final "done" prescription."""
+    yield event("lifestyle", treatment_data.get("lifestyle", []))
+    yield event("followup", treatment_data.get("followup", ""))
+    yield event("done", prescription(fields, treatment_data))
+
+
+# === Prescription PDFs ===
+def bulk_request(data):
+    """(prescriptions, format) of a bulk download body; item contents are checked by bulk_items()."""
+    prescriptions = data.get("prescriptions")
+    output_format = data.get("format", "pdf")
+    if not isinstance(prescriptions, list) or not prescriptions:
+        raise Reject(400, {"error": "prescriptions must be a non-empty list"})
+    if len(prescriptions) > PDF_BULK_MAX_ITEMS:
+        raise Reject(400, {"error": f"At most {PDF_BULK_MAX_ITEMS} prescriptions per download"})
+    if output_format not in BULK_FORMATS:
+        raise Reject(400, {"error": "format must be 'pdf' or 'zip'"})
+    return prescriptions, output_format
+
+
+def bulk_items(renderer, prescriptions):
+    for i, item in enumerate(prescriptions):
+        error = renderer.validation_error(item)
+        if error:
+            raise Reject(400, {"error": f"prescriptions[{i}] {error}"})
+
+
+def render_bulk(renderer, prescriptions, output_format, output):
+    """Render into `output`; returns (mimetype, download_name)."""
+    if output_format == "zip":
+        renderer.render_zip(prescriptions, output)
+    else:
+        renderer.render(prescriptions, output)
+    return BULK_FORMATS[output_format]
+
+
+# === Stats / health ===
+def treatment_cache_stats(cache):
+    if not cache:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+def prediction_cache_stats(cache, flight):
+    if not cache:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats(), "in_flight": flight.in_flight()}
+
+
+def readiness(warmup):
+    """Readiness probe body and status: 503 until the warm-up's required steps have finished."""
+    status = warmup.status()
+    return status, 200 if status["ready"] else 503
+
+
+# === Feedback ===
+def _submit(pipeline, document, timeout):
+    if timeout is None:
+        pipeline.submit(document)
+    else:
+        pipeline.submit(document, timeout=timeout)
+
+
+def store_feedback(pipeline, data, timeout=None):
+    """/api/feedback: (body, status, headers). `timeout` overrides how long a full buffer may block."""
+    try:
+        feedback = feedback_document(data, "feedback", require_contact=True)
+    except ValueError as e:
+        return {'error': str(e)}, 400, {}
+    try:
+        _submit(pipeline, feedback, timeout)
+        return {'success': True, 'message': 'Feedback submitted successfully'}, 200, {}
+    except FeedbackBackpressure as e:
+        return {'error': 'Failed to store feedback', 'details': str(e)}, 503, {'Retry-After': '1'}
+
+
+def submit_feedback(pipeline, data, timeout=None):
+    """/api/submit-feedback: (body, status, headers), same contract as store_feedback()."""
+    try:
+        feedback = feedback_document(data, "submit-feedback")
+    except ValueError as e:
+        return {"success": False, "message": str(e)}, 400, {}
+    try:
+        _submit(pipeline, feedback, timeout)
+        return {"success": True, "message": "Feedback submitted successfully"}, 200, {}
+    except FeedbackBackpressure:
+        return {"success": False, "message": "Too much feedback right now, please retry"}, 503, {"Retry-After": "1"}
+
+
+# === Admin: Medication Patterns ===
+_PATTERN_RE = re.compile(r"^\S+-\S+-\S+( \S.*)?$")
+
+
+def medication_pattern(data):
+    """The "pattern" of a catalog edit: an intake like "1-0-1", optionally followed by the timing."""
+    pattern = data.get("pattern")
+    pattern = pattern.strip() if isinstance(pattern, str) else ""
+    if not _PATTERN_RE.match(pattern):
+        raise Reject(400, {"error": "pattern must look like '1-0-1 after food'"})
+    return pattern
+
+
+def pattern_not_found():
+    return Reject(404, {"error": "Medication pattern not found"})
+
+
+# === Admin: Feedback Read API ===
+def feedback_filters(args):
+    """since (inclusive) / until (exclusive) as ISO dates or datetimes, plus an optional source."""
+    try:
+        return {
+            "since": parse_time(args.get("since")),
+            "until": parse_time(args.get("until")),
+            "source": args.get("source") or None,
+        }
+    except ValueError as e:
+        raise Reject(400, {"error": str(e)})
+
+
+def page_params(args):
+    """(after, limit) for one page of the feedback listing."""
+    try:
+        after = decode_cursor(args["cursor"]) if args.get("cursor") else None
+        return after, int(args.get("limit", FEEDBACK_PAGE_SIZE))
+    except ValueError as e:
+        raise Reject(400, {"error": str(e)})
+
+
+def feedback_page(docs, next_cursor):
+    return {"items": [serialize(doc) for doc in docs], "next_cursor": next_cursor}
+
+
+def export_format(args):
+    output_format = args.get("format", "ndjson")
+    if output_format not in ("ndjson", "csv"):
+        raise Reject(400, {"error": "format must be 'ndjson' or 'csv'"})
+    return output_format
+
+
+def export_stream(docs, output_format):
+    """(chunks, mimetype, headers) streaming `docs` as NDJSON or CSV."""
+    if output_format == "csv":
+        body, mimetype = export_csv(docs), "text/csv"
+    else:
+        body, mimetype = export_ndjson(docs), "application/x-ndjson"
+    return body, mimetype, {
+        "Content-Disposition": f'attachment; filename="feedback-export.{output_format}"',
+        "X-Accel-Buffering": "no",
+    }
@@ -1,20 +1,30 @@
 import os
-import requests
-import random
-from flask import Flask, request, jsonify, send_file
+import tempfile
+from flask import Flask, g, request, jsonify, send_file, Response, stream_with_context
 from flask_cors import CORS
-from flask_mail import Mail, Message
-from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 from pathlib import Path
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from pymongo import MongoClient
-from werkzeug.security import generate_password_hash, check_password_hash
-import jwt
 
-from medication_patterns import default_patterns
-from your_gemini_util import fetch_gemini_response 
+from medication_store import MedicationPatternStore
+from email_queue import EmailQueue
+from db_bootstrap import create_mongo_client, ensure_indexes
+from user_repository import UserRepository
+from password_hasher import PasswordHashingBusy, get_password_hasher
+from auth import get_token_service, require_admin, require_auth
+from rate_limit import init_rate_limiter, rate_limit
+from your_gemini_util import fetch_gemini_response_coalesced, get_gemini_client, stream_treatment_plan
+from upstream_client import get_upstream_client
+from local_predictor import PREDICTION_MODE, get_local_predictor
+from prediction_batcher import get_prediction_batcher
+from treatment_cache import TreatmentCache, TREATMENT_CACHE_ENABLED
+from prediction_cache import (PredictionCache, prediction_cache_key, PREDICTION_CACHE_ENABLED,
+                              PREDICTION_CACHE_SHARED)
+from prediction_session import PredictionSessionStore, parse_session_delta, parse_session_payload
+from single_flight import SingleFlight
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, render_latest, request_finished, request_started
+from warmup import WarmUp
+from feedback_pipeline import FeedbackPipeline
+from feedback_export import daily_counts, fetch_page, iter_feedback, rebuild_daily_counts
 
 # Temporary storage for prescriptions (you may replace with DB)
 # This is currently unused, but keeping it in case it's for future use.
@@ -24,6 +34,16 @@ PRESCRIPTIONS = {}
 env_path = Path(__file__).parent / '.env'
 load_dotenv(dotenv_path=env_path)
 
+# Request parsing and response bodies shared with asgi_app.py (reads PDF_BULK_MAX_ITEMS from the env)
+import api_common
+from api_common import (Reject, annotate_plan, bulk_items, bulk_request, busy, cache_hit_headers, closing_events,
+                        event, export_format, export_stream, feedback_filters, feedback_page, json_object,
+                        login_code_email, login_code_rejection, medication_pattern, page_params, patient_fields,
+                        pattern_not_found, prediction_failure, prescription, refreshed_tokens, render_bulk,
+                        requested_email, reset_code_email, reset_code_rejection, session_body, session_not_found,
+                        STREAM_HEADERS, stored_hash, string_fields, token_pair, treatment_request,
+                        verification_email)
+
 
 # === Flask Setup ===
 app = Flask(__name__)
@@ -33,10 +53,28 @@ CORS(app, origins=["https://medica3.netlify.app"], supports_credentials=True)
 
 
 @app.before_request
-def log_request_info():
-    print(f"➡️ {request.method} {request.path}")
-    if request.method == 'OPTIONS':
-        print("🔄 Handling preflight OPTIONS request")
+def start_request_timer():
+    g.metrics_route = request.url_rule.rule if request.url_rule else "unmatched"
+    g.metrics_started = request_started(g.metrics_route)
+
+
+@app.after_request
+def record_request_metrics(response):
+    # Streamed responses are timed to their first byte; the body is produced after this hook
+    if getattr(g, "metrics_started", None) is not None:
+        request_finished(request.method, g.metrics_route, request.path, response.status_code, g.metrics_started)
+        g.metrics_started = None
+    return response
+
+
+@app.teardown_request
+def record_failed_request(exc):
+    if getattr(g, "metrics_started", None) is not None:
+        request_finished(request.method, g.metrics_route, request.path, 500, g.metrics_started)
+        g.metrics_started = None
+
+# Rendered PDFs above this size spill from memory to an anonymous temp file
+PDF_SPOOL_MAX_BYTES = int(os.getenv("PDF_SPOOL_MAX_BYTES", str(5 * 1024 * 1024)))
 
 # === Mail Configuration ===
 app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "fallback-secret")
@@ -44,77 +82,100 @@ app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "fallback-secret")
 
 # === MongoDB Setup ===
 mongo_uri = os.getenv("MONGO_URI")
-client = MongoClient(mongo_uri)
+client = create_mongo_client(mongo_uri)
 db = client["medicalDB"]
-users_collection = db["users"]
-feedback_collection = db["feedbacks"]   
+user_repo = UserRepository(db)
+init_rate_limiter(db)
+treatment_cache = TreatmentCache(db["treatment_cache"]) if TREATMENT_CACHE_ENABLED else None
+prediction_cache = (PredictionCache(db["prediction_cache"] if PREDICTION_CACHE_SHARED else None)
+                    if PREDICTION_CACHE_ENABLED else None)
+# Identical predictions already in flight in this worker wait for that call instead of repeating it
+prediction_flight = SingleFlight()
+prediction_sessions = PredictionSessionStore()
+medication_store = MedicationPatternStore(db["medication_patterns"])
+email_queue = EmailQueue(db["email_jobs"])
+# Feedback is buffered and bulk-inserted by a background writer (see feedback_pipeline.py)
+feedback_pipeline = FeedbackPipeline(db["feedbacks"], rollup=db["feedback_daily"])
+
+
+def get_prescription_renderer():
+    """ReportLab is imported on the first PDF request (or by the warm-up), not at startup."""
+    from prescription_pdf import prescription_renderer
+    return prescription_renderer
+
+
+def bootstrap_indexes():
+    # Idempotent: unique users.email, TTL-expired OTP codes, feedback indexes
+    failed = ensure_indexes(db)
+    if failed:
+        raise RuntimeError(f"{len(failed)} index(es) could not be created")
+
+
+# === Warm-up ===
+# Nothing above touches the network or loads a heavy library, so importing this module is fast.
+# Mongo bootstrap, the medication catalog, email workers, ReportLab, Gemini and (in local mode)
+# the ML artifacts load in a background thread; /api/ready reports when they are done.
+warmup = WarmUp()
+warmup.add("mongo", lambda: client.admin.command("ping"), required=True)
+if PREDICTION_MODE in ("local", "local-fallback"):
+    warmup.add("local_model", get_local_predictor, required=PREDICTION_MODE == "local")
+# Required: registration relies on users.email_unique to reject duplicate accounts
+warmup.add("indexes", bootstrap_indexes, required=True)
+warmup.add("medication_patterns", medication_store.start)
+warmup.add("email_queue", email_queue.start)
+warmup.add("password_hasher", lambda: get_password_hasher().start())
+warmup.add("pdf", get_prescription_renderer)
+warmup.add("gemini", lambda: get_gemini_client().model)
+warmup.start()
 
-# === Utility: Send Email ===
+
+@app.before_request
+def ensure_warmup_started():
+    # No-op after the first call; restarts the thread in workers forked after import
+    warmup.start()
+
+# === Utility: Issue Tokens ===
 def generate_jwt(email):
-    secret = app.config.get("SECRET_KEY")
-    if not secret:
-        raise ValueError("SECRET_KEY not set in environment")
-    payload = {"email": email, "exp": datetime.utcnow() + timedelta(hours=2)}
-    token = jwt.encode(payload, secret, algorithm="HS256")
-    return token
+    return get_token_service().issue_access_token(email)
+
+
+def generate_refresh_token(email):
+    return get_token_service().issue_refresh_token(email)
+
 
+# === Request helpers ===
+# What each route accepts and answers is decided in api_common.py, shared with asgi_app.py
+@app.errorhandler(Reject)
+def rejected(e):
+    return jsonify(e.body), e.status, e.headers or {}
+
+
+def json_body():
+    return json_object(request.get_json(force=True, silent=True))
 
-def generate_code():
-    return str(random.randint(100000, 999999))
 
 # === Utility function for sending emails ===
-# === Utility function for sending emails via SendGrid API ===
+# Emails are queued in Mongo and delivered by background workers (see email_queue.py)
 def send_email(subject, recipient, body):
-    import os
-    import requests
-
     try:
-        url = "https://api.sendgrid.com/v3/mail/send"
-        headers = {
-            "Authorization": f"Bearer {os.getenv('SENDGRID_API_KEY')}",
-            "Content-Type": "application/json"
-        }
-        data = {
-            "personalizations": [{
-                "to": [{"email": recipient}],
-                "subject": subject
-            }],
-            "from": {"email": os.getenv("FROM_EMAIL")},
-            "content": [{
-                "type": "text/plain",
-                "value": body
-            }]
-        }
-        response = requests.post(url, headers=headers, json=data)
-        print(f"SendGrid response: {response.status_code} {response.text}")
-
-        if response.status_code in [200, 202]:
-            print(f"✅ Email sent to {recipient}")
-            return True
-        else:
-            print(f"❌ Email send failed: {response.status_code}, {response.text}")
-            return False
+        email_queue.enqueue(subject, recipient, body)
+        print(f"📨 Email to {recipient} queued")
+        return True
     except Exception as e:
-        print("❌ SendGrid email error:", e)
+        print("❌ Email enqueue error:", e)
         return False
 
 
 # === Send Verification Code ===
 @app.route("/api/send-verification-code", methods=["POST"])
+@rate_limit("email")
 def send_verification_code():
-    data = request.json
-    user_email = data.get("email")
-    if not isinstance(user_email, str) or not user_email.strip():
-        return jsonify({"error": "Email is required"}), 400
-
-    code = generate_code()
-    users_collection.update_one(
-        {"email": user_email},
-        {"$set": {"verification_code": code, "code_expiry": datetime.utcnow() + timedelta(minutes=10)}},
-        upsert=True
-    )
-
-    if send_email("🔐 Your Verification Code", user_email, f"Your verification code is {code}. It will expire in 10 minutes."):
+    user_email = requested_email(json_body())
+
+    code = user_repo.issue_code(user_email, "verify")
+
+    subject, body = verification_email(code)
+    if send_email(subject, user_email, body):
         return jsonify({"message": "Verification code sent successfully"})
     else:
         return jsonify({"error": "Failed to send verification code"}), 500
@@ -122,61 +183,53 @@ def send_verification_code():
 # === Register ===
 @app.route("/api/register", methods=["POST"])
 def register():
-    data = request.get_json(force=True)
-    email = data.get("email")
-    password = data.get("password")
+    email, password = string_fields(json_body(), ("email", "password"), "Missing or invalid email/password")
 
-    if not isinstance(email, str) or not isinstance(password, str):
-        return jsonify({"message": "Missing or invalid email/password"}), 400
-
-    if users_collection.find_one({"email": email}):
+    # Cheap pre-check (and no hash spent on a taken email); the unique index on users.email,
+    # required for readiness, closes the race between this check and the insert
+    if user_repo.exists(email):
         return jsonify({"message": "User already exists"}), 400
 
-    hashed_password = generate_password_hash(password)
-    users_collection.insert_one({
-        "email": email,
-        "password": hashed_password,
-        "is_verified": False
-    })
+    try:
+        hashed_password = get_password_hasher().hash(password)
+    except PasswordHashingBusy:
+        raise busy()
+    if not user_repo.create(email, hashed_password):
+        return jsonify({"message": "User already exists"}), 400
     return jsonify({"message": "Registration successful"}), 201
 
 # === Login Step 1 ===
 @app.route("/api/login-step1", methods=["POST"])
+@rate_limit("email")
 def login_step1():
     try:
-        data = request.get_json(force=True)
-        email = data.get("email")
-        password = data.get("password")
-
-        if not isinstance(email, str) or not isinstance(password, str):
-            return jsonify({"message": "Email and password must be strings"}), 400
-
-        user = users_collection.find_one({"email": email})
-        if not user:
-            return jsonify({"message": "User not found"}), 401
-
-        stored_password = user.get("password")
-        if not stored_password:
-            return jsonify({"message": "Invalid credentials"}), 401
-        
-        if not isinstance(stored_password, str):
-            return jsonify({"message": "Invalid credentials"}), 401
-
-        if not check_password_hash(stored_password, password):
+        email, password = string_fields(json_body(), ("email", "password"), "Email and password must be strings")
+        user = user_repo.get_credentials(email)
+        stored_password = stored_hash(user)
+
+        try:
+            matches, upgraded_hash = get_password_hasher().verify(stored_password, password)
+        except PasswordHashingBusy:
+            raise busy()
+        if not matches:
             return jsonify({"message": "Invalid credentials"}), 401
+        if upgraded_hash:
+            # Stored with outdated parameters: swap in the new hash unless the password changed meanwhile
+            try:
+                user_repo.set_password(email, upgraded_hash, expected_hash=stored_password)
+            except Exception as e:
+                print(f"⚠️ Password rehash for {email} failed: {e}")
 
         if user.get("is_verified", False):
-            token = generate_jwt(email)
-            return jsonify({"token": token}), 200
+            return jsonify(token_pair(email)), 200
 
         # Send verification code
-        code = generate_code()
-        users_collection.update_one(
-            {"email": email},
-            {"$set": {"verification_code": code, "code_expiry": datetime.utcnow() + timedelta(minutes=10)}}
-        )
-        send_email("Your MEDICA Verification Code", email, f"Your verification code is: {code}")
+        code = user_repo.issue_code(email, "verify")
+        subject, body = login_code_email(code)
+        send_email(subject, email, body)
         return jsonify({"step": 2}), 200
+    except Reject:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -187,58 +240,42 @@ def login_step1():
 @app.route("/api/login-step2", methods=["POST"])
 def login_step2():
     try:
-        data = request.get_json(force=True)
-        email = data.get("email")
-        code = data.get("code")
-
-        if not isinstance(email, str) or not isinstance(code, str):
-            return jsonify({"message": "Email and code must be strings"}), 400
+        email, code = string_fields(json_body(), ("email", "code"), "Email and code must be strings")
 
-        user = users_collection.find_one({"email": email})
-        if not user:
+        # Hot path: consume the code and flag the user in two atomic writes
+        status = user_repo.verify_with_code(email, code)
+        if status == "missing":
             return jsonify({"message": "User not found"}), 404
-
-        if user.get("is_verified", False):
-            token = generate_jwt(email)
-            return jsonify({"message": "Already verified", "token": token}), 200
-
-        if user.get("verification_code") != code:
-            return jsonify({"message": "Invalid verification code"}), 401
-
-        if datetime.utcnow() > user.get("code_expiry", datetime.utcnow()):
-            return jsonify({"message": "Code expired"}), 401
-
-        users_collection.update_one(
-            {"email": email},
-            {"$unset": {"verification_code": "", "code_expiry": ""},
-             "$set": {"is_verified": True}}
-        )
-        token = generate_jwt(email)
-        return jsonify({"message": "Login successful", "token": token}), 200
+        if status != "ok":
+            raise login_code_rejection(status, user_repo.is_verified(email))
+        return jsonify({"message": "Login successful", **token_pair(email)}), 200
+    except Reject:
+        raise
     except Exception as e:
         print("Error in login-step2:", e)
         return jsonify({"message": "Login step 2 failed", "error": str(e)}), 500
 
+# === Refresh Access Token ===
+@app.route("/api/token/refresh", methods=["POST"])
+def refresh_token():
+    return jsonify(refreshed_tokens(json_body())), 200
+
 # === Send Reset Code ===
 @app.route("/api/send-reset-code", methods=["POST"])
+@rate_limit("email")
 def send_reset_code():
     try:
-        data = request.get_json(force=True)
-        email = data.get("email")
-        if not isinstance(email, str):
-            return jsonify({"message": "Invalid email"}), 400
+        email, = string_fields(json_body(), ("email",), "Invalid email")
 
-        user = users_collection.find_one({"email": email})
-        if not user:
+        if not user_repo.exists(email):
             return jsonify({"message": "User not found"}), 404
 
-        code = generate_code()
-        users_collection.update_one(
-            {"email": email},
-            {"$set": {"reset_code": code, "reset_expiry": datetime.utcnow() + timedelta(minutes=10)}}
-        )
-        send_email("MEDICA Password Reset Code", email, f"Your password reset code is: {code}")
+        code = user_repo.issue_code(email, "reset")
+        subject, body = reset_code_email(code)
+        send_email(subject, email, body)
         return jsonify({"message": "Reset code sent"}), 200
+    except Reject:
+        raise
     except Exception as e:
         print("Error in send-reset-code:", e)
         return jsonify({"message": "Internal Server Error"}), 500
@@ -247,252 +284,397 @@ def send_reset_code():
 @app.route("/api/reset-password", methods=["POST"])
 def reset_password():
     try:
-        data = request.get_json(force=True)
-        email = data.get("email")
-        code = data.get("code")
-        new_password = data.get("newPassword")
-
-        if not all(isinstance(x, str) for x in [email, code, new_password]):
-            return jsonify({"message": "Invalid input"}), 400
-
-        user = users_collection.find_one({"email": email})
-        if not user:
+        email, code, new_password = string_fields(json_body(), ("email", "code", "newPassword"), "Invalid input")
+
+        # Check the code without spending it, hash, and only then consume it atomically:
+        # a busy 503 leaves the code usable for the retry, and a concurrent reset loses the consume
+        status = user_repo.check_code(email, "reset", code)
+        if status == "ok":
+            try:
+                hashed_password = get_password_hasher().hash(new_password)
+            except PasswordHashingBusy:
+                raise busy()
+            status = user_repo.consume_code(email, "reset", code)
+        if status != "ok":
+            raise reset_code_rejection(status, user_repo.exists(email))
+
+        if not user_repo.set_password(email, hashed_password):
             return jsonify({"message": "User not found"}), 404
-
-        if user.get("reset_code") != code:
-            return jsonify({"message": "Invalid reset code"}), 401
-
-        if datetime.utcnow() > user.get("reset_expiry", datetime.utcnow()):
-            return jsonify({"message": "Reset code expired"}), 401
-
-        hashed_password = generate_password_hash(new_password)
-        users_collection.update_one(
-            {"email": email},
-            {"$set": {"password": hashed_password},
-             "$unset": {"reset_code": "", "reset_expiry": ""}}
-        )
         return jsonify({"message": "Password reset successful"}), 200
+    except Reject:
+        raise
     except Exception as e:
         print("Error in reset-password:", e)
         return jsonify({"message": "Failed to reset password", "error": str(e)}), 500
 
 
-# === Proxy to Hugging Face for Prediction ===
-@app.route("/predict", methods=["POST"])
-def predict():
+# === Prediction Dispatch (local / remote / local-fallback) ===
+def run_prediction(path, data):
+    """
+    Score `data` according to PREDICTION_MODE and return (body, status_code).
+    `path` is the Hugging Face route used for remote scoring ("/predict" or "/repredict").
+    """
+    if PREDICTION_MODE in ("local", "local-fallback"):
+        try:
+            return get_prediction_batcher().predict(data), 200
+        except Exception as e:
+            if PREDICTION_MODE == "local":
+                raise
+            print(f"⚠️ Local prediction failed, falling back to Hugging Face: {e}")
+
+    response = get_upstream_client().post(path, data)
+    return response.json(), response.status_code
+
+
+def cached_prediction(path, data):
+    """
+    run_prediction behind the prediction cache. Returns (body, status, headers); headers carry
+    X-Cache: HIT-LOCAL, HIT-SHARED or MISS whenever the payload was looked up.
+    """
+    key = prediction_cache_key(path, data) if prediction_cache else None
+    if key is None:
+        body, status = run_prediction(path, data)
+        return body, status, {}
+
+    body, tier = prediction_cache.get(key)
+    if body is not None:
+        return body, 200, cache_hit_headers(tier)
+
+    def call():
+        result = run_prediction(path, data)
+        prediction_cache.set(key, *result)
+        return result
+
+    body, status = prediction_flight.do(key, call)
+    return body, status, {"X-Cache": "MISS"}
+
+
+def proxy_prediction(path):
+    data = json_body()
     try:
-        data = request.get_json()
+        body, status, headers = cached_prediction(path, data)
+        return jsonify(body), status, headers
+    except Exception as e:
+        body, status = prediction_failure(e, f"Hugging Face {path} proxy")
+        return jsonify(body), status
 
-        # Always forward to Hugging Face model
-        hf_url = "https://sampath563-medica-backend.hf.space/predict"
-        response = requests.post(hf_url, json=data)
-        return jsonify(response.json()), response.status_code
 
-    except Exception as e:
-        print("❌ Hugging Face proxy error:", str(e))
-        return jsonify({"error": str(e)}), 500
+# === Proxy to Hugging Face for Prediction ===
+@app.route("/predict", methods=["POST"])
+@require_auth
+@rate_limit("predict")
+def predict():
+    return proxy_prediction("/predict")
 
 # === Proxy to Hugging Face for Re-Prediction ===
 @app.route("/repredict", methods=["POST"])
+@require_auth
+@rate_limit("predict")
 def repredict():
+    return proxy_prediction("/repredict")
+
+
+# === Prediction Sessions (incremental symptom refinement) ===
+def score_session(session):
+    """
+    Score a session's current state; call with session.lock held. Local modes rescore the
+    held feature row in place; remote mode sends the rebuilt full payload through the cache.
+    """
+    if PREDICTION_MODE in ("local", "local-fallback"):
+        try:
+            return session.rescore_local(get_local_predictor()), 200, {}
+        except Exception as e:
+            if PREDICTION_MODE == "local":
+                raise
+            print(f"⚠️ Local session rescore failed, falling back to Hugging Face: {e}")
+            session.reset_local()
+    session.clear_delta()
+    return cached_prediction("/predict", session.payload())
+
+
+def session_response(session, delta=None):
+    """Apply `delta` (add, remove, vitals) and rescore under the session lock; unchanged state reuses the last result."""
+    with session.lock:
+        changed = session.apply(*delta) if delta else True
+        if changed or session.result is None:
+            session.result = None
+            try:
+                body, status, headers = score_session(session)
+            except Exception as e:
+                body, status = prediction_failure(e, "Prediction session")
+                return jsonify(body), status
+            if status == 200:
+                session.result = (body, status, headers)
+        else:
+            body, status, headers = session.result
+        return jsonify(session_body(session, body)), status, headers
+
+
+@app.route("/api/predict/session", methods=["POST"])
+@require_auth
+@rate_limit("predict")
+def open_prediction_session():
+    """Open a session with a full payload; later steps send only symptom/vital deltas."""
+    try:
+        symptoms, vitals, extra = parse_session_payload(json_body())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    session = prediction_sessions.create(g.user_id, symptoms, vitals, extra)
+    return session_response(session)
+
+
+@app.route("/api/predict/session/<session_id>", methods=["PATCH"])
+@require_auth
+@rate_limit("predict")
+def update_prediction_session(session_id):
+    """Apply {add_symptoms, remove_symptoms, <vitals>} and rescore only what changed."""
+    session = prediction_sessions.get(g.user_id, session_id)
+    if session is None:
+        raise session_not_found()
     try:
-        data = request.get_json()
+        delta = parse_session_delta(json_body())
+        response = session_response(session, delta)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    prediction_sessions.touch(g.user_id, session)
+    return response
 
-        # Forward request to Hugging Face /repredict
-        hf_url = "https://sampath563-medica-backend.hf.space/repredict"
-        response = requests.post(hf_url, json=data)
-        return jsonify(response.json()), response.status_code
 
-    except Exception as e:
-        print("❌ Hugging Face repredict proxy error:", str(e))
-        return jsonify({"error": str(e)}), 500
+@app.route("/api/predict/session/<session_id>", methods=["DELETE"])
+@require_auth
+def close_prediction_session(session_id):
+    if not prediction_sessions.delete(g.user_id, session_id):
+        raise session_not_found()
+    return jsonify({"message": "Session closed"}), 200
 
 
-# === Treatment Plan Generator ===
 # === Treatment Endpoint ===
 @app.route("/api/treatment", methods=["POST"])
+@require_auth
+@rate_limit("treatment")
 def generate_treatment():
     try:
-        
-
-        data = request.get_json()
-        disease = data.get("disease", "").strip()
-        symptoms = data.get("symptoms", [])
-        age = data.get("age")
-        blood_group = data.get("blood_group", "")
-        duration = data.get("duration")
-
-        if not disease or not symptoms or not age:
-            return jsonify({"error": "Missing required patient information"}), 400
-
-        # Construct prompt for Gemini
-        prompt = f"""
-You are an AI medical assistant.
-
-Patient Details:
-- Disease: {disease}
-- Age: {age}
-- Blood Group: {blood_group}
-- Symptoms: {', '.join(symptoms)}
-- Duration: {duration} days
-
-Instructions:
-1. Generate exactly 3 medications strictly based on the disease (ignore symptoms).
-2. Return a JSON ONLY with the format:
-{{
-  "medications": ["Medicine1", "Medicine2", "Medicine3"],
-  "lifestyle": ["point1", "point2", "point3"],
-  "followup": "short sentence about follow-up"
-}}
-3. Do NOT include any explanations or extra text.
-"""
-
-        treatment_data = fetch_gemini_response(prompt)  # Your Gemini fetch function
-
-        # Add intake/timing
-        normalized_patterns = {k.lower(): v for k, v in default_patterns.items()}
-        for med in treatment_data.get("medications", []):
-            med_name_lower = med["name"].lower()
-            if med_name_lower in normalized_patterns:
-                pattern = normalized_patterns[med_name_lower]
-                med["intake"] = pattern.split(' ')[0]
-                med["timing"] = ' '.join(pattern.split(' ')[1:])
-            else:
-                med["intake"] = "1-0-1"
-                med["timing"] = "after food"
+        fields = patient_fields(json_body())
+        prompt, cache_key = treatment_request(fields)
 
-        full_prescription = {
-            "disease": disease,
-            "age": age,
-            "symptoms": symptoms,
-            "blood_group": blood_group,
-            "duration": duration,
-            "treatment": treatment_data
-        }
+        treatment_data = treatment_cache.get(cache_key) if treatment_cache else None
+        if treatment_data is None:
+            # Identical concurrent requests share one Gemini call
+            treatment_data = fetch_gemini_response_coalesced(
+                cache_key, prompt,
+                on_result=(lambda plan: treatment_cache.set(cache_key, plan)) if treatment_cache else None,
+            )
 
-        return jsonify(full_prescription), 200
+        return jsonify(prescription(fields, annotate_plan(medication_store, treatment_data))), 200
 
+    except Reject:
+        raise
     except Exception as e:
         print(f"❌ Treatment endpoint error: {e}")
         return jsonify({"error": str(e)}), 500
 
 
+# === Streaming Treatment Endpoint (NDJSON) ===
+@app.route("/api/treatment/stream", methods=["POST"])
+@require_auth
+@rate_limit("treatment")
+def stream_treatment():
+    """
+    Streams the plan as newline-delimited JSON events:
+    {"type": "medication", "data": {...}} per medication as soon as Gemini emits it,
+    then "lifestyle", "followup", and a final "done" event carrying the full prescription.
+    """
+    fields = patient_fields(json_body())
+    prompt, cache_key = treatment_request(fields)
+
+    def generate():
+        try:
+            treatment_data = treatment_cache.get(cache_key) if treatment_cache else None
+            if treatment_data is not None:
+                for med in treatment_data.get("medications", []):
+                    yield event("medication", medication_store.annotate(med))
+            else:
+                for kind, item in stream_treatment_plan(prompt):
+                    if kind == "medication":
+                        yield event("medication", medication_store.annotate(item))
+                    else:
+                        treatment_data = item
+                if treatment_cache:
+                    treatment_cache.set(cache_key, treatment_data)
+                annotate_plan(medication_store, treatment_data)
+
+            yield from closing_events(fields, treatment_data)
+        except Exception as e:
+            print(f"❌ Treatment stream error: {e}")
+            yield event("error", str(e))
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson", headers=STREAM_HEADERS)
+
+
 @app.route("/api/treatment/download", methods=["POST"])
+@require_auth
+@rate_limit("pdf")
 def download_prescription():
     try:
-        data = request.get_json()
-        prescription = data  # expects full prescription JSON
-
-        filename = "prescription.pdf"
-        os.makedirs("prescriptions", exist_ok=True)
-        filepath = os.path.join("prescriptions", filename)
-
-        c = canvas.Canvas(filepath, pagesize=letter)
-        width, height = letter
-
-        c.setFont("Helvetica-Bold", 16)
-        c.drawString(100, height - 50, "Doctor’s Prescription")
-
-        y = height - 90
-        c.setFont("Helvetica", 12)
-        c.drawString(100, y, f"Disease: {prescription.get('disease', '')}")
-        y -= 20
-        c.drawString(100, y, f"Age: {prescription.get('age', '')}")
-        y -= 20
-        c.drawString(100, y, f"Blood Group: {prescription.get('blood_group', '')}")
-        y -= 20
-        c.drawString(100, y, f"Symptoms: {', '.join(prescription.get('symptoms', []))}")
-        y -= 20
-        c.drawString(100, y, f"Duration: {prescription.get('duration', '')} days")
-        y -= 30
-
-        c.setFont("Helvetica-Bold", 14)
-        c.drawString(100, y, "🩺 Medications:")
-        y -= 20
-        c.setFont("Helvetica", 12)
-        for med in prescription.get("treatment", {}).get("medications", []):
-            c.drawString(120, y, f"- {med['name']} ({med['intake']}, {med['timing']})")
-            y -= 20
-
-        y -= 10
-        c.setFont("Helvetica-Bold", 14)
-        c.drawString(100, y, "🍎 Lifestyle Recommendations:")
-        y -= 20
-        c.setFont("Helvetica", 12)
-        for life in prescription.get("treatment", {}).get("lifestyle", []):
-            c.drawString(120, y, f"- {life}")
-            y -= 20
-
-        y -= 10
-        c.setFont("Helvetica-Bold", 14)
-        c.drawString(100, y, "📅 Follow-up:")
-        y -= 20
-        c.setFont("Helvetica", 12)
-        c.drawString(120, y, prescription.get("treatment", {}).get("followup", ""))
-
-        c.save()
-
-        return send_file(filepath, as_attachment=True)
+        prescription = json_body()  # expects full prescription JSON
+
+        # Per-request buffer: stays in memory, spills to a private temp file only if large
+        output = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_BYTES)
 
+        get_prescription_renderer().render(prescription, output)
+        output.seek(0)
+
+        return send_file(
+            output,
+            mimetype="application/pdf",
+            as_attachment=True,
+            download_name="prescription.pdf",
+        )
+
+    except Reject:
+        raise
     except Exception as e:
         print(f"❌ Could not generate PDF: {e}")
         return jsonify({"error": "Could not generate PDF"}), 500
 
+@app.route("/api/treatment/download/bulk", methods=["POST"])
+@require_auth
+@rate_limit("pdf")
+def download_prescriptions_bulk():
+    """
+    Render many prescriptions at once.
+    Body: {"prescriptions": [...], "format": "pdf" | "zip"}; "pdf" puts them all in one
+    document (one prescription per page run), "zip" returns one PDF per prescription.
+    """
+    try:
+        prescriptions, output_format = bulk_request(json_body())
+        renderer = get_prescription_renderer()
+        bulk_items(renderer, prescriptions)
+
+        output = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_BYTES)
+        mimetype, download_name = render_bulk(renderer, prescriptions, output_format, output)
+        output.seek(0)
+
+        return send_file(output, mimetype=mimetype, as_attachment=True, download_name=download_name)
+
+    except Reject:
+        raise
+    except Exception as e:
+        print(f"❌ Could not generate bulk PDF: {e}")
+        return jsonify({"error": "Could not generate PDF"}), 500
+
+@app.route("/api/treatment/cache-stats", methods=["GET"])
+def treatment_cache_stats():
+    return jsonify(api_common.treatment_cache_stats(treatment_cache))
+
+
+@app.route("/api/predict/cache-stats", methods=["GET"])
+def prediction_cache_stats():
+    return jsonify(api_common.prediction_cache_stats(prediction_cache, prediction_flight))
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(render_latest(), mimetype=METRICS_CONTENT_TYPE)
+
 # === Health Check Endpoints ===
 @app.route("/api/ping-db", methods=["GET"])
 def ping_db():
     try:
-        count = users_collection.count_documents({})
+        count = user_repo.count()
         return jsonify({"message": "MongoDB connected ✅", "user_count": count})
     except Exception as e:
         return jsonify({"error": f"MongoDB connection failed: {str(e)}"}), 500
 
+
+@app.route("/api/ready", methods=["GET"])
+def readiness():
+    """Readiness probe: 503 until the warm-up's required steps have finished."""
+    status, code = api_common.readiness(warmup)
+    return jsonify(status), code
+
 @app.route('/api/feedback', methods=['POST'])
 def store_feedback():
-    data = request.json
-    name = data.get('name')
-    email = data.get('email')
-    message = data.get('message')
-    
-    if not name or not email or not message:
-        return jsonify({'error': 'Missing fields'}), 400
-
-    feedback_data = {
-        'name': name,
-        'email': email,
-        'message': message,
-        'timestamp': datetime.now()
-    }
-    
-    try:
-        feedback_collection.insert_one(feedback_data)
-        return jsonify({'success': True, 'message': 'Feedback submitted successfully'})
-    except Exception as e:
-        return jsonify({'error': 'Failed to store feedback', 'details': str(e)}), 500
+    body, status, headers = api_common.store_feedback(feedback_pipeline, json_body())
+    return jsonify(body), status, headers
 
 @app.route("/api/submit-feedback", methods=["POST"])
 def submit_feedback():
+    body, status, headers = api_common.submit_feedback(feedback_pipeline, json_body())
+    return jsonify(body), status, headers
+
+
+# === Admin: Feedback Read API ===
+@app.route("/api/admin/feedback", methods=["GET"])
+@require_admin
+def list_feedback():
+    """One page, newest first; pass the returned next_cursor to get the following page."""
+    filters = feedback_filters(request.args)
+    after, limit = page_params(request.args)
+
     try:
-        data = request.json
-        email = data.get("email", "anonymous")
-        message = data.get("message", "")
-        timestamp = datetime.utcnow()
+        docs, next_cursor = fetch_page(db["feedbacks"], limit=limit, after=after, **filters)
+    except Exception as e:
+        print(f"❌ Feedback listing failed: {e}")
+        return jsonify({"error": "Could not read feedback"}), 500
+    return jsonify(feedback_page(docs, next_cursor))
+
 
-        if not message:
-            return jsonify({"success": False, "message": "Feedback message is required"}), 400
+@app.route("/api/admin/feedback/export", methods=["GET"])
+@require_admin
+def export_feedback():
+    """Stream every matching row as NDJSON (default) or CSV without buffering the result set."""
+    output_format = export_format(request.args)
+    filters = feedback_filters(request.args)
 
-        feedback = {
-            "email": email,
-            "message": message,
-            "timestamp": timestamp
-        }
+    body, mimetype, headers = export_stream(iter_feedback(db["feedbacks"], **filters), output_format)
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
 
-        feedback_collection.insert_one(feedback)
-        return jsonify({"success": True, "message": "Feedback submitted successfully"}), 200
 
+@app.route("/api/admin/feedback/daily", methods=["GET"])
+@require_admin
+def feedback_daily():
+    """Per-day feedback counts from the feedback_daily rollup (no scan of the raw collection)."""
+    filters = feedback_filters(request.args)
+    try:
+        days = daily_counts(db["feedback_daily"], filters["since"], filters["until"])
+    except Exception as e:
+        print(f"❌ Feedback daily counts failed: {e}")
+        return jsonify({"error": "Could not read feedback counts"}), 500
+    return jsonify({"days": days})
+
+
+@app.route("/api/admin/feedback/daily/rebuild", methods=["POST"])
+@require_admin
+def rebuild_feedback_daily():
+    """Recompute the rollup from raw feedback, e.g. to backfill rows stored before it existed."""
+    filters = feedback_filters(request.args)
+    try:
+        rebuilt = rebuild_daily_counts(db["feedbacks"], db["feedback_daily"], filters["since"], filters["until"])
     except Exception as e:
-        print("Error saving feedback:", e)
-        return jsonify({"success": False, "message": "Internal Server Error"}), 500
+        print(f"❌ Feedback rollup rebuild failed: {e}")
+        return jsonify({"error": "Could not rebuild feedback counts"}), 500
+    return jsonify({"rebuilt_days": rebuilt})
+
+# === Admin: Medication Patterns ===
+# Edits go through the store so every worker's poller picks them up; this worker swaps at once
+@app.route("/api/admin/medication-patterns/<name>", methods=["PUT"])
+@require_admin
+def set_medication_pattern(name):
+    """Body: {"pattern": "1-0-1 after food"}; creates or replaces the dosing pattern for `name`."""
+    pattern = medication_pattern(json_body())
+    medication_store.set_pattern(name, pattern)
+    medication_store.refresh()
+    return jsonify({"name": name, "pattern": pattern})
+
+
+@app.route("/api/admin/medication-patterns/<name>", methods=["DELETE"])
+@require_admin
+def delete_medication_pattern(name):
+    if not medication_store.delete_pattern(name):
+        raise pattern_not_found()
+    medication_store.refresh()
+    return jsonify({"message": "Pattern deleted"})
 
 # === Main Entrypoint ===
 if __name__ == '__main__':
@@ -0,0 +1,734 @@
+"""
+ASGI serving mode: the same routes and JSON contracts as app.py, served by FastAPI/uvicorn.
+
+Upstream I/O is awaited instead of parking a worker thread: Hugging Face through a pooled
+httpx.AsyncClient, Gemini through generate_content_async, and request-path Mongo queries
+through Motor. CPU-bound work (password hashing, PDF rendering) runs in the threadpool, and
+the background subsystems (email workers, medication catalog poller) are shared with app.py.
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000 --workers 2
+"""
+import asyncio
+import io
+import os
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import Match
+
+# === Load Environment Variables ===
+env_path = Path(__file__).parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+import api_common
+from api_common import (Reject, annotate_plan, bulk_items, bulk_request, busy, cache_hit_headers, closing_events,
+                        event, export_format, export_stream, feedback_filters, feedback_page, json_object,
+                        login_code_email, login_code_rejection, medication_pattern, page_params, patient_fields,
+                        pattern_not_found, prediction_failure, prescription, refreshed_tokens, render_bulk,
+                        requested_email, reset_code_email, reset_code_rejection, session_body, session_not_found,
+                        STREAM_HEADERS, stored_hash, string_fields, token_pair, treatment_request,
+                        verification_email)
+from auth import AUTH_ENFORCE, AuthError, get_token_service, is_admin
+from db_bootstrap import (create_mongo_client, ensure_indexes, MONGO_MAX_POOL_SIZE,
+                          MONGO_MIN_POOL_SIZE, MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                          MONGO_CONNECT_TIMEOUT_MS, MONGO_READ_PREFERENCE)
+from email_queue import EmailQueue
+from feedback_export import daily_counts, fetch_page, iter_feedback, rebuild_daily_counts
+from feedback_pipeline import FeedbackPipeline
+from local_predictor import PREDICTION_MODE, get_local_predictor
+from medication_store import MedicationPatternStore
+from metrics import (CONTENT_TYPE as METRICS_CONTENT_TYPE, mongo_event_listeners, render_latest,
+                     request_finished, request_started)
+from password_hasher import PasswordHashingBusy, get_password_hasher
+from prediction_batcher import get_prediction_batcher
+from prediction_cache import (PredictionCache, prediction_cache_key, PREDICTION_CACHE_ENABLED,
+                              PREDICTION_CACHE_SHARED)
+from prediction_session import PredictionSessionStore, parse_session_delta, parse_session_payload
+from rate_limit import RATE_LIMIT_ENABLED, init_rate_limiter, resolve_client_ip
+from single_flight import AsyncSingleFlight
+from treatment_cache import TreatmentCache, TREATMENT_CACHE_ENABLED
+from upstream_client import AsyncUpstreamClient
+from user_repository import AsyncUserRepository
+from warmup import WarmUp
+from your_gemini_util import afetch_gemini_response_coalesced, astream_treatment_plan, get_gemini_client
+
+FRONTEND_ORIGINS = ["https://medica3.netlify.app"]
+
+# === MongoDB Setup ===
+# Motor for request handlers; the sync client backs the shared background subsystems
+mongo_uri = os.getenv("MONGO_URI")
+client = create_mongo_client(mongo_uri)
+db = client["medicalDB"]
+async_client = AsyncIOMotorClient(
+    mongo_uri,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+    readPreference=MONGO_READ_PREFERENCE,
+    event_listeners=mongo_event_listeners(),
+)
+adb = async_client["medicalDB"]
+
+user_repo = AsyncUserRepository(adb)
+limiter = init_rate_limiter(db)
+treatment_cache = TreatmentCache(db["treatment_cache"]) if TREATMENT_CACHE_ENABLED else None
+prediction_cache = (PredictionCache(db["prediction_cache"] if PREDICTION_CACHE_SHARED else None)
+                    if PREDICTION_CACHE_ENABLED else None)
+prediction_flight = AsyncSingleFlight()
+prediction_sessions = PredictionSessionStore(lock_factory=asyncio.Lock)
+medication_store = MedicationPatternStore(db["medication_patterns"])
+email_queue = EmailQueue(db["email_jobs"])
+feedback_pipeline = FeedbackPipeline(db["feedbacks"], rollup=db["feedback_daily"])
+upstream = None
+
+
+def get_prescription_renderer():
+    from prescription_pdf import prescription_renderer
+    return prescription_renderer
+
+
+def bootstrap_indexes():
+    failed = ensure_indexes(db)
+    if failed:
+        raise RuntimeError(f"{len(failed)} index(es) could not be created")
+
+
+# Same background warm-up as app.py; the lifespan hook returns immediately so uvicorn starts
+# accepting connections while it runs, and /api/ready reports progress.
+warmup = WarmUp()
+warmup.add("mongo", lambda: client.admin.command("ping"), required=True)
+if PREDICTION_MODE in ("local", "local-fallback"):
+    warmup.add("local_model", get_local_predictor, required=PREDICTION_MODE == "local")
+# Required: registration relies on users.email_unique to reject duplicate accounts
+warmup.add("indexes", bootstrap_indexes, required=True)
+warmup.add("medication_patterns", medication_store.start)
+warmup.add("email_queue", email_queue.start)
+warmup.add("password_hasher", lambda: get_password_hasher().start())
+warmup.add("pdf", get_prescription_renderer)
+warmup.add("gemini", lambda: get_gemini_client().model)
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    global upstream
+    upstream = AsyncUpstreamClient()
+    warmup.start()
+    yield
+    await upstream.aclose()
+    await run_in_threadpool(feedback_pipeline.close)
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=FRONTEND_ORIGINS,
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+
+def route_template(scope):
+    """Route path template for metric labels (routing itself only happens inside call_next)."""
+    for route in app.router.routes:
+        if route.matches(scope)[0] == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    # Streamed responses are timed to their first byte, like the Flask app
+    route = route_template(request.scope)
+    started = request_started(route)
+    try:
+        response = await call_next(request)
+    except Exception:
+        request_finished(request.method, route, request.url.path, 500, started)
+        raise
+    request_finished(request.method, route, request.url.path, response.status_code, started)
+    return response
+
+
+# === Request helpers ===
+# What each route accepts and answers is decided in api_common.py, shared with app.py
+@app.exception_handler(Reject)
+async def reject_handler(_request, exc):
+    return JSONResponse(exc.body, status_code=exc.status, headers=exc.headers)
+
+
+async def json_body(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    return json_object(data)
+
+
+def respond(result):
+    """JSONResponse for a (body, status, headers) tuple from api_common."""
+    body, status, headers = result
+    return JSONResponse(body, status, headers)
+
+
+def authenticate(request):
+    """Bearer-token check, same rules as auth.require_auth. Returns the subject or None."""
+    header = request.headers.get("authorization", "")
+    scheme, _, token = header.partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        if AUTH_ENFORCE:
+            raise Reject(401, {"error": "Authentication required"})
+        return None
+    try:
+        claims = get_token_service().verify(token.strip())
+    except AuthError as e:
+        raise Reject(401, {"error": str(e)})
+    return claims.get("sub") or claims.get("email")
+
+
+def authenticate_admin(request):
+    """Same rules as auth.require_admin: a valid token is always required, and it must be an admin's."""
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        raise Reject(401, {"error": "Authentication required"})
+    try:
+        claims = get_token_service().verify(token.strip())
+    except AuthError as e:
+        raise Reject(401, {"error": str(e)})
+    user_id = claims.get("sub") or claims.get("email")
+    if not is_admin(user_id):
+        raise Reject(403, {"error": "Admin access required"})
+    return user_id
+
+
+async def guard(request, budget, authenticated=False):
+    """Authenticate (optionally) and spend one rate-limit token; returns the user id or None."""
+    user_id = authenticate(request) if authenticated else None
+    if RATE_LIMIT_ENABLED:
+        if user_id:
+            identity = f"user:{user_id}"
+        else:
+            remote = request.client.host if request.client else None
+            identity = f"ip:{resolve_client_ip(request.headers.get('x-forwarded-for', ''), remote)}"
+        allowed, retry_after = await run_in_threadpool(limiter.check, budget, identity)
+        if not allowed:
+            retry = max(1, int(retry_after + 0.999))
+            raise Reject(429, {"error": "Too many requests", "retry_after": retry}, {"Retry-After": str(retry)})
+    return user_id
+
+
+def generate_jwt(email):
+    return get_token_service().issue_access_token(email)
+
+
+def generate_refresh_token(email):
+    return get_token_service().issue_refresh_token(email)
+
+
+async def send_email(subject, recipient, body):
+    try:
+        await email_queue.enqueue_async(adb["email_jobs"], subject, recipient, body)
+        print(f"📨 Email to {recipient} queued")
+        return True
+    except Exception as e:
+        print("❌ Email enqueue error:", e)
+        return False
+
+
+# === Auth Routes ===
+@app.post("/api/send-verification-code")
+async def send_verification_code(request: Request):
+    await guard(request, "email")
+    user_email = requested_email(await json_body(request))
+
+    code = await user_repo.issue_code(user_email, "verify")
+    subject, body = verification_email(code)
+    if await send_email(subject, user_email, body):
+        return {"message": "Verification code sent successfully"}
+    return JSONResponse({"error": "Failed to send verification code"}, 500)
+
+
+@app.post("/api/register")
+async def register(request: Request):
+    email, password = string_fields(await json_body(request), ("email", "password"),
+                                    "Missing or invalid email/password")
+
+    # Cheap pre-check (and no hash spent on a taken email); the unique index on users.email,
+    # required for readiness, closes the race between this check and the insert
+    if await user_repo.exists(email):
+        return JSONResponse({"message": "User already exists"}, 400)
+
+    try:
+        hashed_password = await get_password_hasher().ahash(password)
+    except PasswordHashingBusy:
+        raise busy()
+    if not await user_repo.create(email, hashed_password):
+        return JSONResponse({"message": "User already exists"}, 400)
+    return JSONResponse({"message": "Registration successful"}, 201)
+
+
+@app.post("/api/login-step1")
+async def login_step1(request: Request):
+    await guard(request, "email")
+    try:
+        email, password = string_fields(await json_body(request), ("email", "password"),
+                                        "Email and password must be strings")
+        user = await user_repo.get_credentials(email)
+        stored_password = stored_hash(user)
+
+        try:
+            matches, upgraded_hash = await get_password_hasher().averify(stored_password, password)
+        except PasswordHashingBusy:
+            raise busy()
+        if not matches:
+            return JSONResponse({"message": "Invalid credentials"}, 401)
+        if upgraded_hash:
+            try:
+                await user_repo.set_password(email, upgraded_hash, expected_hash=stored_password)
+            except Exception as e:
+                print(f"⚠️ Password rehash for {email} failed: {e}")
+
+        if user.get("is_verified", False):
+            return token_pair(email)
+
+        code = await user_repo.issue_code(email, "verify")
+        subject, body = login_code_email(code)
+        await send_email(subject, email, body)
+        return {"step": 2}
+    except Reject:
+        raise
+    except Exception as e:
+        print("Error in login-step1:", e)
+        return JSONResponse({"message": "Internal Server Error", "error": str(e)}, 500)
+
+
+@app.post("/api/login-step2")
+async def login_step2(request: Request):
+    try:
+        email, code = string_fields(await json_body(request), ("email", "code"), "Email and code must be strings")
+
+        status = await user_repo.verify_with_code(email, code)
+        if status == "missing":
+            return JSONResponse({"message": "User not found"}, 404)
+        if status != "ok":
+            raise login_code_rejection(status, await user_repo.is_verified(email))
+        return {"message": "Login successful", **token_pair(email)}
+    except Reject:
+        raise
+    except Exception as e:
+        print("Error in login-step2:", e)
+        return JSONResponse({"message": "Login step 2 failed", "error": str(e)}, 500)
+
+
+@app.post("/api/token/refresh")
+async def refresh_token(request: Request):
+    return refreshed_tokens(await json_body(request))
+
+
+@app.post("/api/send-reset-code")
+async def send_reset_code(request: Request):
+    await guard(request, "email")
+    try:
+        email, = string_fields(await json_body(request), ("email",), "Invalid email")
+
+        if not await user_repo.exists(email):
+            return JSONResponse({"message": "User not found"}, 404)
+
+        code = await user_repo.issue_code(email, "reset")
+        subject, body = reset_code_email(code)
+        await send_email(subject, email, body)
+        return {"message": "Reset code sent"}
+    except Reject:
+        raise
+    except Exception as e:
+        print("Error in send-reset-code:", e)
+        return JSONResponse({"message": "Internal Server Error"}, 500)
+
+
+@app.post("/api/reset-password")
+async def reset_password(request: Request):
+    try:
+        email, code, new_password = string_fields(await json_body(request), ("email", "code", "newPassword"),
+                                                  "Invalid input")
+
+        # Same order as the Flask route: a busy 503 must not spend the code
+        status = await user_repo.check_code(email, "reset", code)
+        if status == "ok":
+            try:
+                hashed_password = await get_password_hasher().ahash(new_password)
+            except PasswordHashingBusy:
+                raise busy()
+            status = await user_repo.consume_code(email, "reset", code)
+        if status != "ok":
+            raise reset_code_rejection(status, await user_repo.exists(email))
+
+        if not await user_repo.set_password(email, hashed_password):
+            return JSONResponse({"message": "User not found"}, 404)
+        return {"message": "Password reset successful"}
+    except Reject:
+        raise
+    except Exception as e:
+        print("Error in reset-password:", e)
+        return JSONResponse({"message": "Failed to reset password", "error": str(e)}, 500)
+
+
+# === Prediction ===
+async def run_prediction(path, data):
+    """Async twin of app.run_prediction: local batcher future or the pooled async proxy."""
+    if PREDICTION_MODE in ("local", "local-fallback"):
+        try:
+            # The first call loads the model artifacts (unless the warm-up already did); not on the loop
+            batcher = await run_in_threadpool(get_prediction_batcher)
+            return await asyncio.wrap_future(batcher.submit(data)), 200
+        except Exception as e:
+            if PREDICTION_MODE == "local":
+                raise
+            print(f"⚠️ Local prediction failed, falling back to Hugging Face: {e}")
+
+    response = await upstream.post(path, data)
+    return response.json(), response.status_code
+
+
+async def cached_prediction(path, data):
+    """Async twin of app.cached_prediction; the Mongo tier is read and written in the threadpool."""
+    key = prediction_cache_key(path, data) if prediction_cache else None
+    if key is None:
+        body, status = await run_prediction(path, data)
+        return body, status, {}
+
+    body, tier = await run_in_threadpool(prediction_cache.get, key)
+    if body is not None:
+        return body, 200, cache_hit_headers(tier)
+
+    async def call():
+        result = await run_prediction(path, data)
+        await run_in_threadpool(prediction_cache.set, key, *result)
+        return result
+
+    body, status = await prediction_flight.do(key, call)
+    return body, status, {"X-Cache": "MISS"}
+
+
+async def proxy_prediction(request, path):
+    await guard(request, "predict", authenticated=True)
+    data = await json_body(request)
+    try:
+        return respond(await cached_prediction(path, data))
+    except Exception as e:
+        return JSONResponse(*prediction_failure(e, f"Hugging Face {path} proxy"))
+
+
+@app.post("/predict")
+async def predict(request: Request):
+    return await proxy_prediction(request, "/predict")
+
+
+@app.post("/repredict")
+async def repredict(request: Request):
+    return await proxy_prediction(request, "/repredict")
+
+
+# === Prediction Sessions ===
+async def score_session(session):
+    """Async twin of app.score_session; call with session.lock held."""
+    if PREDICTION_MODE in ("local", "local-fallback"):
+        try:
+            return await run_in_threadpool(lambda: session.rescore_local(get_local_predictor())), 200, {}
+        except Exception as e:
+            if PREDICTION_MODE == "local":
+                raise
+            print(f"⚠️ Local session rescore failed, falling back to Hugging Face: {e}")
+            session.reset_local()
+    session.clear_delta()
+    return await cached_prediction("/predict", session.payload())
+
+
+async def session_response(session, delta=None):
+    # session.lock is an asyncio.Lock here: waiting for another step never blocks the loop
+    async with session.lock:
+        changed = session.apply(*delta) if delta else True
+        if changed or session.result is None:
+            session.result = None
+            try:
+                body, status, headers = await score_session(session)
+            except Exception as e:
+                return JSONResponse(*prediction_failure(e, "Prediction session"))
+            if status == 200:
+                session.result = (body, status, headers)
+        else:
+            body, status, headers = session.result
+        return JSONResponse(session_body(session, body), status, headers)
+
+
+@app.post("/api/predict/session")
+async def open_prediction_session(request: Request):
+    user_id = await guard(request, "predict", authenticated=True)
+    try:
+        symptoms, vitals, extra = parse_session_payload(await json_body(request))
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, 400)
+    return await session_response(prediction_sessions.create(user_id, symptoms, vitals, extra))
+
+
+@app.patch("/api/predict/session/{session_id}")
+async def update_prediction_session(session_id: str, request: Request):
+    user_id = await guard(request, "predict", authenticated=True)
+    session = prediction_sessions.get(user_id, session_id)
+    if session is None:
+        raise session_not_found()
+    try:
+        delta = parse_session_delta(await json_body(request))
+        response = await session_response(session, delta)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, 400)
+    prediction_sessions.touch(user_id, session)
+    return response
+
+
+@app.delete("/api/predict/session/{session_id}")
+async def close_prediction_session(session_id: str, request: Request):
+    user_id = authenticate(request)
+    if not prediction_sessions.delete(user_id, session_id):
+        raise session_not_found()
+    return {"message": "Session closed"}
+
+
+# === Treatment ===
+async def cache_get(key):
+    return await run_in_threadpool(treatment_cache.get, key) if treatment_cache else None
+
+
+async def cache_set(key, plan):
+    if treatment_cache:
+        await run_in_threadpool(treatment_cache.set, key, plan)
+
+
+@app.post("/api/treatment")
+async def generate_treatment(request: Request):
+    await guard(request, "treatment", authenticated=True)
+    try:
+        fields = patient_fields(await json_body(request))
+        prompt, cache_key = treatment_request(fields)
+
+        treatment_data = await cache_get(cache_key)
+        if treatment_data is None:
+            treatment_data = await afetch_gemini_response_coalesced(
+                cache_key, prompt, on_result=lambda plan: cache_set(cache_key, plan)
+            )
+
+        return prescription(fields, annotate_plan(medication_store, treatment_data))
+    except Reject:
+        raise
+    except Exception as e:
+        print(f"❌ Treatment endpoint error: {e}")
+        return JSONResponse({"error": str(e)}, 500)
+
+
+@app.post("/api/treatment/stream")
+async def stream_treatment(request: Request):
+    await guard(request, "treatment", authenticated=True)
+    fields = patient_fields(await json_body(request))
+    prompt, cache_key = treatment_request(fields)
+
+    async def generate():
+        try:
+            treatment_data = await cache_get(cache_key)
+            if treatment_data is not None:
+                for med in treatment_data.get("medications", []):
+                    yield event("medication", medication_store.annotate(med))
+            else:
+                async for kind, item in astream_treatment_plan(prompt):
+                    if kind == "medication":
+                        yield event("medication", medication_store.annotate(item))
+                    else:
+                        treatment_data = item
+                await cache_set(cache_key, treatment_data)
+                annotate_plan(medication_store, treatment_data)
+
+            for line in closing_events(fields, treatment_data):
+                yield line
+        except Exception as e:
+            print(f"❌ Treatment stream error: {e}")
+            yield event("error", str(e))
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson", headers=STREAM_HEADERS)
+
+
+def attachment(content, media_type, filename):
+    return Response(content, media_type=media_type,
+                    headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+@app.post("/api/treatment/download")
+async def download_prescription(request: Request):
+    await guard(request, "pdf", authenticated=True)
+    try:
+        prescription = await json_body(request)
+        pdf = await run_in_threadpool(lambda: get_prescription_renderer().render(prescription, io.BytesIO()).getvalue())
+        return attachment(pdf, "application/pdf", "prescription.pdf")
+    except Reject:
+        raise
+    except Exception as e:
+        print(f"❌ Could not generate PDF: {e}")
+        return JSONResponse({"error": "Could not generate PDF"}, 500)
+
+
+@app.post("/api/treatment/download/bulk")
+async def download_prescriptions_bulk(request: Request):
+    await guard(request, "pdf", authenticated=True)
+    try:
+        prescriptions, output_format = bulk_request(await json_body(request))
+        # First call imports ReportLab; keep that off the event loop
+        renderer = await run_in_threadpool(get_prescription_renderer)
+        bulk_items(renderer, prescriptions)
+
+        def render():
+            output = io.BytesIO()
+            return output, render_bulk(renderer, prescriptions, output_format, output)
+
+        output, (media_type, filename) = await run_in_threadpool(render)
+        return attachment(output.getvalue(), media_type, filename)
+    except Reject:
+        raise
+    except Exception as e:
+        print(f"❌ Could not generate bulk PDF: {e}")
+        return JSONResponse({"error": "Could not generate PDF"}, 500)
+
+
+@app.get("/api/treatment/cache-stats")
+async def treatment_cache_stats():
+    return api_common.treatment_cache_stats(treatment_cache)
+
+
+@app.get("/api/predict/cache-stats")
+async def prediction_cache_stats():
+    return api_common.prediction_cache_stats(prediction_cache, prediction_flight)
+
+
+@app.get("/metrics")
+async def metrics():
+    return Response(render_latest(), media_type=METRICS_CONTENT_TYPE)
+
+
+# === Health Check / Feedback ===
+@app.get("/api/ready")
+async def readiness():
+    return JSONResponse(*api_common.readiness(warmup))
+
+
+@app.get("/api/ping-db")
+async def ping_db():
+    try:
+        count = await user_repo.count()
+        return {"message": "MongoDB connected ✅", "user_count": count}
+    except Exception as e:
+        return JSONResponse({"error": f"MongoDB connection failed: {str(e)}"}, 500)
+
+
+# Never block the event loop on a full feedback buffer (timeout=0): answer 503 straight away instead
+@app.post("/api/feedback")
+async def store_feedback(request: Request):
+    return respond(api_common.store_feedback(feedback_pipeline, await json_body(request), timeout=0))
+
+
+@app.post("/api/submit-feedback")
+async def submit_feedback(request: Request):
+    return respond(api_common.submit_feedback(feedback_pipeline, await json_body(request), timeout=0))
+
+
+# === Admin: Feedback Read API ===
+@app.get("/api/admin/feedback")
+async def list_feedback(request: Request):
+    authenticate_admin(request)
+    params = request.query_params
+    filters = feedback_filters(params)
+    after, limit = page_params(params)
+
+    try:
+        docs, next_cursor = await run_in_threadpool(lambda: fetch_page(db["feedbacks"], limit=limit, after=after,
+                                                                       **filters))
+    except Exception as e:
+        print(f"❌ Feedback listing failed: {e}")
+        return JSONResponse({"error": "Could not read feedback"}, 500)
+    return feedback_page(docs, next_cursor)
+
+
+@app.get("/api/admin/feedback/export")
+async def export_feedback(request: Request):
+    authenticate_admin(request)
+    output_format = export_format(request.query_params)
+    filters = feedback_filters(request.query_params)
+
+    # A sync generator: Starlette pulls each chunk in the threadpool, so the keyset
+    # queries never block the event loop
+    body, media_type, headers = export_stream(iter_feedback(db["feedbacks"], **filters), output_format)
+    return StreamingResponse(body, media_type=media_type, headers=headers)
+
+
+@app.get("/api/admin/feedback/daily")
+async def feedback_daily(request: Request):
+    authenticate_admin(request)
+    filters = feedback_filters(request.query_params)
+    try:
+        days = await run_in_threadpool(daily_counts, db["feedback_daily"], filters["since"], filters["until"])
+    except Exception as e:
+        print(f"❌ Feedback daily counts failed: {e}")
+        return JSONResponse({"error": "Could not read feedback counts"}, 500)
+    return {"days": days}
+
+
+@app.post("/api/admin/feedback/daily/rebuild")
+async def rebuild_feedback_daily(request: Request):
+    authenticate_admin(request)
+    filters = feedback_filters(request.query_params)
+    try:
+        rebuilt = await run_in_threadpool(rebuild_daily_counts, db["feedbacks"], db["feedback_daily"],
+                                          filters["since"], filters["until"])
+    except Exception as e:
+        print(f"❌ Feedback rollup rebuild failed: {e}")
+        return JSONResponse({"error": "Could not rebuild feedback counts"}, 500)
+    return {"rebuilt_days": rebuilt}
+
+
+# === Admin: Medication Patterns ===
+@app.put("/api/admin/medication-patterns/{name}")
+async def set_medication_pattern(name: str, request: Request):
+    authenticate_admin(request)
+    pattern = medication_pattern(await json_body(request))
+
+    def write():
+        medication_store.set_pattern(name, pattern)
+        medication_store.refresh()
+
+    await run_in_threadpool(write)
+    return {"name": name, "pattern": pattern}
+
+
+@app.delete("/api/admin/medication-patterns/{name}")
+async def delete_medication_pattern(name: str, request: Request):
+    authenticate_admin(request)
+
+    def delete():
+        deleted = medication_store.delete_pattern(name)
+        if deleted:
+            medication_store.refresh()
+        return deleted
+
+    if not await run_in_threadpool(delete):
+        raise pattern_not_found()
+    return {"message": "Pattern deleted"}
+
+
+# === Main Entrypoint ===
+if __name__ == '__main__':
+    import uvicorn
+
+    port = int(os.environ.get('PORT', 5000))
+    uvicorn.run("asgi_app:app", host='0.0.0.0', port=port)
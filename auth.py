@@ -0,0 +1,183 @@
+import hashlib
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+
+import jwt
+from flask import g, jsonify, request
+
+from ttl_cache import TTLCache
+
+# === JWT Configuration ===
+# JWT_KEYS: comma-separated "kid:secret" pairs. Tokens are signed with JWT_ACTIVE_KID and
+# verified with whichever key their `kid` header names, so keys can be rotated by adding the
+# new key, switching JWT_ACTIVE_KID, and dropping the old key once its tokens have expired.
+# Without JWT_KEYS, SECRET_KEY is used under the kid "default". The placeholder SECRET_KEY is never
+# used: with no real key configured no token can be issued or verified.
+JWT_ALGORITHM = "HS256"
+JWT_ACCESS_TTL = int(os.getenv("JWT_ACCESS_TTL", str(2 * 3600)))
+JWT_REFRESH_TTL = int(os.getenv("JWT_REFRESH_TTL", str(30 * 24 * 3600)))
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "4096"))
+JWT_CACHE_TTL = int(os.getenv("JWT_CACHE_TTL", "300"))
+# AUTH_ENFORCE=false lets requests without a token through (g.user is None); bad tokens are still rejected
+AUTH_ENFORCE = os.getenv("AUTH_ENFORCE", "true").lower() == "true"
+# ADMIN_EMAILS: comma-separated subjects allowed to use the /api/admin routes
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()}
+
+
+# The value app.py used to fall back to; anyone could sign tokens with it
+INSECURE_DEFAULT_SECRET = "fallback-secret"
+
+
+class AuthError(Exception):
+    pass
+
+
+def load_keys():
+    keys = {}
+    for pair in os.getenv("JWT_KEYS", "").split(","):
+        kid, sep, secret = pair.strip().partition(":")
+        if sep and kid and secret:
+            keys[kid] = secret
+    if not keys and os.getenv("SECRET_KEY"):
+        keys["default"] = os.getenv("SECRET_KEY")
+    insecure = [kid for kid, secret in keys.items() if secret == INSECURE_DEFAULT_SECRET]
+    for kid in insecure:
+        print(f"⚠️ Ignoring JWT key {kid!r}: it is the public placeholder secret")
+        del keys[kid]
+    if not keys:
+        print("⚠️ No JWT signing key configured (SECRET_KEY / JWT_KEYS); logins cannot issue tokens")
+    return keys
+
+
+class TokenService:
+    """
+    Issues and verifies HS256 access/refresh tokens without touching Mongo.
+    Verified tokens are remembered in a small LRU keyed by a digest of the token, until the
+    sooner of the token's own expiry and JWT_CACHE_TTL, so repeat requests skip the HMAC and
+    claim checks.
+    """
+
+    def __init__(self, keys=None, active_kid=None):
+        self.keys = load_keys() if keys is None else keys
+        self.active_kid = active_kid or os.getenv("JWT_ACTIVE_KID") or next(iter(self.keys), None)
+        if self.active_kid is not None and self.active_kid not in self.keys:
+            raise ValueError(f"JWT_ACTIVE_KID {self.active_kid!r} has no key in JWT_KEYS")
+        self._cache = TTLCache(maxsize=JWT_CACHE_SIZE, ttl=JWT_CACHE_TTL)
+
+    def _issue(self, email, token_type, ttl):
+        if self.active_kid is None:
+            raise RuntimeError("No JWT signing key configured; set SECRET_KEY or JWT_KEYS")
+        now = datetime.now(timezone.utc)
+        payload = {
+            "sub": email,
+            "email": email,
+            "type": token_type,
+            "iat": now,
+            "exp": now + timedelta(seconds=ttl),
+            "jti": uuid.uuid4().hex,
+        }
+        return jwt.encode(payload, self.keys[self.active_kid], algorithm=JWT_ALGORITHM,
+                          headers={"kid": self.active_kid})
+
+    def issue_access_token(self, email):
+        return self._issue(email, "access", JWT_ACCESS_TTL)
+
+    def issue_refresh_token(self, email):
+        return self._issue(email, "refresh", JWT_REFRESH_TTL)
+
+    def verify(self, token, expected_type="access"):
+        """Return the token's claims or raise AuthError."""
+        cache_key = hashlib.sha256(token.encode("utf-8")).digest()
+        claims = self._cache.get(cache_key)
+        if claims is None:
+            try:
+                kid = jwt.get_unverified_header(token).get("kid", "default")
+            except jwt.PyJWTError:
+                raise AuthError("Malformed token")
+            secret = self.keys.get(kid)
+            if secret is None:
+                raise AuthError("Unknown signing key")
+            try:
+                claims = jwt.decode(token, secret, algorithms=[JWT_ALGORITHM], options={"require": ["exp"]})
+            except jwt.ExpiredSignatureError:
+                raise AuthError("Token expired")
+            except jwt.PyJWTError:
+                raise AuthError("Invalid token")
+            # Every caller keys on the subject; legacy tokens from generate_jwt() carry only `email`
+            if not isinstance(claims.get("sub") or claims.get("email"), str):
+                raise AuthError("Invalid token")
+            remaining = claims["exp"] - time.time()
+            if remaining > 0:
+                self._cache.set(cache_key, claims, ttl=min(remaining, JWT_CACHE_TTL))
+        elif claims["exp"] <= time.time():
+            raise AuthError("Token expired")
+
+        # Legacy tokens from generate_jwt() carry no type and are access tokens
+        if claims.get("type", "access") != expected_type:
+            raise AuthError("Wrong token type")
+        return claims
+
+
+_service = None
+
+
+def get_token_service():
+    global _service
+    if _service is None:
+        _service = TokenService()
+    return _service
+
+
+def bearer_token():
+    header = request.headers.get("Authorization", "")
+    scheme, _, token = header.partition(" ")
+    if scheme.lower() == "bearer" and token.strip():
+        return token.strip()
+    return None
+
+
+def require_auth(view):
+    """
+    Verify the Bearer access token and expose its claims as `g.user`
+    (with `g.user_id` set to the subject email). Responds 401 on a missing or bad token.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = bearer_token()
+        g.user = g.user_id = None
+        if token is None:
+            if AUTH_ENFORCE:
+                return jsonify({"error": "Authentication required"}), 401
+            return view(*args, **kwargs)
+        try:
+            g.user = get_token_service().verify(token)
+        except AuthError as e:
+            return jsonify({"error": str(e)}), 401
+        g.user_id = g.user.get("sub") or g.user.get("email")
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def is_admin(user_id):
+    return bool(user_id) and user_id.lower() in ADMIN_EMAILS
+
+
+def require_admin(view):
+    """Like require_auth, but a valid token is always required and its subject must be in ADMIN_EMAILS."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = bearer_token()
+        if token is None:
+            return jsonify({"error": "Authentication required"}), 401
+        try:
+            g.user = get_token_service().verify(token)
+        except AuthError as e:
+            return jsonify({"error": str(e)}), 401
+        g.user_id = g.user.get("sub") or g.user.get("email")
+        if not is_admin(g.user_id):
+            return jsonify({"error": "Admin access required"}), 403
+        return view(*args, **kwargs)
+    return wrapper
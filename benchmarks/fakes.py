@@ -0,0 +1,144 @@
+"""
+Local stand-ins for the services app.py talks to, so benchmarks run offline and repeatably.
+
+- FakeHFServer: HTTP server answering /predict and /repredict like the Hugging Face Space
+- FakeSendGridServer: HTTP server accepting v3 mail/send with 202
+- FakeGeminiModel: drop-in for genai.GenerativeModel (plain and streamed generate_content)
+- Mongo is replaced by mongomock's in-memory MongoClient (see run_benchmarks.py)
+
+Every fake sleeps for `latency_ms` plus up to `jitter_ms` of uniform noise per call.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+
+def simulated_delay(latency_ms, jitter_ms):
+    delay = latency_ms + random.uniform(0, jitter_ms)
+    if delay > 0:
+        time.sleep(delay / 1000)
+
+
+class FakeServer:
+    """Threaded HTTP server on 127.0.0.1 (ephemeral port) running in a daemon thread."""
+
+    routes = {}
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.calls = 0
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                handler = fake.routes.get(self.path)
+                with fake._lock:
+                    fake.calls += 1
+                simulated_delay(fake.latency_ms, fake.jitter_ms)
+                if handler is None:
+                    status, body = 404, {"error": "not found"}
+                else:
+                    status, body = handler(fake, payload)
+                data = json.dumps(body).encode("utf-8") if body is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def fake_prediction(_fake, payload):
+    symptoms = payload.get("symptoms") or []
+    diseases = ["Common Cold", "Influenza", "Migraine", "Gastritis"]
+    disease = diseases[len(symptoms) % len(diseases)]
+    return 200, {"predicted_disease": disease, "confidence": 0.87, "top_predictions": [
+        {"disease": disease, "probability": 0.87},
+        {"disease": diseases[(len(symptoms) + 1) % len(diseases)], "probability": 0.08},
+    ]}
+
+
+class FakeHFServer(FakeServer):
+    routes = {"/predict": fake_prediction, "/repredict": fake_prediction}
+
+
+class FakeSendGridServer(FakeServer):
+    routes = {"/v3/mail/send": lambda _fake, _payload: (202, None)}
+
+    @property
+    def send_url(self):
+        return f"{self.url}/v3/mail/send"
+
+
+FAKE_TREATMENT_PLAN = {
+    "medications": [
+        {"name": "Paracetamol 500mg", "dosage": "500 mg", "timing": "after food"},
+        {"name": "Cetirizine 10mg", "dosage": "10 mg", "timing": "night"},
+        {"name": "Vitamin C 500mg", "dosage": "500 mg", "timing": "morning"},
+    ],
+    "lifestyle": ["Drink plenty of fluids", "Rest for 2-3 days", "Avoid cold drinks"],
+    "followup": "Consult a doctor if symptoms persist beyond 5 days.",
+}
+
+
+class FakeGeminiModel:
+    """
+    Replaces the GenerativeModel held by your_gemini_util.GeminiClient. Non-streamed calls sleep
+    for the full latency; streamed calls spread it across `chunks` text fragments.
+    """
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, chunks=8, plan=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.chunks = max(1, chunks)
+        self.text = json.dumps(plan or FAKE_TREATMENT_PLAN)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _response(self, text):
+        part = SimpleNamespace(text=text)
+        candidate = SimpleNamespace(content=SimpleNamespace(parts=[part]))
+        return SimpleNamespace(candidates=[candidate], text=text)
+
+    def _stream(self):
+        size = -(-len(self.text) // self.chunks)
+        for i in range(0, len(self.text), size):
+            simulated_delay(self.latency_ms / self.chunks, self.jitter_ms / self.chunks)
+            yield SimpleNamespace(text=self.text[i:i + size])
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        with self._lock:
+            self.calls += 1
+        if stream:
+            return self._stream()
+        simulated_delay(self.latency_ms, self.jitter_ms)
+        return self._response(self.text)
@@ -0,0 +1,307 @@
+"""
+Offline load test for app.py.
+
+Starts the Flask app in-process on a threaded werkzeug server, with Mongo swapped for mongomock
+and Hugging Face / Gemini / SendGrid replaced by the fakes in benchmarks/fakes.py, then drives
+each scenario at each concurrency level and reports p50/p95/p99 latency and throughput.
+Results are written as JSON; pass --baseline to compare against an earlier run.
+
+    python benchmarks/run_benchmarks.py --concurrency 1,8,32 --requests 400
+    python benchmarks/run_benchmarks.py --scenarios treatment,predict --gemini-latency-ms 1500 \
+        --baseline benchmarks/results/bench-20250101T000000Z.json --fail-on-regression
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(REPO_DIR))
+
+from fakes import FakeGeminiModel, FakeHFServer, FakeSendGridServer
+
+BENCH_EMAIL = "bench@example.com"
+BENCH_PASSWORD = "bench-password"
+SYMPTOM_POOL = ["fever", "cough", "headache", "fatigue", "nausea", "sore throat",
+                "runny nose", "body ache", "chills", "dizziness"]
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def symptoms_for(i, distinct):
+    """Deterministic symptom list; `distinct` bounds how many different payloads are sent."""
+    n = i % max(distinct, 1)
+    return [SYMPTOM_POOL[(n + k) % len(SYMPTOM_POOL)] for k in range(2 + n % 3)] + [f"case-{n}"]
+
+
+def build_scenarios(token, distinct):
+    """name -> function(i) returning (method, path, json_body, headers)."""
+    auth = {"Authorization": f"Bearer {token}"}
+
+    def patient(i):
+        return {"disease": "Influenza", "symptoms": symptoms_for(i, distinct), "age": 20 + i % distinct % 50,
+                "blood_group": "O+", "duration": "3 days"}
+
+    prescription = {
+        "disease": "Influenza", "age": 34, "symptoms": ["fever", "cough"], "blood_group": "O+",
+        "duration": "3 days", "treatment": {
+            "medications": [{"name": "Paracetamol 500mg", "dosage": "500 mg", "timing": "after food",
+                             "intake": "1-0-1"}] * 6,
+            "lifestyle": ["Drink plenty of fluids", "Rest"] * 3,
+            "followup": "Consult a doctor if symptoms persist beyond 5 days.",
+        },
+    }
+    return {
+        "ping-db": lambda i: ("GET", "/api/ping-db", None, {}),
+        "login": lambda i: ("POST", "/api/login-step1", {"email": BENCH_EMAIL, "password": BENCH_PASSWORD}, {}),
+        "email": lambda i: ("POST", "/api/send-verification-code", {"email": f"user{i}@example.com"}, {}),
+        "predict": lambda i: ("POST", "/predict", {"symptoms": symptoms_for(i, distinct), "Age": 34,
+                                                   "Heart Rate (bpm)": 80}, auth),
+        "treatment": lambda i: ("POST", "/api/treatment", patient(i), auth),
+        "treatment-stream": lambda i: ("POST", "/api/treatment/stream", patient(i), auth),
+        "pdf": lambda i: ("POST", "/api/treatment/download", prescription, auth),
+        "feedback": lambda i: ("POST", "/api/submit-feedback",
+                               {"email": f"user{i}@example.com", "message": "Works well"}, {}),
+    }
+
+
+def run_load(base_url, request_for, total, concurrency, timeout):
+    """Fire `total` requests with `concurrency` client threads; returns the raw measurements."""
+    local = threading.local()
+    counter = iter(range(total))
+    counter_lock = threading.Lock()
+    latencies, statuses, errors = [], {}, []
+    results_lock = threading.Lock()
+
+    def worker():
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        while True:
+            with counter_lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            method, path, body, headers = request_for(i)
+            started = time.perf_counter()
+            try:
+                response = session.request(method, base_url + path, json=body, headers=headers, timeout=timeout)
+                response.content  # read the full body, streamed routes included
+                status = str(response.status_code)
+            except requests.RequestException as e:
+                status = "error"
+                with results_lock:
+                    errors.append(str(e))
+            elapsed = time.perf_counter() - started
+            with results_lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    wall = time.perf_counter() - started
+    return latencies, statuses, errors, wall
+
+
+def summarize(scenario, concurrency, latencies, statuses, errors, wall):
+    ordered = sorted(latencies)
+    ok = sum(n for s, n in statuses.items() if s.startswith("2"))
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 2)
+
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "ok": ok,
+        "errors": len(latencies) - ok,
+        "status_counts": statuses,
+        "sample_errors": errors[:3],
+        "duration_s": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else None,
+        "latency_ms": {
+            "p50": ms(percentile(ordered, 50)),
+            "p95": ms(percentile(ordered, 95)),
+            "p99": ms(percentile(ordered, 99)),
+            "mean": ms(sum(ordered) / len(ordered)) if ordered else None,
+            "max": ms(ordered[-1]) if ordered else None,
+        },
+    }
+
+
+def emit(line=""):
+    # The app's prints go to sys.stdout, which main() silences unless --verbose
+    print(line, file=sys.__stdout__, flush=True)
+
+
+def compare(results, baseline_path, threshold):
+    """Print p95/throughput deltas against a previous result file; returns the regressions."""
+    baseline = json.loads(Path(baseline_path).read_text())
+    previous = {(r["scenario"], r["concurrency"]): r for r in baseline["results"]}
+    regressions = []
+    emit(f"\nCompared with {baseline_path} (threshold {threshold:.0%}):")
+    for r in results:
+        old = previous.get((r["scenario"], r["concurrency"]))
+        if not old or not old["latency_ms"]["p95"] or not old["throughput_rps"]:
+            continue
+        p95_delta = r["latency_ms"]["p95"] / old["latency_ms"]["p95"] - 1
+        rps_delta = r["throughput_rps"] / old["throughput_rps"] - 1
+        regressed = p95_delta > threshold or rps_delta < -threshold
+        if regressed:
+            regressions.append(r)
+        emit(f"  {'REGRESSION' if regressed else 'ok':10} {r['scenario']:<17} c={r['concurrency']:<4} "
+             f"p95 {p95_delta:+.1%}  throughput {rps_delta:+.1%}")
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_app(args, hf, sendgrid):
+    """Point app.py at the fakes, import it and serve it on an ephemeral port."""
+    os.environ.update({
+        "MONGO_URI": "mongodb://benchmark",
+        "HF_BASE_URL": hf.url,
+        "PREDICTION_MODE": "remote",
+        "EMAIL_TRANSPORT": "sendgrid",
+        "SENDGRID_URL": sendgrid.send_url,
+        "SENDGRID_API_KEY": "benchmark",
+        "FROM_EMAIL": "noreply@example.com",
+        "GEMINI_API_KEY": "benchmark",
+        "SECRET_KEY": "benchmark-only-jwt-signing-secret-0000",
+        "RATE_LIMIT_ENABLED": "false",
+        "REQUEST_LOG": "off",
+        "WARMUP_MODE": "blocking",
+        "TREATMENT_CACHE_ENABLED": "true" if args.treatment_cache else "false",
+        "PREDICTION_CACHE_ENABLED": "true" if args.prediction_cache else "false",
+    })
+
+    import mongomock
+    import pymongo
+    pymongo.MongoClient = mongomock.MongoClient
+
+    import app as medica
+    import your_gemini_util
+    from password_hasher import get_password_hasher
+    from werkzeug.serving import make_server
+
+    gemini = FakeGeminiModel(args.gemini_latency_ms, args.jitter_ms)
+    your_gemini_util.get_gemini_client()._model = gemini
+
+    if medica.user_repo.create(BENCH_EMAIL, get_password_hasher().hash(BENCH_PASSWORD)):
+        medica.user_repo.mark_verified(BENCH_EMAIL)
+    token = medica.generate_jwt(BENCH_EMAIL)
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, medica.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}", token, gemini
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline latency/throughput benchmark for app.py")
+    parser.add_argument("--scenarios", default="ping-db,predict,treatment,treatment-stream,pdf,email,feedback",
+                        help="comma-separated; also available: login")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated client thread counts")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario and concurrency level")
+    parser.add_argument("--warmup", type=int, default=10, help="unmeasured requests before each scenario")
+    parser.add_argument("--distinct-payloads", type=int, default=50,
+                        help="number of different patient payloads (controls cache hit ratio)")
+    parser.add_argument("--treatment-cache", action="store_true", help="keep the treatment cache enabled")
+    parser.add_argument("--prediction-cache", action="store_true", help="keep the prediction cache enabled")
+    parser.add_argument("--gemini-latency-ms", type=float, default=800)
+    parser.add_argument("--hf-latency-ms", type=float, default=150)
+    parser.add_argument("--sendgrid-latency-ms", type=float, default=100)
+    parser.add_argument("--jitter-ms", type=float, default=0, help="uniform noise added to every fake call")
+    parser.add_argument("--timeout", type=float, default=60, help="client timeout per request (seconds)")
+    parser.add_argument("--output", help="result file (default benchmarks/results/bench-<timestamp>.json)")
+    parser.add_argument("--baseline", help="earlier result file to compare against")
+    parser.add_argument("--regression-threshold", type=float, default=0.10,
+                        help="relative p95 increase / throughput drop counted as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit 1 when a regression is found")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's own console output")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.verbose:
+        sys.stdout = open(os.devnull, "w")
+    scenario_names = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+
+    hf = FakeHFServer(args.hf_latency_ms, args.jitter_ms).start()
+    sendgrid = FakeSendGridServer(args.sendgrid_latency_ms, args.jitter_ms).start()
+    server, base_url, token, gemini = start_app(args, hf, sendgrid)
+    scenarios = build_scenarios(token, args.distinct_payloads)
+    unknown = [s for s in scenario_names if s not in scenarios]
+    if unknown:
+        sys.exit(f"Unknown scenario(s): {', '.join(unknown)}. Available: {', '.join(scenarios)}")
+
+    results = []
+    emit(f"{'scenario':<17} {'conc':>4} {'reqs':>6} {'err':>4} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    try:
+        for name in scenario_names:
+            request_for = scenarios[name]
+            for concurrency in levels:
+                if args.warmup:
+                    run_load(base_url, request_for, args.warmup, min(concurrency, args.warmup), args.timeout)
+                row = summarize(name, concurrency, *run_load(base_url, request_for, args.requests,
+                                                             concurrency, args.timeout))
+                results.append(row)
+                lat = row["latency_ms"]
+                emit(f"{name:<17} {concurrency:>4} {row['requests']:>6} {row['errors']:>4} "
+                     f"{row['throughput_rps']:>9} {lat['p50']:>9} {lat['p95']:>9} {lat['p99']:>9}")
+    finally:
+        server.shutdown()
+        hf.stop()
+        sendgrid.stop()
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        "upstream_calls": {"huggingface": hf.calls, "gemini": gemini.calls, "sendgrid": sendgrid.calls},
+        "results": results,
+    }
+    output = Path(args.output) if args.output else (
+        BENCH_DIR / "results" / f"bench-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    emit(f"\n📄 Results written to {output}")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.regression_threshold)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
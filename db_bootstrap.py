@@ -0,0 +1,70 @@
+import os
+
+from pymongo import ASCENDING, DESCENDING, MongoClient
+from pymongo.errors import PyMongoError
+
+from metrics import mongo_event_listeners
+
+# === MongoClient Configuration ===
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "0")) or None
+# primary, primaryPreferred, secondary, secondaryPreferred or nearest
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+
+
+def create_mongo_client(uri=None):
+    """MongoClient with pool size, timeouts and read preference taken from the environment."""
+    return MongoClient(
+        uri or os.getenv("MONGO_URI"),
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+        readPreference=MONGO_READ_PREFERENCE,
+        event_listeners=mongo_event_listeners(),
+    )
+
+
+# name -> list of (keys, options); create_index is a no-op when the index already exists
+INDEXES = {
+    "users": [
+        ([("email", ASCENDING)], {"unique": True, "name": "email_unique"}),
+    ],
+    "otp_codes": [
+        ([("email", ASCENDING), ("purpose", ASCENDING)], {"unique": True, "name": "email_purpose_unique"}),
+        # Mongo's TTL monitor deletes codes once expires_at has passed
+        ([("expires_at", ASCENDING)], {"expireAfterSeconds": 0, "name": "expires_at_ttl"}),
+    ],
+    "feedbacks": [
+        # Keyset order of the admin export (newest first, _id breaks ties)
+        ([("timestamp", DESCENDING), ("_id", DESCENDING)], {"name": "timestamp_id_desc"}),
+        ([("email", ASCENDING), ("timestamp", DESCENDING)], {"name": "email_timestamp"}),
+    ],
+    "feedback_daily": [
+        ([("day", ASCENDING)], {"name": "day"}),
+    ],
+}
+
+
+def ensure_indexes(db, indexes=INDEXES):
+    """
+    Create every index in `indexes` on `db`. Safe to run on every startup.
+    A failure (e.g. duplicate emails blocking the unique index) is reported and skipped
+    so the app can still serve; returns the list of index names that could not be built.
+    """
+    failed = []
+    for collection_name, specs in indexes.items():
+        collection = db[collection_name]
+        for keys, options in specs:
+            try:
+                collection.create_index(keys, **options)
+            except PyMongoError as e:
+                failed.append(options.get("name", str(keys)))
+                print(f"⚠️ Could not create index {collection_name}.{options.get('name')}: {e}")
+    if not failed:
+        print("✅ MongoDB indexes ensured")
+    return failed
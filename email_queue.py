@@ -0,0 +1,234 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import requests
+from pymongo import ASCENDING, ReturnDocument
+from requests.adapters import HTTPAdapter
+
+from metrics import observe_upstream
+
+# === Email Dispatch Configuration ===
+# EMAIL_TRANSPORT: "sendgrid" (default) or "local" (in-memory outbox, for tests and benchmarks)
+EMAIL_TRANSPORT = os.getenv("EMAIL_TRANSPORT", "sendgrid").strip().lower()
+SENDGRID_URL = os.getenv("SENDGRID_URL", "https://api.sendgrid.com/v3/mail/send")
+EMAIL_WORKERS = int(os.getenv("EMAIL_WORKERS", "2"))
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "50"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "5"))
+EMAIL_RETRY_BASE = float(os.getenv("EMAIL_RETRY_BASE", "2"))
+EMAIL_RETRY_MAX = float(os.getenv("EMAIL_RETRY_MAX", "300"))
+EMAIL_POLL_SECONDS = float(os.getenv("EMAIL_POLL_SECONDS", "2"))
+EMAIL_LEASE_SECONDS = int(os.getenv("EMAIL_LEASE_SECONDS", "60"))
+EMAIL_TIMEOUT = float(os.getenv("EMAIL_TIMEOUT", "10"))
+EMAIL_RETENTION_DAYS = int(os.getenv("EMAIL_RETENTION_DAYS", "7"))
+
+# SendGrid accepts up to 1000 personalizations per request when the content is shared
+SENDGRID_MAX_PERSONALIZATIONS = 1000
+
+
+class SendGridTransport:
+    """SendGrid v3 mail/send over one pooled keep-alive session."""
+
+    def __init__(self, api_key=None, from_email=None, timeout=EMAIL_TIMEOUT):
+        self.api_key = api_key or os.getenv("SENDGRID_API_KEY")
+        self.from_email = from_email or os.getenv("FROM_EMAIL")
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=max(EMAIL_WORKERS, 1)))
+
+    def send(self, subject, body, recipients):
+        """Send one message to each recipient (one personalization each). Returns (ok, error)."""
+        data = {
+            "personalizations": [{"to": [{"email": r}], "subject": subject} for r in recipients],
+            "from": {"email": self.from_email},
+            "content": [{"type": "text/plain", "value": body}],
+        }
+        headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+        started = time.perf_counter()
+        try:
+            response = self.session.post(SENDGRID_URL, headers=headers, json=data, timeout=self.timeout)
+        except requests.RequestException as e:
+            observe_upstream("sendgrid", "mail_send", time.perf_counter() - started, "error")
+            return False, str(e)
+        observe_upstream("sendgrid", "mail_send", time.perf_counter() - started, str(response.status_code))
+        if response.status_code in [200, 202]:
+            return True, None
+        return False, f"{response.status_code} {response.text[:200]}"
+
+
+class LocalTransport:
+    """Stand-in transport that records messages in memory instead of sending them."""
+
+    def __init__(self):
+        self.outbox = []
+        self._lock = threading.Lock()
+
+    def send(self, subject, body, recipients):
+        with self._lock:
+            for r in recipients:
+                self.outbox.append({"to": r, "subject": subject, "body": body})
+        return True, None
+
+
+def make_transport(name=EMAIL_TRANSPORT):
+    return LocalTransport() if name == "local" else SendGridTransport()
+
+
+class EmailQueue:
+    """
+    Durable outbound email queue in Mongo (`email_jobs`).
+    Requests enqueue and return immediately; worker threads claim due jobs with a lease,
+    group jobs that share subject and body into one SendGrid call, and reschedule failures
+    with jittered exponential backoff until EMAIL_MAX_ATTEMPTS. Jobs whose worker died are
+    reclaimed when their lease expires. Finished jobs are removed by a TTL index.
+    """
+
+    def __init__(self, collection, transport=None, workers=EMAIL_WORKERS, batch_size=EMAIL_BATCH_SIZE):
+        self.collection = collection
+        self.transport = transport or make_transport()
+        self.workers = workers
+        self.batch_size = batch_size
+        self.worker_id = uuid.uuid4().hex[:12]
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._threads_pid = None
+        self._start_lock = threading.Lock()
+        self._indexes_ready = False
+
+    def _ensure_indexes(self):
+        if self._indexes_ready:
+            return
+        self.collection.create_index([("status", ASCENDING), ("next_attempt_at", ASCENDING)])
+        self.collection.create_index(
+            "finished_at", expireAfterSeconds=EMAIL_RETENTION_DAYS * 24 * 3600
+        )
+        self._indexes_ready = True
+
+    def started(self):
+        return bool(self._threads) and self._threads_pid == os.getpid()
+
+    def start(self):
+        """Start the worker threads once per process (restarted after a fork)."""
+        if self.started():
+            return self
+        with self._start_lock:
+            if self.started():
+                return self
+            self._ensure_indexes()
+            self._threads = [
+                threading.Thread(target=self._run, name=f"email-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            self._threads_pid = os.getpid()
+            for t in self._threads:
+                t.start()
+        return self
+
+    @staticmethod
+    def job_document(subject, recipient, body):
+        now = datetime.utcnow()
+        return {
+            "to": recipient,
+            "subject": subject,
+            "body": body,
+            "status": "pending",
+            "attempts": 0,
+            "created_at": now,
+            "next_attempt_at": now,
+        }
+
+    def enqueue(self, subject, recipient, body):
+        """Persist one email job and wake a worker. Returns the job id."""
+        self.start()
+        result = self.collection.insert_one(self.job_document(subject, recipient, body))
+        self._wakeup.set()
+        return result.inserted_id
+
+    async def enqueue_async(self, async_collection, subject, recipient, body):
+        """Same as enqueue() but inserts through a Motor collection (ASGI app)."""
+        if not self.started():
+            # Index creation and thread start are blocking pymongo work; keep them off the event loop
+            await asyncio.get_running_loop().run_in_executor(None, self.start)
+        result = await async_collection.insert_one(self.job_document(subject, recipient, body))
+        self._wakeup.set()
+        return result.inserted_id
+
+    # --- Worker side ---
+    def _claim(self):
+        """Atomically lease up to batch_size due jobs for this worker."""
+        jobs = []
+        while len(jobs) < self.batch_size:
+            now = datetime.utcnow()
+            job = self.collection.find_one_and_update(
+                {"$or": [
+                    {"status": "pending", "next_attempt_at": {"$lte": now}},
+                    {"status": "sending", "locked_until": {"$lt": now}},
+                ]},
+                {"$set": {"status": "sending", "locked_by": self.worker_id,
+                          "locked_until": now + timedelta(seconds=EMAIL_LEASE_SECONDS)}},
+                sort=[("next_attempt_at", ASCENDING)],
+                return_document=ReturnDocument.AFTER,
+            )
+            if job is None:
+                break
+            jobs.append(job)
+        return jobs
+
+    def _complete(self, jobs):
+        now = datetime.utcnow()
+        self.collection.update_many(
+            {"_id": {"$in": [j["_id"] for j in jobs]}},
+            {"$set": {"status": "sent", "finished_at": now},
+             "$inc": {"attempts": 1},
+             # The body carries one-time codes; only the delivery record is kept until the TTL
+             "$unset": {"locked_by": "", "locked_until": "", "body": ""}},
+        )
+
+    def _fail(self, job, error):
+        attempts = job.get("attempts", 0) + 1
+        now = datetime.utcnow()
+        unset = {"locked_by": "", "locked_until": ""}
+        if attempts >= EMAIL_MAX_ATTEMPTS:
+            update = {"status": "failed", "finished_at": now}
+            unset["body"] = ""
+            print(f"❌ Email to {job['to']} failed permanently: {error}")
+        else:
+            delay = min(EMAIL_RETRY_MAX, EMAIL_RETRY_BASE * (2 ** (attempts - 1)))
+            delay = random.uniform(delay / 2, delay)
+            update = {"status": "pending", "next_attempt_at": now + timedelta(seconds=delay)}
+        update.update({"attempts": attempts, "last_error": error})
+        self.collection.update_one({"_id": job["_id"]}, {"$set": update, "$unset": unset})
+
+    def process_once(self):
+        """Claim and send one batch; returns the number of jobs handled."""
+        jobs = self._claim()
+        groups = {}
+        for job in jobs:
+            groups.setdefault((job["subject"], job["body"]), []).append(job)
+
+        for (subject, body), group in groups.items():
+            for i in range(0, len(group), SENDGRID_MAX_PERSONALIZATIONS):
+                chunk = group[i:i + SENDGRID_MAX_PERSONALIZATIONS]
+                ok, error = self.transport.send(subject, body, [j["to"] for j in chunk])
+                if ok:
+                    self._complete(chunk)
+                    print(f"✅ Email sent to {len(chunk)} recipient(s)")
+                else:
+                    for job in chunk:
+                        self._fail(job, error)
+        return len(jobs)
+
+    def _run(self):
+        while True:
+            try:
+                handled = self.process_once()
+            except Exception as e:
+                print(f"❌ Email worker error: {e}")
+                handled = 0
+            if not handled:
+                self._wakeup.wait(EMAIL_POLL_SECONDS)
+                self._wakeup.clear()
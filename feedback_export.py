@@ -0,0 +1,206 @@
+import base64
+import csv
+import io
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import DESCENDING, UpdateOne
+
+# === Feedback Export Configuration ===
+FEEDBACK_PAGE_SIZE = int(os.getenv("FEEDBACK_PAGE_SIZE", "100"))
+FEEDBACK_MAX_PAGE_SIZE = int(os.getenv("FEEDBACK_MAX_PAGE_SIZE", "1000"))
+# Rows fetched per keyset query while streaming an export
+FEEDBACK_EXPORT_PAGE_SIZE = int(os.getenv("FEEDBACK_EXPORT_PAGE_SIZE", "1000"))
+
+# Newest first; served by the feedbacks (timestamp, _id) index, so every page is an index range scan
+FEEDBACK_SORT = [("timestamp", DESCENDING), ("_id", DESCENDING)]
+CSV_COLUMNS = ["id", "timestamp", "source", "name", "email", "message"]
+
+
+def parse_time(value):
+    """ISO date or datetime query parameter -> naive UTC datetime (None when absent)."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"Invalid date: {value!r}")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def start_of_day(value):
+    return datetime(value.year, value.month, value.day)
+
+
+def encode_cursor(doc):
+    raw = json.dumps({"t": doc["timestamp"].isoformat(), "id": str(doc["_id"])})
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token):
+    """Opaque page token -> (timestamp, _id) of the last row already returned."""
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        return datetime.fromisoformat(raw["t"]), ObjectId(raw["id"])
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise ValueError("Invalid cursor")
+
+
+def feedback_query(since=None, until=None, source=None, after=None):
+    """Filter for [since, until) plus the keyset condition "strictly after `after`" in FEEDBACK_SORT order."""
+    clauses = []
+    if since:
+        clauses.append({"timestamp": {"$gte": since}})
+    if until:
+        clauses.append({"timestamp": {"$lt": until}})
+    if source:
+        clauses.append({"source": source})
+    if after:
+        ts, oid = after
+        clauses.append({"$or": [{"timestamp": {"$lt": ts}}, {"timestamp": ts, "_id": {"$lt": oid}}]})
+    if not clauses:
+        return {}
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def serialize(doc):
+    timestamp = doc.get("timestamp")
+    return {
+        "id": str(doc["_id"]),
+        "timestamp": timestamp.isoformat() if isinstance(timestamp, datetime) else timestamp,
+        "source": doc.get("source"),
+        "name": doc.get("name"),
+        "email": doc.get("email"),
+        "message": doc.get("message"),
+    }
+
+
+def fetch_page(collection, limit=FEEDBACK_PAGE_SIZE, after=None, **filters):
+    """One page of raw documents and the token for the next page (None on the last page)."""
+    limit = max(1, min(limit, FEEDBACK_MAX_PAGE_SIZE))
+    docs = list(collection.find(feedback_query(after=after, **filters), sort=FEEDBACK_SORT,
+                                limit=limit, batch_size=limit))
+    next_cursor = encode_cursor(docs[-1]) if len(docs) == limit else None
+    return docs, next_cursor
+
+
+def iter_feedback(collection, page_size=FEEDBACK_EXPORT_PAGE_SIZE, **filters):
+    """
+    Yield every matching document, one keyset page at a time. Memory stays at one page, and no
+    cursor is held open between pages, so long exports cannot hit a cursor timeout.
+    """
+    after = None
+    while True:
+        docs = list(collection.find(feedback_query(after=after, **filters), sort=FEEDBACK_SORT,
+                                    limit=page_size, batch_size=page_size))
+        yield from docs
+        if len(docs) < page_size:
+            return
+        after = (docs[-1]["timestamp"], docs[-1]["_id"])
+
+
+def export_ndjson(docs):
+    for doc in docs:
+        yield json.dumps(serialize(doc), ensure_ascii=False) + "\n"
+
+
+def export_csv(docs):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for doc in docs:
+        row = serialize(doc)
+        writer.writerow([row[column] if row[column] is not None else "" for column in CSV_COLUMNS])
+        if buffer.tell() >= 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+# === Daily rollup ===
+# feedback_daily holds one document per UTC day: {_id: "YYYY-MM-DD", day, total, sources: {source: n}}.
+# FeedbackPipeline bumps it with $inc after every bulk insert; rebuild_daily_counts() recomputes
+# it from the raw collection (backfill, or repair after a failed increment).
+
+def day_key(timestamp):
+    return timestamp.strftime("%Y-%m-%d")
+
+
+def rollup_updates(docs):
+    """UpdateOne operations adding `docs` to their days' counters."""
+    counts = {}
+    for doc in docs:
+        key = (day_key(doc["timestamp"]), doc.get("source") or "unknown")
+        counts[key] = counts.get(key, 0) + 1
+    per_day = {}
+    for (day, source), n in counts.items():
+        per_day.setdefault(day, {})[source] = n
+    return [
+        UpdateOne(
+            {"_id": day},
+            {"$inc": {"total": sum(sources.values()), **{f"sources.{s}": n for s, n in sources.items()}},
+             "$setOnInsert": {"day": datetime.strptime(day, "%Y-%m-%d")}},
+            upsert=True,
+        )
+        for day, sources in per_day.items()
+    ]
+
+
+def daily_counts(rollup, since=None, until=None):
+    """Daily totals from the rollup collection for [since, until), oldest first."""
+    match = {}
+    if since or until:
+        match["day"] = {}
+        if since:
+            match["day"]["$gte"] = start_of_day(since)
+        if until:
+            match["day"]["$lt"] = until
+    pipeline = [
+        {"$match": match},
+        {"$sort": {"day": 1}},
+        {"$project": {"_id": 0, "day": "$_id", "total": 1, "sources": 1}},
+    ]
+    return list(rollup.aggregate(pipeline))
+
+
+def rebuild_daily_counts(feedbacks, rollup, since=None, until=None):
+    """
+    Recompute the rollup for [since, until) (everything when both are None) from the raw
+    feedback with one $group pipeline, replacing the affected days. The range is widened to
+    whole days so no day is overwritten with a partial count. Returns the days written.
+    """
+    if since:
+        since = start_of_day(since)
+    if until and until != start_of_day(until):
+        until = start_of_day(until) + timedelta(days=1)
+    match = feedback_query(since=since, until=until)
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {"day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
+                    "source": {"$ifNull": ["$source", "unknown"]}},
+            "count": {"$sum": 1},
+        }},
+    ]
+    per_day = {}
+    for row in feedbacks.aggregate(pipeline, allowDiskUse=True):
+        per_day.setdefault(row["_id"]["day"], {})[row["_id"]["source"]] = row["count"]
+
+    if not per_day:
+        return 0
+    rollup.bulk_write([
+        UpdateOne(
+            {"_id": day},
+            {"$set": {"day": datetime.strptime(day, "%Y-%m-%d"), "total": sum(sources.values()),
+                      "sources": sources}},
+            upsert=True,
+        )
+        for day, sources in per_day.items()
+    ], ordered=False)
+    return len(per_day)
@@ -0,0 +1,200 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from feedback_export import rollup_updates
+
+# === Feedback Ingestion Configuration ===
+FEEDBACK_BUFFER_SIZE = int(os.getenv("FEEDBACK_BUFFER_SIZE", "10000"))
+FEEDBACK_BATCH_SIZE = int(os.getenv("FEEDBACK_BATCH_SIZE", "500"))
+FEEDBACK_FLUSH_MS = float(os.getenv("FEEDBACK_FLUSH_MS", "1000"))
+# How long submit() waits for buffer space before reporting backpressure
+FEEDBACK_ENQUEUE_TIMEOUT_MS = float(os.getenv("FEEDBACK_ENQUEUE_TIMEOUT_MS", "50"))
+FEEDBACK_WRITE_RETRIES = int(os.getenv("FEEDBACK_WRITE_RETRIES", "3"))
+FEEDBACK_SHUTDOWN_TIMEOUT = float(os.getenv("FEEDBACK_SHUTDOWN_TIMEOUT", "10"))
+FEEDBACK_MAX_LENGTH = int(os.getenv("FEEDBACK_MAX_LENGTH", "5000"))
+
+_STOP = object()
+
+
+class FeedbackBackpressure(Exception):
+    """Raised when the buffer is full (or closing) and the caller should retry later."""
+
+
+def feedback_document(data, source, require_contact=False):
+    """
+    Validate a feedback payload into the single stored schema:
+    {name, email, message, source, timestamp (UTC)}. Raises ValueError with a client message.
+    """
+    name, email, message = data.get("name"), data.get("email"), data.get("message")
+    if require_contact and not (name and email and message):
+        raise ValueError("Missing fields")
+    if not message:
+        raise ValueError("Feedback message is required")
+    if not all(isinstance(v, str) for v in (name or "", email or "", message)):
+        raise ValueError("Feedback fields must be strings")
+    message = message.strip()
+    if not message:
+        raise ValueError("Feedback message is required")
+    if len(message) > FEEDBACK_MAX_LENGTH:
+        raise ValueError(f"Feedback message is limited to {FEEDBACK_MAX_LENGTH} characters")
+    return {
+        "name": name.strip() if name else None,
+        "email": email.strip() if email else "anonymous",
+        "message": message,
+        "source": source,
+        "timestamp": datetime.utcnow(),
+    }
+
+
+class FeedbackPipeline:
+    """
+    Buffered feedback writer. Requests append validated documents to a bounded in-process
+    queue and return; one writer thread per process drains it with unordered insert_many
+    whenever FEEDBACK_BATCH_SIZE documents are waiting or FEEDBACK_FLUSH_MS has passed since
+    the first one. A full buffer pushes back on callers (FeedbackBackpressure) rather than
+    growing without bound. The buffer is flushed on interpreter exit.
+    When `rollup` is given, each flush also bumps the per-day counters there (feedback_export.py).
+    """
+
+    def __init__(self, collection, rollup=None, buffer_size=FEEDBACK_BUFFER_SIZE,
+                 batch_size=FEEDBACK_BATCH_SIZE, flush_ms=FEEDBACK_FLUSH_MS):
+        self.collection = collection
+        self.rollup = rollup
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.0, flush_ms) / 1000.0
+        self._queue = queue.Queue(maxsize=max(1, buffer_size))
+        self._stopped = threading.Event()
+        self._closing = False
+        self._worker = None
+        self._worker_pid = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"accepted": 0, "rejected": 0, "written": 0, "failed": 0, "batches": 0}
+
+    def start(self):
+        """Start the writer thread once per process (restarted after a fork)."""
+        if self._worker is not None and self._worker_pid == os.getpid():
+            return self
+        with self._start_lock:
+            if self._worker is not None and self._worker_pid == os.getpid():
+                return self
+            self._stopped.clear()
+            self._closing = False
+            self._worker = threading.Thread(target=self._run, name="feedback-writer", daemon=True)
+            self._worker_pid = os.getpid()
+            self._worker.start()
+            atexit.register(self.close)
+        return self
+
+    def submit(self, document, timeout=FEEDBACK_ENQUEUE_TIMEOUT_MS / 1000.0):
+        """Buffer one document; raises FeedbackBackpressure if no space frees up within `timeout`."""
+        self.start()
+        if self._closing:
+            self._count(rejected=1)
+            raise FeedbackBackpressure("Feedback service is shutting down")
+        try:
+            if timeout:
+                self._queue.put(document, timeout=timeout)
+            else:
+                self._queue.put_nowait(document)
+        except queue.Full:
+            self._count(rejected=1)
+            raise FeedbackBackpressure("Feedback buffer is full")
+        self._count(accepted=1)
+
+    def close(self, timeout=FEEDBACK_SHUTDOWN_TIMEOUT):
+        """Stop accepting feedback and wait for everything buffered to be written."""
+        if self._worker is None or self._worker_pid != os.getpid() or self._closing:
+            return
+        self._closing = True
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            print("⚠️ Feedback buffer did not drain before shutdown")
+            return
+        if not self._stopped.wait(timeout):
+            print(f"⚠️ Feedback flush still running after {timeout}s, {self._queue.qsize()} buffered")
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["buffered"] = self._queue.qsize()
+        return stats
+
+    def _count(self, **deltas):
+        with self._stats_lock:
+            for key, n in deltas.items():
+                self._stats[key] += n
+
+    # --- Writer side ---
+    def _next_batch(self):
+        """Block for the first document, then collect until the batch is full or the window ends."""
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _write(self, batch):
+        for attempt in range(FEEDBACK_WRITE_RETRIES + 1):
+            try:
+                self.collection.insert_many(batch, ordered=False)
+                stored = batch
+            except BulkWriteError as e:
+                # insert_many assigned each document an _id before sending, so a retry after a
+                # partial write reports the already-stored ones as duplicate-key errors here
+                rejected = {err["index"] for err in (e.details or {}).get("writeErrors", [])
+                            if not (attempt and err.get("code") == 11000)}
+                stored = [doc for i, doc in enumerate(batch) if i not in rejected]
+                if rejected:
+                    print(f"⚠️ {len(rejected)} feedback document(s) rejected by Mongo")
+            except PyMongoError as e:
+                if attempt == FEEDBACK_WRITE_RETRIES:
+                    self._count(failed=len(batch))
+                    print(f"❌ Dropped {len(batch)} feedback document(s): {e}")
+                    return
+                time.sleep(min(5.0, 0.5 * (2 ** attempt)))
+                continue
+            self._count(written=len(stored), failed=len(batch) - len(stored), batches=1)
+            self._update_rollup(stored)
+            return
+
+    def _update_rollup(self, docs):
+        if self.rollup is None or not docs:
+            return
+        try:
+            self.rollup.bulk_write(rollup_updates(docs), ordered=False)
+        except PyMongoError as e:
+            # Not retried: a replayed $inc could double count. rebuild_daily_counts() repairs drift.
+            print(f"⚠️ Feedback daily rollup update failed: {e}")
+
+    def _run(self):
+        while True:
+            stop = False
+            try:
+                batch, stop = self._next_batch()
+                if batch:
+                    self._write(batch)
+            except Exception as e:
+                print(f"❌ Feedback writer error: {e}")
+            if stop:
+                self._stopped.set()
+                return
@@ -0,0 +1,228 @@
+import os
+import threading
+from collections import Counter
+from pathlib import Path
+
+# === Local Inference Configuration ===
+# PREDICTION_MODE: "remote" (proxy to the HF Space), "local" (in-process only)
+# or "local-fallback" (in-process, falling back to the Space on any local error).
+PREDICTION_MODE = os.getenv("PREDICTION_MODE", "remote").strip().lower()
+MODEL_DIR = Path(os.getenv("MODEL_DIR", Path(__file__).parent / "models"))
+TOP_K = int(os.getenv("PREDICTION_TOP_K", "3"))
+
+VECTORIZER_FILE = "symptom_vectorizer.pkl"
+SCALER_FILE = "medical_scaler.pkl"
+MODEL_FILES = {
+    "logistic_regression": "best_medical_model_logistic_regression.pkl",
+    "ensemble": "ensemble_medical_model.pkl",
+}
+
+# Payload keys accepted for each scaler column, in the scaler's training order.
+VITAL_ALIASES = [
+    ("Blood Pressure", ("blood_pressure", "bloodPressure", "bp", "Blood Pressure")),
+    ("Heart Rate (bpm)", ("heart_rate", "heartRate", "pulse", "Heart Rate (bpm)")),
+    ("Age", ("age", "Age")),
+    ("Temperature (°F)", ("temperature", "temp", "Temperature (°F)")),
+    ("Oxygen Saturation (%)", ("oxygen_saturation", "oxygenSaturation", "spo2", "Oxygen Saturation (%)")),
+]
+
+
+class LocalModelUnavailable(Exception):
+    """Raised when the model artifacts cannot be loaded in this worker."""
+
+
+def symptoms_to_text(symptoms):
+    """Accept a list of symptoms or a free-text string and return the vectorizer input."""
+    if isinstance(symptoms, (list, tuple, set)):
+        return " ".join(str(s) for s in symptoms)
+    return str(symptoms or "")
+
+
+def _to_float(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, str) and "/" in value:
+        # "120/80" -> systolic; the scaler was trained on a single BP value
+        value = value.split("/", 1)[0]
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class LocalPredictor:
+    """
+    In-process diagnosis engine: TF-IDF symptoms -> standard-scaled vitals -> classifiers.
+    Artifacts are loaded once; instances are read-only afterwards and safe to share across threads.
+    """
+
+    def __init__(self, model_dir=MODEL_DIR):
+        # numpy/scipy/joblib (and sklearn, via unpickling) are imported here rather than at module
+        # level, so importing this module for PREDICTION_MODE stays cheap in remote mode.
+        import joblib
+        import numpy as np
+
+        model_dir = Path(model_dir)
+        try:
+            self.vectorizer = joblib.load(model_dir / VECTORIZER_FILE)
+            scaler = joblib.load(model_dir / SCALER_FILE)
+        except Exception as e:
+            raise LocalModelUnavailable(f"Could not load preprocessing artifacts: {e}")
+
+        # Apply StandardScaler as plain arrays; avoids sklearn's per-call validation
+        # and feature-name checks on the hot path.
+        self.vital_names = [name for name, _ in VITAL_ALIASES]
+        self.vital_mean = np.asarray(scaler.mean_, dtype=np.float64)
+        self.vital_scale = np.asarray(scaler.scale_, dtype=np.float64)
+
+        # Word-unigram vectorizers can be updated term by term (see term_counts / text_row):
+        # the document is then just the sum of its symptoms' tokens.
+        vectorizer = self.vectorizer
+        self.incremental = (
+            getattr(vectorizer, "analyzer", None) == "word"
+            and tuple(getattr(vectorizer, "ngram_range", (1, 1))) == (1, 1)
+            and hasattr(vectorizer, "vocabulary_")
+            and (not getattr(vectorizer, "use_idf", False) or hasattr(vectorizer, "idf_"))
+        )
+        if self.incremental:
+            self.analyzer = vectorizer.build_analyzer()
+            self.idf = np.asarray(vectorizer.idf_, dtype=np.float64) if getattr(vectorizer, "use_idf", False) else None
+
+        self.models = {}
+        for name, filename in MODEL_FILES.items():
+            path = model_dir / filename
+            if path.exists():
+                self.models[name] = joblib.load(path)
+        if not self.models:
+            raise LocalModelUnavailable(f"No classifier found in {model_dir}")
+
+        print(f"✅ Local predictor loaded models: {', '.join(self.models)}")
+
+    # --- Featurization ---
+    def vitals_row(self, payload):
+        """Raw vitals for one payload; missing values fall back to the training mean."""
+        import numpy as np
+
+        row = np.array(self.vital_mean, copy=True)
+        for i, (_, aliases) in enumerate(VITAL_ALIASES):
+            for key in aliases:
+                value = _to_float(payload.get(key))
+                if value is not None:
+                    row[i] = value
+                    break
+        return row
+
+    def featurize(self, payloads):
+        """Build the stacked sparse feature matrix for a list of payloads."""
+        import numpy as np
+        from scipy import sparse
+
+        texts = [symptoms_to_text(p.get("symptoms")) for p in payloads]
+        text_features = self.vectorizer.transform(texts)
+        vitals = np.vstack([self.vitals_row(p) for p in payloads])
+        scaled = (vitals - self.vital_mean) / self.vital_scale
+        return sparse.hstack([text_features, sparse.csr_matrix(scaled)], format="csr")
+
+    # --- Incremental featurization (prediction sessions) ---
+    def term_counts(self, symptoms):
+        """Vocabulary column -> raw term count for `symptoms` (only when self.incremental)."""
+        vocabulary = self.vectorizer.vocabulary_
+        counts = Counter()
+        for term in self.analyzer(symptoms_to_text(symptoms)):
+            column = vocabulary.get(term)
+            if column is not None:
+                counts[column] += 1
+        return counts
+
+    def text_row(self, counts):
+        """
+        TF-IDF row for raw term counts as (columns, values), computed the way the vectorizer's
+        transform does (binary / sublinear tf, idf, norm) but only over the non-zero columns.
+        """
+        import numpy as np
+
+        vectorizer = self.vectorizer
+        columns = np.array(sorted(column for column, n in counts.items() if n > 0), dtype=np.int32)
+        values = np.array([counts[column] for column in columns], dtype=np.float64)
+        if getattr(vectorizer, "binary", False):
+            values[:] = 1.0
+        if getattr(vectorizer, "sublinear_tf", False):
+            values = 1.0 + np.log(values)
+        if self.idf is not None:
+            values *= self.idf[columns]
+        norm = getattr(vectorizer, "norm", None)
+        if norm == "l2" and values.size:
+            values /= np.sqrt(np.dot(values, values))
+        elif norm == "l1" and values.size:
+            values /= np.abs(values).sum()
+        return columns, values
+
+    def transform_text_row(self, symptoms):
+        """(columns, values) via the vectorizer itself, for vectorizers text_row cannot mirror."""
+        import numpy as np
+
+        row = self.vectorizer.transform([symptoms_to_text(symptoms)]).tocsr()
+        row.sort_indices()
+        return row.indices.astype(np.int32), row.data.astype(np.float64)
+
+    def scaled_vitals(self, payload):
+        return (self.vitals_row(payload) - self.vital_mean) / self.vital_scale
+
+    def feature_row(self, text_columns, text_values, scaled_vitals):
+        """One CSR feature row (text columns, then the vitals) built directly from its parts."""
+        import numpy as np
+        from scipy import sparse
+
+        n_text = len(self.vectorizer.vocabulary_)
+        indices = np.concatenate([text_columns, np.arange(n_text, n_text + len(scaled_vitals), dtype=np.int32)])
+        data = np.concatenate([text_values, scaled_vitals])
+        return sparse.csr_matrix((data, indices, np.array([0, len(indices)])),
+                                 shape=(1, n_text + len(scaled_vitals)))
+
+    # --- Scoring ---
+    def score(self, features):
+        """Score a feature matrix with every loaded model; returns one result dict per row."""
+        import numpy as np
+
+        per_model = {name: model.predict_proba(features) for name, model in self.models.items()}
+        results = []
+        for i in range(features.shape[0]):
+            model_results = {}
+            for name, proba in per_model.items():
+                classes = self.models[name].classes_
+                order = np.argsort(proba[i])[::-1][:TOP_K]
+                model_results[name] = {
+                    "prediction": str(classes[order[0]]),
+                    "confidence": float(proba[i][order[0]]),
+                    "top_predictions": [
+                        {"disease": str(classes[j]), "probability": float(proba[i][j])} for j in order
+                    ],
+                }
+            best_model = max(model_results, key=lambda n: model_results[n]["confidence"])
+            results.append({
+                "prediction": model_results[best_model]["prediction"],
+                "confidence": model_results[best_model]["confidence"],
+                "model_used": best_model,
+                "all_results": model_results,
+            })
+        return results
+
+    def predict_batch(self, payloads):
+        return self.score(self.featurize(payloads))
+
+    def predict(self, payload):
+        return self.predict_batch([payload])[0]
+
+
+_predictor = None
+_predictor_lock = threading.Lock()
+
+
+def get_local_predictor():
+    """Return the per-process LocalPredictor, loading the artifacts on first use."""
+    global _predictor
+    if _predictor is None:
+        with _predictor_lock:
+            if _predictor is None:
+                _predictor = LocalPredictor()
+    return _predictor
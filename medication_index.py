@@ -0,0 +1,208 @@
+import re
+
+from medication_patterns import default_patterns, brand_aliases
+
+DEFAULT_INTAKE = "1-0-1"
+DEFAULT_TIMING = "after food"
+
+# Tokens that describe strength or dosage form; never part of the drug itself, always dropped
+_STRENGTH_RE = re.compile(r"^\d+(\.\d+)?(mg|mcg|µg|g|ml|iu|units?|%)?$")
+_FORM_TOKENS = {
+    "mg", "mcg", "g", "ml", "iu", "unit", "units",
+    "tab", "tabs", "tablet", "tablets", "cap", "caps", "capsule", "capsules",
+    "syrup", "suspension", "injection", "inj", "drops", "cream", "gel", "ointment", "inhaler",
+    "sr", "er", "xr", "xl", "cr", "dr", "od", "mr", "ds", "forte", "plus",
+}
+# Salt / counter-ion tokens: dropped only when a real drug base is left ("diclofenac sodium")
+_SALT_TOKENS = {
+    "hcl", "hydrochloride", "besylate", "besilate", "maleate", "mesylate", "succinate",
+    "tartrate", "citrate", "sodium", "potassium", "calcium", "magnesium", "sulfate", "sulphate",
+    "phosphate", "acetate", "fumarate", "bromide", "dihydrate", "monohydrate", "trihydrate",
+}
+# Minerals and ions that are the active ingredient when nothing else is named
+# ("sodium bicarbonate", "iron sulfate", "magnesium hydroxide")
+_MINERAL_TOKENS = {
+    "sodium", "potassium", "calcium", "magnesium", "iron", "ferrous", "ferric", "zinc", "lithium",
+    "aluminium", "aluminum", "bicarbonate", "carbonate", "hydroxide", "chloride", "oxide", "gluconate",
+}
+
+
+def normalize_name(name):
+    """Lower-case, split on non-alphanumerics and collapse whitespace ("2.5mg" keeps its dot)."""
+    tokens = re.sub(r"[^0-9a-zµ%.]+", " ", str(name).lower()).split()
+    return " ".join(t.strip(".") for t in tokens if t.strip("."))
+
+
+def strip_forms(normalized):
+    """Drop strength and dosage-form tokens: "amlodipine 5 mg tab" -> "amlodipine"."""
+    tokens = [t for t in normalized.split() if t not in _FORM_TOKENS and not _STRENGTH_RE.match(t)]
+    return " ".join(tokens)
+
+
+def is_mineral_only(normalized):
+    """True when every token is a salt or mineral, i.e. the name has no separate drug base."""
+    return all(t in _SALT_TOKENS or t in _MINERAL_TOKENS for t in normalized.split())
+
+
+def strip_variants(normalized):
+    """
+    Drop strength, dosage-form and salt tokens: "amlodipine besylate 5 mg" -> "amlodipine".
+    Salt tokens stay when the name has no drug base besides them ("sodium bicarbonate").
+    """
+    base = strip_forms(normalized)
+    rest = " ".join(t for t in base.split() if t not in _SALT_TOKENS)
+    if not rest or is_mineral_only(rest):
+        return base
+    return rest
+
+
+def parse_pattern(pattern):
+    """ "1-0-1 after food" -> ("1-0-1", "after food") """
+    intake, _, timing = pattern.strip().partition(" ")
+    return intake, timing
+
+
+def max_edits(length):
+    # Tight on purpose: look-alike drugs (prednisone / prednisolone) are often 2 edits apart
+    if length <= 4:
+        return 0
+    if length <= 10:
+        return 1
+    return 2
+
+
+class _Node:
+    __slots__ = ("children", "value", "derived")
+
+    def __init__(self):
+        self.children = {}
+        self.value = None
+        # Key produced by salt stripping; matched exactly but never by edit distance
+        self.derived = False
+
+
+class MedicationIndex:
+    """
+    Immutable lookup index over dosing patterns, built once.
+    Keys are normalized names (plus their salt/strength-stripped forms and brand aliases)
+    stored in a character trie with pre-parsed (intake, timing, canonical_name) values.
+    Lookup order: exact -> stripped variant -> longest token prefix -> bounded edit distance.
+    Edit distance only runs on the form-stripped input against real names and aliases, and
+    only a single, untied closest candidate is accepted.
+    """
+
+    def __init__(self, patterns, aliases=None):
+        self._root = _Node()
+        self._size = 0
+        stripped = {}
+        for name, pattern in patterns.items():
+            key = normalize_name(name)
+            value = parse_pattern(pattern) + (name,)
+            self._insert(key, value)
+            stripped.setdefault(strip_variants(key), value)
+        # Stripped forms never shadow a real entry ("iron sulfate" stays exact)
+        for key, value in stripped.items():
+            if key and self._exact(key) is None:
+                self._insert(key, value, derived=True)
+        for alias, target in (aliases or {}).items():
+            value = self._exact(normalize_name(target))
+            if value is not None:
+                self._insert(normalize_name(alias), value)
+
+    def __len__(self):
+        return self._size
+
+    def _insert(self, key, value, derived=False):
+        node = self._root
+        for ch in key:
+            node = node.children.setdefault(ch, _Node())
+        if node.value is None:
+            self._size += 1
+        node.value = value
+        node.derived = derived
+
+    def _exact(self, key):
+        node = self._root
+        for ch in key:
+            node = node.children.get(ch)
+            if node is None:
+                return None
+        return node.value
+
+    def _token_prefix(self, key):
+        # Walk the trie once, remembering the last match that ends on a token boundary.
+        # A mineral-only entry never matches as a prefix: "magnesium hydroxide" is not "magnesium".
+        node, best = self._root, (0, None)
+        for i, ch in enumerate(key):
+            node = node.children.get(ch)
+            if node is None:
+                break
+            if (node.value is not None and (i + 1 == len(key) or key[i + 1] == " ")
+                    and (i + 1 == len(key) or not is_mineral_only(key[:i + 1]))):
+                best = (i + 1, node.value)
+        return best
+
+    def _names_other_drug(self, key, value):
+        """True when any run of tokens in `key` starts with a known drug or alias other than `value`."""
+        tokens = strip_variants(key).split()
+        found = (self._token_prefix(" ".join(tokens[i:]))[1] for i in range(len(tokens)))
+        return any(other is not None and other != value for other in found)
+
+    def _longest_token_prefix(self, key):
+        # A combination product is not its first ingredient: "paracetamol codeine" names a second
+        # drug after the match, so it gets no single-drug pattern at all
+        end, value = self._token_prefix(key)
+        if value is not None and self._names_other_drug(key[end:], value):
+            return None
+        return value
+
+    def _fuzzy(self, key, limit):
+        # Levenshtein over the trie, pruning branches whose best row value exceeds `limit`.
+        # Tracks every distinct value at the best distance so ties can be rejected.
+        best = [limit + 1, set()]
+        first_row = list(range(len(key) + 1))
+
+        def walk(node, ch, prev_row):
+            row = [prev_row[0] + 1]
+            for i in range(1, len(key) + 1):
+                cost = 0 if key[i - 1] == ch else 1
+                row.append(min(row[i - 1] + 1, prev_row[i] + 1, prev_row[i - 1] + cost))
+            if node.value is not None and not node.derived and row[-1] <= limit:
+                if row[-1] < best[0]:
+                    best[0], best[1] = row[-1], {node.value}
+                elif row[-1] == best[0]:
+                    best[1].add(node.value)
+            if min(row) <= best[0]:
+                for next_ch, child in node.children.items():
+                    walk(child, next_ch, row)
+
+        for ch, child in self._root.children.items():
+            walk(child, ch, first_row)
+        return next(iter(best[1])) if len(best[1]) == 1 else None
+
+    def lookup(self, name):
+        """Return (intake, timing, canonical_name) or None when nothing (or nothing unambiguous) matches."""
+        key = normalize_name(name)
+        if not key:
+            return None
+        base = strip_forms(key) or key
+        stripped = strip_variants(key) or key
+        value = (self._exact(key) or self._exact(base) or self._exact(stripped)
+                 or self._longest_token_prefix(key) or self._longest_token_prefix(stripped))
+        if value is None:
+            limit = max_edits(len(base))
+            if limit:
+                value = self._fuzzy(base, limit)
+        return value
+
+    def annotate(self, med):
+        """Set intake/timing on a medication dict in place, falling back to 1-0-1 after food."""
+        match = self.lookup(med.get("name", ""))
+        if match:
+            med["intake"], med["timing"] = match[0], match[1]
+        else:
+            med["intake"], med["timing"] = DEFAULT_INTAKE, DEFAULT_TIMING
+        return med
+
+
+medication_index = MedicationIndex(default_patterns, brand_aliases)
@@ -202,4 +202,65 @@ default_patterns= {
     "Pentoxifylline": "1-1-1 after food",
     "Methyldopa": "1-0-1 after food",
     "Clonidine": "1-0-1 after food"
-}
\ No newline at end of file
+}
+
+# Common brand and regional names mapped to the generic entry above
+brand_aliases = {
+    "Acetaminophen": "Paracetamol",
+    "Tylenol": "Paracetamol",
+    "Crocin": "Paracetamol",
+    "Calpol": "Paracetamol",
+    "Dolo": "Paracetamol",
+    "Panadol": "Paracetamol",
+    "Advil": "Ibuprofen",
+    "Motrin": "Ibuprofen",
+    "Brufen": "Ibuprofen",
+    "Voltaren": "Diclofenac",
+    "Albuterol": "Salbutamol",
+    "Ventolin": "Salbutamol",
+    "Zyrtec": "Cetirizine",
+    "Claritin": "Loratadine",
+    "Allegra": "Fexofenadine",
+    "Singulair": "Montelukast",
+    "Norvasc": "Amlodipine",
+    "Lipitor": "Atorvastatin",
+    "Crestor": "Rosuvastatin",
+    "Zocor": "Simvastatin",
+    "Plavix": "Clopidogrel",
+    "Coumadin": "Warfarin",
+    "Lasix": "Furosemide",
+    "Cozaar": "Losartan",
+    "Glucophage": "Metformin",
+    "Januvia": "Sitagliptin",
+    "Jardiance": "Empagliflozin",
+    "Lantus": "Insulin Glargine",
+    "Novorapid": "Insulin Aspart",
+    "Prilosec": "Omeprazole",
+    "Nexium": "Esomeprazole",
+    "Pantocid": "Pantoprazole",
+    "Zofran": "Ondansetron",
+    "Imodium": "Loperamide",
+    "Augmentin": "Amoxicillin-Clavulanate",
+    "Co-Amoxiclav": "Amoxicillin-Clavulanate",
+    "Zithromax": "Azithromycin",
+    "Cipro": "Ciprofloxacin",
+    "Flagyl": "Metronidazole",
+    "Keflex": "Cephalexin",
+    "Zoloft": "Sertraline",
+    "Prozac": "Fluoxetine",
+    "Lexapro": "Escitalopram",
+    "Xanax": "Alprazolam",
+    "Ativan": "Lorazepam",
+    "Keppra": "Levetiracetam",
+    "Lyrica": "Pregabalin",
+    "Neurontin": "Gabapentin",
+    "Synthroid": "Levothyroxine",
+    "Eltroxin": "Levothyroxine",
+    "Tamiflu": "Oseltamivir",
+    "Zovirax": "Acyclovir",
+    "Diflucan": "Fluconazole",
+    "Zyloprim": "Allopurinol",
+    "Flomax": "Tamsulosin",
+    "Viagra": "Sildenafil",
+    "Cialis": "Tadalafil",
+}
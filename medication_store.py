@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+
+from medication_patterns import default_patterns, brand_aliases
+from medication_index import MedicationIndex, medication_index
+
+# === Pattern Catalog Configuration ===
+MEDICATION_PATTERNS_POLL_SECONDS = float(os.getenv("MEDICATION_PATTERNS_POLL_SECONDS", "30"))
+
+VERSION_ID = "__version__"
+# Re-read a little history on each sync to tolerate clock skew between writers and workers
+SYNC_OVERLAP = timedelta(seconds=60)
+
+
+class MedicationPatternStore:
+    """
+    Dosing-pattern catalog kept in Mongo (`medication_patterns`), seeded from default_patterns.
+    Each worker holds an immutable MedicationIndex snapshot. A daemon thread polls a version
+    stamp document and, when it moves, pulls only the patterns updated since the last sync,
+    rebuilds the index off to the side and swaps the reference, so lookups never block.
+    Documents: {_id: name, pattern: "1-0-1 after food", updatedAt, deleted?}.
+    Edit the catalog through set_pattern / delete_pattern (the admin medication-patterns routes):
+    they stamp updatedAt and bump the version, which is what the pollers look for. A document
+    written by hand is only picked up if the writer does both itself.
+    """
+
+    def __init__(self, collection, poll_seconds=MEDICATION_PATTERNS_POLL_SECONDS):
+        self.collection = collection
+        self.poll_seconds = poll_seconds
+        self.index = medication_index  # built-in snapshot until the first sync succeeds
+        self._patterns = dict(default_patterns)
+        self._version = None
+        self._synced_at = None
+        self._thread = None
+        self._thread_pid = None
+        self._lock = threading.Lock()
+
+    # --- Seeding / writes ---
+    def seed(self):
+        """Insert any default pattern missing from the collection; never overwrites edits."""
+        now = datetime.utcnow()
+        ops = [
+            UpdateOne({"_id": name}, {"$setOnInsert": {"pattern": pattern, "updatedAt": now}}, upsert=True)
+            for name, pattern in default_patterns.items()
+        ]
+        result = self.collection.bulk_write(ops, ordered=False)
+        if result.upserted_count:
+            self._bump_version()
+            print(f"✅ Seeded {result.upserted_count} medication patterns")
+
+    def set_pattern(self, name, pattern):
+        """Create or update one pattern and publish it to every worker."""
+        self.collection.update_one(
+            {"_id": name},
+            {"$set": {"pattern": pattern, "updatedAt": datetime.utcnow(), "deleted": False}},
+            upsert=True,
+        )
+        self._bump_version()
+
+    def delete_pattern(self, name):
+        """Remove one pattern everywhere; returns False when there is no such (live) pattern."""
+        # Tombstone rather than delete so incremental syncs see the removal
+        result = self.collection.update_one(
+            {"_id": name, "deleted": {"$ne": True}}, {"$set": {"deleted": True, "updatedAt": datetime.utcnow()}}
+        )
+        if not result.matched_count:
+            return False
+        self._bump_version()
+        return True
+
+    def _bump_version(self):
+        self.collection.update_one({"_id": VERSION_ID}, {"$inc": {"version": 1}}, upsert=True)
+
+    # --- Sync ---
+    def refresh(self):
+        """Pull changes if the version stamp moved; returns True when a new snapshot was swapped in."""
+        with self._lock:
+            stamp = self.collection.find_one({"_id": VERSION_ID}, {"version": 1}) or {}
+            version = stamp.get("version", 0)
+            if version == self._version:
+                return False
+
+            query = {"_id": {"$ne": VERSION_ID}}
+            if self._synced_at is not None:
+                query["updatedAt"] = {"$gte": self._synced_at - SYNC_OVERLAP}
+            started = datetime.utcnow()
+
+            patterns = dict(self._patterns)
+            for doc in self.collection.find(query, {"pattern": 1, "deleted": 1}):
+                if doc.get("deleted"):
+                    patterns.pop(doc["_id"], None)
+                elif doc.get("pattern"):
+                    patterns[doc["_id"]] = doc["pattern"]
+
+            self.index = MedicationIndex(patterns, brand_aliases)
+            self._patterns = patterns
+            self._version = version
+            self._synced_at = started
+            print(f"🔄 Medication patterns synced (version {version}, {len(patterns)} entries)")
+            return True
+
+    def _poll(self):
+        while True:
+            time.sleep(self.poll_seconds)
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"⚠️ Medication pattern refresh failed: {e}")
+
+    def start(self):
+        """Seed, load the first snapshot and start the poller (once per process)."""
+        if self._thread is not None and self._thread_pid == os.getpid():
+            return self
+        try:
+            self.seed()
+            self.refresh()
+        except Exception as e:
+            print(f"⚠️ Using built-in medication patterns, catalog unavailable: {e}")
+        self._thread = threading.Thread(target=self._poll, name="medication-patterns", daemon=True)
+        self._thread_pid = os.getpid()
+        self._thread.start()
+        return self
+
+    def annotate(self, med):
+        return self.index.annotate(med)
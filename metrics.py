@@ -0,0 +1,209 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from pymongo import monitoring
+
+# === Metrics Configuration ===
+# Metrics are kept per process; with several gunicorn/uvicorn workers each one exposes its own
+# /metrics, which Prometheus scrapes and sums across instances.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# REQUEST_LOG: "json" writes one JSON line per finished request, "off" disables request logging
+REQUEST_LOG = os.getenv("REQUEST_LOG", "json").strip().lower()
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class Metric:
+    """Base for labelled metrics: one value slot per tuple of label values, guarded by a lock."""
+
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _label_text(self, values, extra=()):
+        pairs = list(zip(self.labels, values)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{escape_label(v)}"' for k, v in pairs) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for values, value in items:
+            lines.append(f"{self.name}{self._label_text(values)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *values, amount=1):
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, *values, amount=1):
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def dec(self, *values, amount=1):
+        self.inc(*values, amount=-amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, amount, *values):
+        index = bisect_left(self.buckets, amount)
+        with self._lock:
+            state = self._values.get(values)
+            if state is None:
+                # per-bucket counts (last slot is +Inf), sum, count
+                state = self._values[values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += amount
+            state[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted((k, ([*v[0]], v[1], v[2])) for k, v in self._values.items())
+        for values, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), counts):
+                cumulative += n
+                le = bound if bound == "+Inf" else repr(float(bound))
+                lines.append(f"{self.name}_bucket{self._label_text(values, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(values)} {total}")
+            lines.append(f"{self.name}_count{self._label_text(values)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Request latency by route.", ("method", "route")))
+http_requests_total = registry.register(Counter(
+    "http_requests_total", "Finished requests by route and status code.", ("method", "route", "status")))
+http_requests_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "Requests currently being handled.", ("route",)))
+upstream_duration = registry.register(Histogram(
+    "upstream_request_duration_seconds", "Latency of calls to external services.", ("upstream", "operation")))
+upstream_requests_total = registry.register(Counter(
+    "upstream_requests_total", "Calls to external services by outcome.", ("upstream", "operation", "outcome")))
+password_hash_duration = registry.register(Histogram(
+    "password_hash_duration_seconds", "Password hash/verify latency, including the wait for a pool worker.",
+    ("operation",)))
+password_hash_total = registry.register(Counter(
+    "password_hash_operations_total", "Password hashing operations by outcome.", ("operation", "outcome")))
+
+
+def render_latest():
+    return registry.render()
+
+
+# === Request instrumentation ===
+def request_started(route):
+    if METRICS_ENABLED:
+        http_requests_in_flight.inc(route)
+    return time.perf_counter()
+
+
+def request_finished(method, route, path, status, started):
+    elapsed = time.perf_counter() - started
+    if METRICS_ENABLED:
+        http_requests_in_flight.dec(route)
+        http_request_duration.observe(elapsed, method, route)
+        http_requests_total.inc(method, route, str(status))
+    if REQUEST_LOG == "json":
+        print(json.dumps({
+            "event": "request", "method": method, "route": route, "path": path,
+            "status": status, "duration_ms": round(elapsed * 1000, 2),
+        }, ensure_ascii=False))
+    return elapsed
+
+
+# === Upstream instrumentation ===
+def observe_upstream(upstream, operation, seconds, outcome="ok"):
+    """Record one external call. Pass seconds=None to count an outcome without a latency."""
+    if not METRICS_ENABLED:
+        return
+    if seconds is not None:
+        upstream_duration.observe(seconds, upstream, operation)
+    upstream_requests_total.inc(upstream, operation, outcome)
+
+
+@contextmanager
+def upstream_timer(upstream, operation):
+    """Time the enclosed block; the outcome is "error" if it raises, "ok" otherwise."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        observe_upstream(upstream, operation, time.perf_counter() - started, outcome)
+
+
+# === Password hashing instrumentation ===
+def observe_password_hash(operation, seconds, outcome="ok"):
+    """Record one hash/verify (or a "rehash" upgrade). Pass seconds=None to only count the outcome."""
+    if not METRICS_ENABLED:
+        return
+    if seconds is not None:
+        password_hash_duration.observe(seconds, operation)
+    password_hash_total.inc(operation, outcome)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """pymongo command listener feeding upstream_* metrics with upstream="mongo"."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        observe_upstream("mongo", event.command_name, event.duration_micros / 1e6, "ok")
+
+    def failed(self, event):
+        observe_upstream("mongo", event.command_name, event.duration_micros / 1e6, "error")
+
+
+def mongo_event_listeners():
+    """event_listeners argument for MongoClient / AsyncIOMotorClient."""
+    return [MongoCommandMetrics()] if METRICS_ENABLED else []
@@ -0,0 +1,187 @@
+import asyncio
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from metrics import observe_password_hash
+from password_worker import hash_password, verify_password
+
+# === Password Hashing Configuration ===
+# Any werkzeug method string: the algorithm plus its cost, e.g. "scrypt:32768:8:1" (n, r, p) or
+# "pbkdf2:sha256:600000" (iterations). Stored hashes made with other parameters are upgraded on login.
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+PASSWORD_SALT_LENGTH = int(os.getenv("PASSWORD_SALT_LENGTH", "16"))
+# Worker processes; 0 hashes on the calling thread (development / single-core hosts)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Jobs allowed in the pool at once (running + queued); further callers wait up to the queue timeout
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+PASSWORD_HASH_QUEUE_TIMEOUT_MS = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT_MS", "2000"))
+PASSWORD_HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", "10"))
+# Never "fork" by default: the app already runs threads (queue workers, warm-up, the server's own),
+# and a forked child inherits their locks in whatever state they were in. The forkserver preloads only
+# password_worker; workers still import a `python app.py` __main__ (not gunicorn/uvicorn entrypoints).
+PASSWORD_HASH_START_METHOD = os.getenv(
+    "PASSWORD_HASH_START_METHOD",
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn",
+)
+
+
+class PasswordHashingBusy(Exception):
+    """Raised when no pool slot frees up (or the result takes too long); the caller should retry later."""
+
+
+class PasswordHasher:
+    """
+    Runs password key derivation in a small process pool, off the request threads and outside
+    the GIL. At most `max_pending` jobs are in the pool at once, so a login storm queues here
+    (and eventually gets PasswordHashingBusy) instead of piling up CPU work without limit.
+    verify() also tells the caller when the stored hash should be replaced with one using the
+    configured method.
+    """
+
+    def __init__(self, method=PASSWORD_HASH_METHOD, salt_length=PASSWORD_SALT_LENGTH,
+                 workers=PASSWORD_HASH_WORKERS, max_pending=PASSWORD_HASH_MAX_PENDING):
+        self.method = method
+        self.salt_length = salt_length
+        self.workers = max(0, workers)
+        self.max_pending = max(1, max_pending)
+        self._canonical_method = None
+        self._executor = None
+        self._executor_pid = None
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Create the pool once per process (recreated after a fork) and resolve the method string."""
+        self.current_method()
+        if self.workers == 0:
+            return self
+        if self._executor is not None and self._executor_pid == os.getpid():
+            return self
+        with self._start_lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._slots = threading.BoundedSemaphore(self.max_pending)
+                self._executor = self._new_executor()
+                self._executor_pid = os.getpid()
+                atexit.register(self.close)
+        return self
+
+    def close(self):
+        """Shut the pool down; jobs already submitted still finish."""
+        if self._executor is not None and self._executor_pid == os.getpid():
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+            self._executor_pid = None
+
+    def current_method(self):
+        """The configured method with werkzeug's defaults filled in ("scrypt" -> "scrypt:32768:8:1")."""
+        if self._canonical_method is None:
+            self._canonical_method = hash_password("", self.method, 1).split("$", 1)[0]
+        return self._canonical_method
+
+    def needs_rehash(self, stored_hash):
+        return stored_hash.split("$", 1)[0] != self.current_method()
+
+    # --- Sync API (Flask) ---
+    def hash(self, password):
+        return self._call("hash", hash_password, password, self.method, self.salt_length)
+
+    def verify(self, stored_hash, password):
+        """(matches, new_hash); store new_hash (compare-and-set on stored_hash) when it is not None."""
+        return self._call("verify", verify_password, stored_hash, password, self.method, self.salt_length,
+                          self.needs_rehash(stored_hash))
+
+    def _call(self, operation, fn, *args):
+        started = time.perf_counter()
+        if self.workers == 0:
+            return self._observe(operation, started, fn(*args))
+        self.start()
+        slots = self._slots
+        if not slots.acquire(timeout=PASSWORD_HASH_QUEUE_TIMEOUT_MS / 1000.0):
+            observe_password_hash(operation, None, "busy")
+            raise PasswordHashingBusy("Password hashing is overloaded")
+        future = self._submit(slots, fn, *args)
+        try:
+            result = future.result(timeout=PASSWORD_HASH_TIMEOUT)
+        except FutureTimeout:
+            observe_password_hash(operation, None, "busy")
+            raise PasswordHashingBusy("Password hashing timed out")
+        return self._observe(operation, started, result)
+
+    # --- Async API (ASGI) ---
+    async def ahash(self, password):
+        return await self._acall("hash", hash_password, password, self.method, self.salt_length)
+
+    async def averify(self, stored_hash, password):
+        return await self._acall("verify", verify_password, stored_hash, password, self.method,
+                                 self.salt_length, self.needs_rehash(stored_hash))
+
+    async def _acall(self, operation, fn, *args):
+        started = time.perf_counter()
+        if self.workers == 0:
+            result = await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+            return self._observe(operation, started, result)
+        self.start()
+        slots = self._slots
+        # Poll rather than block: a blocking acquire would stall the event loop
+        deadline = started + PASSWORD_HASH_QUEUE_TIMEOUT_MS / 1000.0
+        while not slots.acquire(blocking=False):
+            if time.perf_counter() >= deadline:
+                observe_password_hash(operation, None, "busy")
+                raise PasswordHashingBusy("Password hashing is overloaded")
+            await asyncio.sleep(0.005)
+        future = self._submit(slots, fn, *args)
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), PASSWORD_HASH_TIMEOUT)
+        except asyncio.TimeoutError:
+            observe_password_hash(operation, None, "busy")
+            raise PasswordHashingBusy("Password hashing timed out")
+        return self._observe(operation, started, result)
+
+    # --- Internals ---
+    def _new_executor(self):
+        context = multiprocessing.get_context(PASSWORD_HASH_START_METHOD)
+        if PASSWORD_HASH_START_METHOD == "forkserver":
+            context.set_forkserver_preload(["password_worker"])
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+
+    def _submit(self, slots, fn, *args):
+        """Submit with a held slot; the slot is released when the job finishes, even after a timeout."""
+        try:
+            try:
+                future = self._executor.submit(fn, *args)
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM-killed); replace the pool once and retry
+                print("⚠️ Password hashing pool broken, restarting it")
+                with self._start_lock:
+                    self._executor = self._new_executor()
+                future = self._executor.submit(fn, *args)
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        return future
+
+    def _observe(self, operation, started, result):
+        observe_password_hash(operation, time.perf_counter() - started)
+        if operation == "verify" and result[1] is not None:
+            observe_password_hash("rehash", None)
+        return result
+
+
+_password_hasher = None
+_password_hasher_lock = threading.Lock()
+
+
+def get_password_hasher():
+    """Process-wide PasswordHasher; the pool itself starts on first use (or in warm-up)."""
+    global _password_hasher
+    if _password_hasher is None:
+        with _password_hasher_lock:
+            if _password_hasher is None:
+                _password_hasher = PasswordHasher()
+    return _password_hasher
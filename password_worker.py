@@ -0,0 +1,15 @@
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# The jobs the password hashing pool runs. Kept in their own module with nothing but werkzeug
+# imported, so a "forkserver"/"spawn" worker loads this instead of the app (see password_hasher).
+
+
+def hash_password(password, method, salt_length):
+    return generate_password_hash(password, method=method, salt_length=salt_length)
+
+
+def verify_password(stored_hash, password, method, salt_length, rehash):
+    """(matches, new_hash); new_hash is only computed for a correct password when `rehash` is set."""
+    if not check_password_hash(stored_hash, password):
+        return False, None
+    return True, hash_password(password, method, salt_length) if rehash else None
@@ -0,0 +1,102 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from local_predictor import get_local_predictor
+
+# === Micro-batching Configuration ===
+# PREDICTION_BATCH_MAX=1 disables coalescing (every request is scored on its own).
+PREDICTION_BATCH_MAX = int(os.getenv("PREDICTION_BATCH_MAX", "32"))
+PREDICTION_BATCH_WAIT_MS = float(os.getenv("PREDICTION_BATCH_WAIT_MS", "5"))
+PREDICTION_BATCH_TIMEOUT = float(os.getenv("PREDICTION_BATCH_TIMEOUT", "10"))
+
+
+class PredictionBatcher:
+    """
+    Coalesces concurrent prediction requests into one batched scoring call.
+    A single daemon thread waits for the first request, gathers more for up to
+    `max_wait_ms` or until `max_batch` items, then runs one sparse transform +
+    predict_proba over the stacked rows and hands each caller its own row.
+    """
+
+    def __init__(self, predictor, max_batch=PREDICTION_BATCH_MAX, max_wait_ms=PREDICTION_BATCH_WAIT_MS):
+        self.predictor = predictor
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_worker(self):
+        # Started lazily (and restarted after a fork) so pre-forking servers get one per worker
+        if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or self._worker_pid != os.getpid() or not self._worker.is_alive():
+                self._queue = queue.Queue()
+                self._worker = threading.Thread(target=self._run, name="prediction-batcher", daemon=True)
+                self._worker_pid = os.getpid()
+                self._worker.start()
+
+    def submit(self, payload):
+        """Queue one payload and return a Future resolving to its prediction dict."""
+        future = Future()
+        if self.max_batch == 1:
+            try:
+                future.set_result(self.predictor.predict(payload))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        self._ensure_worker()
+        self._queue.put((payload, future))
+        return future
+
+    def predict(self, payload, timeout=PREDICTION_BATCH_TIMEOUT):
+        return self.submit(payload).result(timeout=timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            futures = [f for _, f in batch]
+            try:
+                results = self.predictor.predict_batch([p for p, _ in batch])
+            except Exception:
+                # Isolate the bad payload so one malformed request doesn't fail its neighbours
+                for payload, f in batch:
+                    try:
+                        f.set_result(self.predictor.predict(payload))
+                    except Exception as e:
+                        f.set_exception(e)
+                continue
+            for f, result in zip(futures, results):
+                f.set_result(result)
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_prediction_batcher():
+    """Return the per-process PredictionBatcher wrapping the local predictor."""
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = PredictionBatcher(get_local_predictor())
+    return _batcher
@@ -0,0 +1,169 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+from local_predictor import PREDICTION_MODE, VITAL_ALIASES, _to_float
+from ttl_cache import TTLCache
+
+# === Prediction Cache Configuration ===
+PREDICTION_CACHE_ENABLED = os.getenv("PREDICTION_CACHE_ENABLED", "true").lower() == "true"
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "4096"))
+PREDICTION_CACHE_TTL = int(os.getenv("PREDICTION_CACHE_TTL", str(3600)))
+# Shared Mongo tier (prediction_cache collection); "false" keeps the cache per-process only
+PREDICTION_CACHE_SHARED = os.getenv("PREDICTION_CACHE_SHARED", "true").lower() == "true"
+PREDICTION_CACHE_SHARED_TTL = int(os.getenv("PREDICTION_CACHE_SHARED_TTL", str(6 * 3600)))
+# Bump after deploying a new model (or changing the Space) so old answers are not served
+PREDICTION_CACHE_VERSION = os.getenv("PREDICTION_CACHE_VERSION", "1")
+
+# Vitals are rounded to these steps before keying, so e.g. 121 and 122 bpm share an entry.
+# Keep them well inside clinical noise: the cached answer is served for the whole bucket.
+VITAL_BUCKETS = {
+    "Blood Pressure": 5,
+    "Heart Rate (bpm)": 5,
+    "Age": 1,
+    "Temperature (°F)": 0.2,
+    "Oxygen Saturation (%)": 1,
+}
+VITAL_KEYS = {key for _, aliases in VITAL_ALIASES for key in aliases}
+
+
+def _norm(value):
+    return " ".join(str(value or "").split()).lower()
+
+
+def canonical_symptoms(symptoms):
+    """List or comma-separated text -> sorted, de-duplicated, lower-cased symptom names."""
+    if isinstance(symptoms, (list, tuple, set)):
+        items = symptoms
+    else:
+        items = str(symptoms or "").split(",")
+    return sorted({_norm(s) for s in items if _norm(s)})
+
+
+def bucket_vital(name, value):
+    value = _to_float(value)
+    if value is None:
+        return None
+    step = VITAL_BUCKETS.get(name, 1)
+    return round(round(value / step) * step, 3)
+
+
+def canonical_prediction_input(payload):
+    """
+    The parts of a /predict payload that can change the answer, in a stable form: symptoms,
+    bucketed vitals (whichever alias the client used) and any other field, normalized.
+    """
+    canonical = {"symptoms": canonical_symptoms(payload.get("symptoms"))}
+    for name, aliases in VITAL_ALIASES:
+        canonical[name] = next(
+            (bucket_vital(name, payload[key]) for key in aliases if _to_float(payload.get(key)) is not None),
+            None,
+        )
+    # Fields we do not model are kept verbatim-ish so distinct requests are never conflated
+    for key, value in payload.items():
+        if key != "symptoms" and key not in VITAL_KEYS:
+            canonical[f"extra:{key}"] = _norm(value) if isinstance(value, str) else value
+    return canonical
+
+
+def prediction_cache_key(path, payload):
+    """Stable SHA-256 key for `payload` on `path`, or None when the payload cannot be keyed."""
+    if not isinstance(payload, dict):
+        return None
+    parts = {
+        "path": path,
+        "mode": PREDICTION_MODE,
+        "version": PREDICTION_CACHE_VERSION,
+        "input": canonical_prediction_input(payload),
+    }
+    try:
+        canonical = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    except (TypeError, ValueError):
+        return None
+    return f"predict:{hashlib.sha256(canonical.encode('utf-8')).hexdigest()}"
+
+
+def is_cacheable(body, status):
+    # Only successful scorings; upstream errors and empty bodies are retried next time
+    return status == 200 and isinstance(body, dict) and body and "error" not in body
+
+
+class PredictionCache:
+    """
+    Two-tier prediction cache, laid out like TreatmentCache: an in-process LRU+TTL in front
+    of an optional Mongo collection shared by all workers (expired by a TTL index on
+    `expiresAt`). get() also reports which tier answered, for the X-Cache header.
+    """
+
+    def __init__(self, collection=None, maxsize=PREDICTION_CACHE_SIZE, ttl=PREDICTION_CACHE_TTL,
+                 shared_ttl=PREDICTION_CACHE_SHARED_TTL):
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.collection = collection
+        self.shared_ttl = shared_ttl
+        self._index_ready = False
+        self._stats = {"local_hits": 0, "shared_hits": 0, "misses": 0, "stores": 0, "errors": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def _ensure_index(self):
+        if not self._index_ready:
+            self.collection.create_index("expiresAt", expireAfterSeconds=0)
+            self._index_ready = True
+
+    def get(self, key):
+        """(value, "local" | "shared") on a hit, (None, None) on a miss."""
+        value = self.local.get(key)
+        if value is not None:
+            self._count("local_hits")
+            return copy.deepcopy(value), "local"
+
+        if self.collection is not None:
+            try:
+                doc = self.collection.find_one(
+                    {"_id": key, "expiresAt": {"$gt": datetime.utcnow()}}, {"value": 1}
+                )
+            except Exception as e:
+                print(f"⚠️ Prediction cache read failed: {e}")
+                self._count("errors")
+                doc = None
+            if doc:
+                self._count("shared_hits")
+                self.local.set(key, doc["value"])
+                return copy.deepcopy(doc["value"]), "shared"
+
+        self._count("misses")
+        return None, None
+
+    def set(self, key, value, status=200):
+        if not is_cacheable(value, status):
+            return
+        value = copy.deepcopy(value)
+        self.local.set(key, value)
+        self._count("stores")
+        if self.collection is not None:
+            try:
+                self._ensure_index()
+                self.collection.update_one(
+                    {"_id": key},
+                    {"$set": {"value": value,
+                              "expiresAt": datetime.utcnow() + timedelta(seconds=self.shared_ttl)}},
+                    upsert=True,
+                )
+            except Exception as e:
+                print(f"⚠️ Prediction cache write failed: {e}")
+                self._count("errors")
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["local_hits"] + stats["shared_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((lookups - stats["misses"]) / lookups, 4) if lookups else 0.0
+        stats["local_entries"] = len(self.local)
+        stats["shared"] = self.collection is not None
+        return stats
@@ -0,0 +1,188 @@
+import os
+import secrets
+import threading
+
+from local_predictor import VITAL_ALIASES, _to_float
+from prediction_cache import canonical_symptoms
+from ttl_cache import TTLCache
+
+# === Prediction Session Configuration ===
+PREDICTION_SESSION_MAX = int(os.getenv("PREDICTION_SESSION_MAX", "10000"))
+# Idle lifetime; every update pushes the expiry back
+PREDICTION_SESSION_TTL = int(os.getenv("PREDICTION_SESSION_TTL", str(30 * 60)))
+PREDICTION_SESSION_MAX_SYMPTOMS = int(os.getenv("PREDICTION_SESSION_MAX_SYMPTOMS", "100"))
+
+
+def _symptom_list(value, field):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, (list, tuple)) or not all(isinstance(s, str) for s in value):
+        raise ValueError(f"{field} must be a list of strings")
+    return canonical_symptoms(value)
+
+
+def _vitals(payload):
+    """Canonical vital name -> (key the client used, number) for every vital present in `payload`."""
+    vitals = {}
+    for name, aliases in VITAL_ALIASES:
+        for key in aliases:
+            value = _to_float(payload.get(key))
+            if value is not None:
+                vitals[name] = (key, value)
+                break
+    return vitals
+
+
+class PredictionSession:
+    """
+    One user's symptom-refinement state: the symptom set, the vitals and the opening request's
+    other fields (passed on verbatim; a vital changed later is written under the client's key),
+    plus (when scored locally) the term counts, TF-IDF entries and scaled vitals behind the
+    last prediction.
+    apply() records a delta; rescore_local() folds it into the held row and scores that
+    single row, so a step costs O(changed terms) instead of a full featurize.
+    """
+
+    def __init__(self, session_id, symptoms, vitals, extra=None, lock=None):
+        self.id = session_id
+        self.symptoms = set(symptoms)
+        # Canonical name -> number for scoring, and canonical name -> the key the client used
+        self.vitals = {name: value for name, (_, value) in vitals.items()}
+        self.vital_keys = {name: key for name, (key, _) in vitals.items()}
+        self.extra = dict(extra or {})
+        self._updated_vitals = set()
+        # threading.Lock for Flask; the ASGI app passes an asyncio.Lock so waiters never block the loop
+        self.lock = lock if lock is not None else threading.Lock()
+        # Last successful (body, status, headers); reused when an update changes nothing
+        self.result = None
+        # Local feature state; None until the first local scoring (or after a mode fallback)
+        self.counts = None
+        self.text = None
+        self.scaled_vitals = None
+        self._added = []
+        self._removed = []
+        self._vitals_changed = False
+
+    def apply(self, add=(), remove=(), vitals=None):
+        """Record a delta. Returns True when anything actually changed."""
+        added = [s for s in add if s not in self.symptoms]
+        removed = [s for s in remove if s in self.symptoms and s not in add]
+        if len(self.symptoms) + len(added) - len(removed) > PREDICTION_SESSION_MAX_SYMPTOMS:
+            raise ValueError(f"A session is limited to {PREDICTION_SESSION_MAX_SYMPTOMS} symptoms")
+        self.symptoms.update(added)
+        self.symptoms.difference_update(removed)
+        self._added.extend(added)
+        self._removed.extend(removed)
+
+        changed_vitals = {name: (key, value) for name, (key, value) in (vitals or {}).items()
+                          if self.vitals.get(name) != value}
+        for name, (key, value) in changed_vitals.items():
+            self.vitals[name] = value
+            # A vital first set by this delta keeps the delta's key; known ones keep the original
+            self.vital_keys.setdefault(name, key)
+            self._updated_vitals.add(name)
+        if changed_vitals:
+            self._vitals_changed = True
+        return bool(added or removed or changed_vitals)
+
+    def client_vitals(self):
+        return {self.vital_keys[name]: value for name, value in self.vitals.items()}
+
+    def payload(self):
+        """Full /predict payload for the current state (remote scoring, cache keys)."""
+        updated = {self.vital_keys[name]: self.vitals[name] for name in self._updated_vitals}
+        return {**self.extra, "symptoms": sorted(self.symptoms), **updated}
+
+    def rescore_local(self, predictor):
+        """Score the current state in-process, updating only what the pending delta touched."""
+        if self.text is None or not predictor.incremental:
+            if predictor.incremental:
+                self.counts = predictor.term_counts(sorted(self.symptoms))
+                self.text = predictor.text_row(self.counts)
+            else:
+                self.text = predictor.transform_text_row(sorted(self.symptoms))
+            self.scaled_vitals = predictor.scaled_vitals(self.vitals)
+        else:
+            if self._added or self._removed:
+                self.counts.update(predictor.term_counts(self._added))
+                self.counts.subtract(predictor.term_counts(self._removed))
+                self.counts = +self.counts  # drop zero / negative columns
+                self.text = predictor.text_row(self.counts)
+            if self._vitals_changed:
+                self.scaled_vitals = predictor.scaled_vitals(self.vitals)
+        self.clear_delta()
+        return predictor.score(predictor.feature_row(*self.text, self.scaled_vitals))[0]
+
+    def clear_delta(self):
+        self._added, self._removed, self._vitals_changed = [], [], False
+
+    def reset_local(self):
+        """Forget the held row (e.g. after scoring fell back to the Space)."""
+        self.counts = self.text = self.scaled_vitals = None
+        self.clear_delta()
+
+    def describe(self):
+        return {"session_id": self.id, "symptoms": sorted(self.symptoms), "vitals": self.client_vitals()}
+
+
+def parse_session_payload(data):
+    """
+    Full payload that opens a session -> (symptoms, vitals, extra), where `extra` holds every
+    other field (vitals included) verbatim. Raises ValueError.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Invalid JSON body")
+    symptoms = data.get("symptoms")
+    if isinstance(symptoms, str):
+        symptoms = symptoms.split(",")
+    symptoms = _symptom_list(symptoms, "symptoms")
+    if not symptoms:
+        raise ValueError("At least one symptom is required")
+    if len(symptoms) > PREDICTION_SESSION_MAX_SYMPTOMS:
+        raise ValueError(f"A session is limited to {PREDICTION_SESSION_MAX_SYMPTOMS} symptoms")
+    extra = {key: value for key, value in data.items() if key != "symptoms"}
+    return symptoms, _vitals(data), extra
+
+
+def parse_session_delta(data):
+    """{"add_symptoms": [...], "remove_symptoms": [...], <vitals>} -> (add, remove, vitals)."""
+    if not isinstance(data, dict):
+        raise ValueError("Invalid JSON body")
+    return (_symptom_list(data.get("add_symptoms"), "add_symptoms"),
+            _symptom_list(data.get("remove_symptoms"), "remove_symptoms"),
+            _vitals(data))
+
+
+class PredictionSessionStore:
+    """
+    Bounded in-process session store: LRU-evicted past `maxsize`, expired after `ttl` seconds
+    without an update. Sessions are keyed by (owner, session id), where the owner is the JWT
+    subject, so one user can never touch another's session. State is per worker; a client that
+    gets 404 simply opens a new session with its full payload. `lock_factory` makes each
+    session's lock (threading.Lock by default, asyncio.Lock under ASGI).
+    """
+
+    def __init__(self, maxsize=PREDICTION_SESSION_MAX, ttl=PREDICTION_SESSION_TTL, lock_factory=threading.Lock):
+        self.ttl = ttl
+        self.lock_factory = lock_factory
+        self._sessions = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def create(self, owner, symptoms, vitals, extra=None):
+        session = PredictionSession(secrets.token_urlsafe(16), symptoms, vitals, extra, self.lock_factory())
+        self._sessions.set((owner, session.id), session)
+        return session
+
+    def get(self, owner, session_id):
+        return self._sessions.get((owner, session_id))
+
+    def touch(self, owner, session):
+        """Restart the idle timer after a successful update."""
+        self._sessions.set((owner, session.id), session)
+
+    def delete(self, owner, session_id):
+        return self._sessions.pop((owner, session_id)) is not None
+
+    def __len__(self):
+        return len(self._sessions)
@@ -0,0 +1,149 @@
+import io
+import zipfile
+
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfgen import canvas
+
+CHROME_FORM = "prescription_chrome"
+
+
+def pdf_safe(text):
+    """Drop characters the built-in Helvetica (WinAnsi) fonts cannot draw, e.g. emoji."""
+    return str(text if text is not None else "").encode("cp1252", "ignore").decode("cp1252")
+
+
+class PrescriptionRenderer:
+    """
+    Multi-page prescription layout.
+    Layout metrics are computed once per renderer; the static page chrome
+    (title, rules, footer) is recorded as a PDF form XObject once per document and stamped on
+    every page with doForm. Text is wrapped to the content width and flows onto new pages.
+    """
+
+    def __init__(self, pagesize=letter, margin=72, font="Helvetica", bold_font="Helvetica-Bold",
+                 body_size=12, heading_size=14, title_size=16):
+        self.pagesize = pagesize
+        self.width, self.height = pagesize
+        self.margin = margin
+        self.font = font
+        self.bold_font = bold_font
+        self.body_size = body_size
+        self.heading_size = heading_size
+        self.title_size = title_size
+        self.line_height = body_size * 1.6
+        self.indent = 20
+        self.content_top = self.height - margin - 40
+        self.content_bottom = margin + 20
+        self.content_width = self.width - 2 * margin
+
+    # --- Page chrome ---
+    def _define_chrome(self, c):
+        c.beginForm(CHROME_FORM)
+        c.setFont(self.bold_font, self.title_size)
+        c.drawString(self.margin, self.height - self.margin, "Doctor’s Prescription")
+        c.setLineWidth(0.8)
+        c.line(self.margin, self.height - self.margin - 12, self.width - self.margin, self.height - self.margin - 12)
+        c.line(self.margin, self.margin, self.width - self.margin, self.margin)
+        c.setFont(self.font, 8)
+        c.drawString(self.margin, self.margin - 12,
+                     "AI-generated plan. Confirm all medications with a licensed physician.")
+        c.endForm()
+
+    def _new_page(self, c, state):
+        if state["page_started"]:
+            c.showPage()
+        c.doForm(CHROME_FORM)
+        state["page_started"] = True
+        state["y"] = self.content_top
+
+    def _ensure_space(self, c, state, needed):
+        if state["y"] - needed < self.content_bottom:
+            self._new_page(c, state)
+
+    # --- Flowing text ---
+    def _lines(self, c, state, text, font, size, x_offset=0, prefix=""):
+        width = self.content_width - x_offset
+        lines = simpleSplit(pdf_safe(prefix + text), font, size, width) or [""]
+        for line in lines:
+            self._ensure_space(c, state, self.line_height)
+            c.setFont(font, size)
+            c.drawString(self.margin + x_offset, state["y"], line)
+            state["y"] -= self.line_height
+
+    def _heading(self, c, state, text):
+        # Keep a heading with at least one following line
+        self._ensure_space(c, state, self.line_height * 2 + 10)
+        state["y"] -= 10
+        self._lines(c, state, text, self.bold_font, self.heading_size)
+
+    def _draw_prescription(self, c, state, prescription):
+        treatment = prescription.get("treatment", {}) or {}
+        symptoms = prescription.get("symptoms", []) or []
+        if isinstance(symptoms, str):
+            symptoms = [symptoms]
+
+        for label, value in (
+            ("Disease", prescription.get("disease", "")),
+            ("Age", prescription.get("age", "")),
+            ("Blood Group", prescription.get("blood_group", "")),
+            ("Symptoms", ", ".join(str(s) for s in symptoms)),
+            ("Duration", f"{prescription.get('duration', '')} days"),
+        ):
+            self._lines(c, state, f"{label}: {value}", self.font, self.body_size)
+
+        self._heading(c, state, "Medications:")
+        for med in treatment.get("medications", []):
+            if isinstance(med, dict):
+                text = f"{med.get('name', '')} ({med.get('intake', '')}, {med.get('timing', '')})"
+            else:
+                text = str(med)
+            self._lines(c, state, text, self.font, self.body_size, self.indent, "- ")
+
+        self._heading(c, state, "Lifestyle Recommendations:")
+        for life in treatment.get("lifestyle", []):
+            self._lines(c, state, str(life), self.font, self.body_size, self.indent, "- ")
+
+        self._heading(c, state, "Follow-up:")
+        self._lines(c, state, str(treatment.get("followup", "")), self.font, self.body_size, self.indent)
+
+    # --- Public API ---
+    @staticmethod
+    def validation_error(prescription):
+        """Why `prescription` cannot be rendered, or None when it has the fields the layout needs."""
+        if not isinstance(prescription, dict):
+            return "must be an object"
+        if not isinstance(prescription.get("disease"), str) or not prescription["disease"].strip():
+            return "needs a non-empty 'disease'"
+        treatment = prescription.get("treatment")
+        if not isinstance(treatment, dict):
+            return "needs a 'treatment' object"
+        for field in ("medications", "lifestyle"):
+            if not isinstance(treatment.get(field, []), list):
+                return f"'treatment.{field}' must be a list"
+        return None
+
+    def render(self, prescriptions, output):
+        """Render one or more prescriptions into a single PDF written to `output`."""
+        if isinstance(prescriptions, dict):
+            prescriptions = [prescriptions]
+        c = canvas.Canvas(output, pagesize=self.pagesize)
+        self._define_chrome(c)
+        state = {"page_started": False, "y": self.content_top}
+        for prescription in prescriptions:
+            # Every prescription starts on a fresh page
+            self._new_page(c, state)
+            self._draw_prescription(c, state, prescription)
+        c.save()
+        return output
+
+    def render_zip(self, prescriptions, output, name_prefix="prescription"):
+        """Render each prescription to its own PDF inside a ZIP written to `output`."""
+        with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for i, prescription in enumerate(prescriptions, start=1):
+                pdf = self.render(prescription, io.BytesIO())
+                archive.writestr(f"{name_prefix}_{i}.pdf", pdf.getvalue())
+        return output
+
+
+prescription_renderer = PrescriptionRenderer()
@@ -0,0 +1,167 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import g, jsonify, request
+from pymongo import ReturnDocument
+
+# === Rate Limit Configuration ===
+# Budgets are "capacity/period_seconds": a bucket holds `capacity` tokens and refills
+# capacity/period tokens per second. RATE_LIMITS (JSON) overrides individual budgets, e.g.
+# RATE_LIMITS='{"treatment": "20/60"}'. RATE_LIMIT_BACKEND is "memory" (per worker) or
+# "mongo" (shared by all workers through the `rate_limits` collection).
+DEFAULT_BUDGETS = {
+    "treatment": "10/60",
+    "predict": "60/60",
+    "pdf": "30/60",
+    "email": "10/600",
+}
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").strip().lower()
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Number of reverse proxies in front of the app that append to X-Forwarded-For. The default 0
+# ignores the header (clients can forge it) and keys on the socket peer address. Behind a proxy,
+# set it to the hop count, e.g. 1 for a single load balancer, so the client's address is used.
+RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "0"))
+
+
+def parse_budget(spec):
+    capacity, _, period = str(spec).partition("/")
+    capacity, period = float(capacity), float(period or 60)
+    return capacity, capacity / period
+
+
+def load_budgets():
+    budgets = dict(DEFAULT_BUDGETS)
+    budgets.update(json.loads(os.getenv("RATE_LIMITS", "{}") or "{}"))
+    return {name: parse_budget(spec) for name, spec in budgets.items()}
+
+
+class MemoryBackend:
+    """Per-process token buckets, LRU-bounded to RATE_LIMIT_MAX_KEYS keys."""
+
+    def __init__(self, max_keys=RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate):
+        """Spend one token; returns (allowed, retry_after_seconds)."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - last) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+
+class MongoBackend:
+    """
+    Shared token buckets. Refill and spend happen in one atomic pipeline update per request;
+    idle buckets are removed by a TTL index. If Mongo is unavailable the limiter fails open.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self._index_ready = False
+
+    def take(self, key, capacity, rate):
+        if not self._index_ready:
+            self.collection.create_index("expiresAt", expireAfterSeconds=0)
+            self._index_ready = True
+        now = time.time()
+        idle = timedelta(seconds=capacity / rate if rate else 3600)
+        refilled = {"$min": [capacity, {"$add": [
+            {"$ifNull": ["$tokens", capacity]},
+            {"$multiply": [{"$subtract": [now, {"$ifNull": ["$ts", now]}]}, rate]},
+        ]}]}
+        doc = self.collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "ts": now}},
+                {"$set": {
+                    "allowed": {"$gte": ["$tokens", 1]},
+                    "tokens": {"$cond": [{"$gte": ["$tokens", 1]}, {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                    "expiresAt": datetime.utcnow() + idle,
+                }},
+            ],
+            projection={"allowed": 1, "tokens": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc["allowed"]:
+            return True, 0.0
+        return False, (1 - doc["tokens"]) / rate
+
+
+class RateLimiter:
+    def __init__(self, backend, budgets=None):
+        self.backend = backend
+        self.budgets = budgets or load_budgets()
+
+    def check(self, budget, identity):
+        capacity, rate = self.budgets[budget]
+        try:
+            return self.backend.take(f"{budget}:{identity}", capacity, rate)
+        except Exception as e:
+            print(f"⚠️ Rate limiter unavailable, allowing request: {e}")
+            return True, 0.0
+
+
+def resolve_client_ip(forwarded_for, remote_addr):
+    if RATE_LIMIT_TRUSTED_PROXIES:
+        forwarded = [p.strip() for p in (forwarded_for or "").split(",") if p.strip()]
+        if len(forwarded) >= RATE_LIMIT_TRUSTED_PROXIES:
+            return forwarded[-RATE_LIMIT_TRUSTED_PROXIES]
+    return remote_addr or "unknown"
+
+
+def client_ip():
+    return resolve_client_ip(request.headers.get("X-Forwarded-For", ""), request.remote_addr)
+
+
+def request_identity():
+    """JWT subject when require_auth has run, otherwise the client IP."""
+    user_id = getattr(g, "user_id", None)
+    return f"user:{user_id}" if user_id else f"ip:{client_ip()}"
+
+
+_limiter = None
+
+
+def init_rate_limiter(db=None):
+    """Create the process-wide limiter; call once at startup."""
+    global _limiter
+    if RATE_LIMIT_BACKEND == "mongo" and db is not None:
+        _limiter = RateLimiter(MongoBackend(db["rate_limits"]))
+    else:
+        _limiter = RateLimiter(MemoryBackend())
+    return _limiter
+
+
+def rate_limit(budget):
+    """
+    Decorator spending one token from `budget` for the caller; answers 429 with Retry-After
+    when the bucket is empty. Place it below @require_auth so the JWT subject is the key.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if RATE_LIMIT_ENABLED and _limiter is not None:
+                allowed, retry_after = _limiter.check(budget, request_identity())
+                if not allowed:
+                    retry = max(1, int(retry_after + 0.999))
+                    return jsonify({"error": "Too many requests", "retry_after": retry}), 429, {"Retry-After": str(retry)}
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
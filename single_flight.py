@@ -0,0 +1,82 @@
+import asyncio
+import copy
+import threading
+
+
+class _Call:
+    __slots__ = ("event", "result", "error", "waiters")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls that share a key into one execution.
+    The first caller runs `fn`; everyone who arrives while it is in flight waits and
+    receives its own deep copy of the same result, or the same exception. Nothing is kept
+    once the call completes, so failures are never cached.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = {"leaders": 0, "followers": 0}
+
+    def do(self, key, fn, timeout=None):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.stats["followers"] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.stats["leaders"] += 1
+                leader = True
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.event.set()
+        elif not call.event.wait(timeout):
+            raise TimeoutError(f"Timed out waiting for in-flight call {key!r}")
+
+        if call.error is not None:
+            raise call.error
+        return copy.deepcopy(call.result)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """asyncio version of SingleFlight: waiters await the leader's task instead of a thread Event."""
+
+    def __init__(self):
+        self._calls = {}
+        self.stats = {"leaders": 0, "followers": 0}
+
+    async def do(self, key, fn):
+        task = self._calls.get(key)
+        if task is None:
+            self.stats["leaders"] += 1
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.stats["followers"] += 1
+        # shield: one cancelled waiter must not cancel the shared call for everyone else
+        result = await asyncio.shield(task)
+        return copy.deepcopy(result)
+
+    def in_flight(self):
+        return len(self._calls)
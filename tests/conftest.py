@@ -0,0 +1,87 @@
+import os
+import sys
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+# The app is a set of flat modules in the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Keep the app off the network: in-memory outbox, no per-IP budgets, a dummy Gemini key
+os.environ.setdefault("EMAIL_TRANSPORT", "local")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("SECRET_KEY", "test-secret-key-long-enough-for-hs256")
+os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")
+os.environ.setdefault("PASSWORD_HASH_METHOD", "pbkdf2:sha256:1000")
+
+
+@pytest.fixture(scope="session")
+def flask_app():
+    """The Flask module (app.py) wired to an in-memory mongomock database."""
+    mongomock = pytest.importorskip("mongomock")
+    import db_bootstrap
+    with mock.patch.object(db_bootstrap, "MongoClient", mongomock.MongoClient):
+        import app
+    return app
+
+
+@pytest.fixture
+def client(flask_app):
+    for name in flask_app.db.list_collection_names():
+        flask_app.db[name].delete_many({})
+    return flask_app.app.test_client()
+
+
+class _AsyncCollection:
+    """Awaitable facade over a mongomock collection: the slice of Motor's API the ASGI app uses."""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+
+class _AsyncDatabase:
+    def __init__(self, database):
+        self._database = database
+
+    def __getitem__(self, name):
+        return _AsyncCollection(self._database[name])
+
+
+class _AsyncClient:
+    def __init__(self, sync_client):
+        self._sync_client = sync_client
+
+    def __getitem__(self, name):
+        return _AsyncDatabase(self._sync_client[name])
+
+
+@pytest.fixture(scope="session")
+def asgi_app():
+    """The FastAPI module (asgi_app.py); its Motor and pymongo clients share one mongomock database."""
+    mongomock = pytest.importorskip("mongomock")
+    pytest.importorskip("fastapi")
+    pytest.importorskip("motor")
+    import db_bootstrap
+    shared = mongomock.MongoClient()
+    with mock.patch.object(db_bootstrap, "MongoClient", lambda *args, **kwargs: shared), \
+            mock.patch("motor.motor_asyncio.AsyncIOMotorClient", lambda *args, **kwargs: _AsyncClient(shared)):
+        import asgi_app
+    return asgi_app
+
+
+@pytest.fixture
+def asgi_client(asgi_app):
+    from fastapi.testclient import TestClient
+    for name in asgi_app.db.list_collection_names():
+        asgi_app.db[name].delete_many({})
+    with TestClient(asgi_app.app) as test_client:
+        yield test_client
@@ -0,0 +1,49 @@
+import time
+from datetime import datetime
+
+import jwt
+import pytest
+
+import auth
+
+ADMIN = "admin@example.com"
+ROUTES = [("get", "/api/admin/feedback"), ("get", "/api/admin/feedback/export"),
+          ("get", "/api/admin/feedback/daily"), ("post", "/api/admin/feedback/daily/rebuild")]
+
+
+@pytest.fixture
+def admin_account(flask_app, client, monkeypatch):
+    monkeypatch.setattr(auth, "ADMIN_EMAILS", {ADMIN})
+    assert client.post("/api/register", json={"email": ADMIN, "password": "admin-password"}).status_code == 201
+    flask_app.user_repo.mark_verified(ADMIN)
+    flask_app.db["feedbacks"].insert_one({"name": "Pat", "email": "pat@example.com", "message": "private",
+                                          "source": "contact", "timestamp": datetime.utcnow()})
+    return ADMIN
+
+
+def _call(client, method, path, token=None):
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    return getattr(client, method)(path, headers=headers)
+
+
+@pytest.mark.parametrize("method, path", ROUTES)
+def test_a_wrong_login_code_cannot_reach_admin_routes(client, admin_account, method, path):
+    step2 = client.post("/api/login-step2", json={"email": admin_account, "code": "nope"})
+    token = (step2.get_json() or {}).get("token")
+    assert token is None
+    assert _call(client, method, path, token).status_code == 401
+
+
+@pytest.mark.parametrize("method, path", ROUTES)
+def test_forged_and_non_admin_tokens_are_refused(flask_app, client, admin_account, method, path):
+    forged = jwt.encode({"sub": admin_account, "exp": int(time.time()) + 60}, "fallback-secret",
+                        algorithm="HS256", headers={"kid": "default"})
+    assert _call(client, method, path, forged).status_code == 401
+    assert _call(client, method, path, flask_app.generate_jwt("someone@example.com")).status_code == 403
+
+
+def test_admin_password_login_reaches_the_export(client, admin_account):
+    login = client.post("/api/login-step1", json={"email": admin_account, "password": "admin-password"})
+    response = _call(client, "get", "/api/admin/feedback", login.get_json()["token"])
+    assert response.status_code == 200
+    assert [row["message"] for row in response.get_json()["items"]] == ["private"]
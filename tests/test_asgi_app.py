@@ -0,0 +1,181 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+import api_common
+from email_queue import EmailQueue
+from your_gemini_util import GeminiClient
+
+PRESCRIPTION = {"disease": "Flu", "treatment": {"medications": [{"name": "Paracetamol"}], "lifestyle": ["Rest"]}}
+
+
+class Api:
+    """One of the two serving modes, so each contract below is checked against both apps."""
+
+    def __init__(self, client, module, flask):
+        self.client, self.module, self.flask = client, module, flask
+
+    def call(self, method, path, raw=None, **kwargs):
+        if raw is not None:
+            kwargs["data" if self.flask else "content"] = raw
+        response = getattr(self.client, method)(path, **kwargs)
+        return response.status_code, response.get_json() if self.flask else response.json()
+
+    def code(self, email, purpose):
+        return self.module.db["otp_codes"].find_one({"email": email, "purpose": purpose})["code"]
+
+    def auth(self, email="doc@example.com"):
+        return {"Authorization": f"Bearer {self.module.generate_jwt(email)}"}
+
+
+@pytest.fixture(params=["flask", "asgi"])
+def api(request):
+    if request.param == "flask":
+        return Api(request.getfixturevalue("client"), request.getfixturevalue("flask_app"), flask=True)
+    return Api(request.getfixturevalue("asgi_client"), request.getfixturevalue("asgi_app"), flask=False)
+
+
+def test_login_flow(api):
+    email = "flow@example.com"
+    credentials = {"email": email, "password": "secret"}
+    assert api.call("post", "/api/register", json=credentials) == (201, {"message": "Registration successful"})
+    assert api.call("post", "/api/register", json=credentials) == (400, {"message": "User already exists"})
+    assert api.call("post", "/api/login-step1", json={**credentials, "password": "wrong"}) == \
+        (401, {"message": "Invalid credentials"})
+    assert api.call("post", "/api/login-step1", json=credentials) == (200, {"step": 2})
+
+    assert api.call("post", "/api/login-step2", json={"email": email, "code": "000000"}) == \
+        (401, {"message": "Invalid verification code"})
+    status, body = api.call("post", "/api/login-step2", json={"email": email, "code": api.code(email, "verify")})
+    assert status == 200 and body["message"] == "Login successful"
+
+    status, tokens = api.call("post", "/api/token/refresh", json={"refresh_token": body["refresh_token"]})
+    assert status == 200 and set(tokens) == {"token", "refresh_token"}
+    assert api.call("post", "/api/token/refresh", json={"refresh_token": body["token"]})[0] == 401
+
+
+def test_reset_password_flow(api):
+    email = "reset@example.com"
+    api.call("post", "/api/register", json={"email": email, "password": "old"})
+    assert api.call("post", "/api/send-reset-code", json={"email": "nobody@example.com"}) == \
+        (404, {"message": "User not found"})
+    assert api.call("post", "/api/send-reset-code", json={"email": email}) == (200, {"message": "Reset code sent"})
+    reset = {"email": email, "code": api.code(email, "reset"), "newPassword": "new"}
+    assert api.call("post", "/api/reset-password", json=reset) == (200, {"message": "Password reset successful"})
+    assert api.call("post", "/api/reset-password", json=reset) == (401, {"message": "Invalid reset code"})
+    assert api.call("post", "/api/login-step1", json={"email": email, "password": "new"}) == (200, {"step": 2})
+
+
+@pytest.mark.parametrize("path, body, expected", [
+    ("/api/register", [], {"message": "Invalid JSON body"}),
+    ("/api/register", {"email": "a@example.com"}, {"message": "Missing or invalid email/password"}),
+    ("/api/login-step2", {"email": "a@example.com", "code": 1}, {"message": "Email and code must be strings"}),
+    ("/api/token/refresh", {}, {"message": "refresh_token is required"}),
+    ("/api/send-verification-code", {"email": " "}, {"error": "Email is required"}),
+    ("/api/reset-password", {"email": "a@example.com"}, {"message": "Invalid input"}),
+    ("/api/feedback", {"message": "hi"}, None),
+    ("/api/submit-feedback", "text", {"message": "Invalid JSON body"}),
+])
+def test_malformed_requests_get_the_same_400(api, path, body, expected):
+    status, response = api.call("post", path, json=body)
+    assert status == 400
+    if expected is not None:
+        assert response == expected
+
+
+def test_unparsable_json_is_a_400(api):
+    status, body = api.call("post", "/api/register", raw="{not json", headers={"Content-Type": "application/json"})
+    assert (status, body) == (400, {"message": "Invalid JSON body"})
+
+
+def test_feedback_is_accepted(api):
+    assert api.call("post", "/api/submit-feedback", json={"message": "Great app"}) == \
+        (200, {"success": True, "message": "Feedback submitted successfully"})
+
+
+@pytest.mark.parametrize("path, body, expected", [
+    ("/api/treatment", {"disease": "Flu", "age": 30}, "Missing required patient information"),
+    ("/api/treatment/stream", {"disease": 5, "symptoms": ["fever"], "age": 30}, "Missing required patient information"),
+    ("/api/treatment/download/bulk", {"prescriptions": []}, "prescriptions must be a non-empty list"),
+    ("/api/treatment/download/bulk", {"prescriptions": [PRESCRIPTION], "format": "doc"},
+     "format must be 'pdf' or 'zip'"),
+    ("/api/treatment/download/bulk", {"prescriptions": [PRESCRIPTION, {"disease": "Flu"}]},
+     "prescriptions[1] needs a 'treatment' object"),
+])
+def test_treatment_requests_are_validated_alike(api, path, body, expected):
+    pytest.importorskip("reportlab")
+    status, response = api.call("post", path, json=body, headers=api.auth())
+    assert status == 400
+    assert response["error"].startswith(expected)
+
+
+def test_bulk_download_limit(api, monkeypatch):
+    monkeypatch.setattr(api_common, "PDF_BULK_MAX_ITEMS", 1)
+    status, body = api.call("post", "/api/treatment/download/bulk", json={"prescriptions": [PRESCRIPTION] * 2},
+                            headers=api.auth())
+    assert (status, body) == (400, {"error": "At most 1 prescriptions per download"})
+
+
+def test_unknown_prediction_session(api):
+    assert api.call("patch", "/api/predict/session/missing", json={}, headers=api.auth()) == \
+        (404, {"error": "Prediction session not found or expired"})
+
+
+@pytest.mark.parametrize("path", ["/api/admin/feedback", "/api/admin/feedback/daily"])
+def test_admin_routes_need_a_token(api, path):
+    assert api.call("get", path)[0] == 401
+
+
+def test_cache_stats_shape(api):
+    for path in ("/api/treatment/cache-stats", "/api/predict/cache-stats"):
+        status, body = api.call("get", path)
+        assert status == 200 and "enabled" in body
+
+
+def _loop_thread_and(coroutine_factory):
+    """Run a coroutine; returns (event loop thread id, its result)."""
+    async def run():
+        return threading.get_ident(), await coroutine_factory()
+    return asyncio.run(run())
+
+
+def test_email_queue_starts_off_the_event_loop(asgi_app, monkeypatch):
+    started_on = []
+    queue = EmailQueue(asgi_app.db["email_jobs_probe"], workers=0)
+    monkeypatch.setattr(queue, "start", lambda: started_on.append(threading.get_ident()))
+    loop_thread, _ = _loop_thread_and(
+        lambda: queue.enqueue_async(asgi_app.adb["email_jobs_probe"], "subject", "a@example.com", "body"))
+    assert started_on and started_on[0] != loop_thread
+
+
+def test_gemini_model_is_built_off_the_event_loop(monkeypatch):
+    built_on = []
+
+    def build(self):
+        built_on.append(threading.get_ident())
+        return "model"
+
+    monkeypatch.setattr(GeminiClient, "model", property(build))
+    loop_thread, model = _loop_thread_and(GeminiClient().amodel)
+    assert model == "model" and built_on[0] != loop_thread
+
+
+def test_local_predictor_loads_off_the_event_loop(asgi_app, monkeypatch):
+    loaded_on = []
+
+    class Batcher:
+        def submit(self, payload):
+            future = Future()
+            future.set_result({"disease": "Flu"})
+            return future
+
+    def load():
+        loaded_on.append(threading.get_ident())
+        return Batcher()
+
+    monkeypatch.setattr(asgi_app, "PREDICTION_MODE", "local")
+    monkeypatch.setattr(asgi_app, "get_prediction_batcher", load)
+    loop_thread, result = _loop_thread_and(lambda: asgi_app.run_prediction("/predict", {}))
+    assert result == ({"disease": "Flu"}, 200) and loaded_on[0] != loop_thread
@@ -0,0 +1,109 @@
+import time
+
+import jwt
+import pytest
+
+from auth import JWT_ALGORITHM, AuthError, TokenService
+
+KEYS = {"k1": "first-secret-long-enough-for-hs256", "k2": "second-secret-long-enough-for-hs256"}
+
+
+def _token(claims, kid="k1"):
+    return jwt.encode(claims, KEYS[kid], algorithm=JWT_ALGORITHM, headers={"kid": kid})
+
+
+@pytest.fixture
+def service():
+    return TokenService(keys=dict(KEYS), active_kid="k1")
+
+
+def test_issued_tokens_verify_and_are_typed(service):
+    access = service.issue_access_token("a@example.com")
+    assert service.verify(access)["sub"] == "a@example.com"
+    # Second call is served from the verified-token cache
+    assert service.verify(access)["sub"] == "a@example.com"
+    with pytest.raises(AuthError, match="Wrong token type"):
+        service.verify(access, expected_type="refresh")
+    assert service.verify(service.issue_refresh_token("a@example.com"), expected_type="refresh")
+
+
+def test_rotated_key_still_verifies(service):
+    old = TokenService(keys=dict(KEYS), active_kid="k2").issue_access_token("a@example.com")
+    assert service.verify(old)["email"] == "a@example.com"
+
+
+def test_token_without_exp_is_rejected_not_a_crash(service):
+    with pytest.raises(AuthError, match="Invalid token"):
+        service.verify(_token({"sub": "a@example.com"}))
+
+
+def test_token_without_subject_is_rejected(service):
+    with pytest.raises(AuthError, match="Invalid token"):
+        service.verify(_token({"exp": int(time.time()) + 60}))
+
+
+def test_legacy_email_only_token_is_accepted(service):
+    claims = service.verify(_token({"email": "old@example.com", "exp": int(time.time()) + 60}))
+    assert claims["email"] == "old@example.com"
+
+
+def test_expired_unknown_and_tampered_tokens(service):
+    with pytest.raises(AuthError, match="Token expired"):
+        service.verify(_token({"sub": "a", "exp": int(time.time()) - 10}))
+    with pytest.raises(AuthError, match="Unknown signing key"):
+        service.verify(jwt.encode({"sub": "a", "exp": int(time.time()) + 60}, "x" * 32,
+                                  algorithm=JWT_ALGORITHM, headers={"kid": "nope"}))
+    with pytest.raises(AuthError, match="Invalid token"):
+        service.verify(jwt.encode({"sub": "a", "exp": int(time.time()) + 60}, "y" * 32,
+                                  algorithm=JWT_ALGORITHM, headers={"kid": "k1"}))
+    with pytest.raises(AuthError, match="Malformed token"):
+        service.verify("not-a-jwt")
+
+
+def test_missing_exp_is_a_401_on_the_route(flask_app, client):
+    token = jwt.encode({"sub": "a@example.com"}, flask_app.get_token_service().keys["default"],
+                       algorithm=JWT_ALGORITHM)
+    response = client.post("/api/predict/session", json={"symptoms": ["cough"]},
+                           headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 401
+
+
+def test_placeholder_secret_is_never_used(monkeypatch):
+    monkeypatch.delenv("JWT_KEYS", raising=False)
+    monkeypatch.setenv("SECRET_KEY", "fallback-secret")
+    service = TokenService()
+    with pytest.raises(RuntimeError, match="No JWT signing key"):
+        service.issue_access_token("a@example.com")
+    forged = jwt.encode({"sub": "a@example.com", "exp": int(time.time()) + 60}, "fallback-secret",
+                        algorithm=JWT_ALGORITHM, headers={"kid": "default"})
+    with pytest.raises(AuthError):
+        service.verify(forged)
+
+
+def test_missing_secret_issues_nothing(monkeypatch):
+    monkeypatch.delenv("JWT_KEYS", raising=False)
+    monkeypatch.delenv("SECRET_KEY", raising=False)
+    with pytest.raises(RuntimeError):
+        TokenService().issue_refresh_token("a@example.com")
+
+
+@pytest.mark.parametrize("verified", [True, False])
+def test_wrong_login_code_gets_no_token(flask_app, client, verified):
+    email = "victim@example.com"
+    assert client.post("/api/register", json={"email": email, "password": "secret"}).status_code == 201
+    if verified:
+        flask_app.user_repo.mark_verified(email)
+    response = client.post("/api/login-step2", json={"email": email, "code": "nope"})
+    assert response.status_code == (400 if verified else 401)
+    body = response.get_json()
+    assert "token" not in body and "refresh_token" not in body
+
+
+def test_correct_login_code_issues_tokens(flask_app, client):
+    email = "new@example.com"
+    client.post("/api/register", json={"email": email, "password": "secret"})
+    assert client.post("/api/login-step1", json={"email": email, "password": "secret"}).get_json() == {"step": 2}
+    code = flask_app.db["otp_codes"].find_one({"email": email, "purpose": "verify"})["code"]
+    response = client.post("/api/login-step2", json={"email": email, "code": code})
+    assert response.status_code == 200
+    assert flask_app.get_token_service().verify(response.get_json()["token"])["sub"] == email
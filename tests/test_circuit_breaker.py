@@ -0,0 +1,138 @@
+import asyncio
+from unittest import mock
+
+import pytest
+import requests
+
+from upstream_client import CircuitBreaker, UpstreamClient, UpstreamUnavailable
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    clock = Clock()
+    with mock.patch("upstream_client.time.monotonic", clock):
+        yield clock
+
+
+def test_opens_after_threshold_and_half_opens_for_one_trial(clock):
+    breaker = CircuitBreaker(threshold=2, reset_timeout=10)
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    clock.now += 10
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()  # only one trial at a time
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(threshold=2, reset_timeout=10)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def _response(status):
+    response = requests.Response()
+    response.status_code = status
+    response.raw = mock.Mock()
+    return response
+
+
+def test_client_retries_then_fails_fast_when_open(clock):
+    client = UpstreamClient(base_url="http://space", max_retries=1, backoff_base=0,
+                            breaker=CircuitBreaker(threshold=1, reset_timeout=30))
+    with mock.patch.object(client.session, "post", side_effect=requests.ConnectionError("down")) as post:
+        with pytest.raises(UpstreamUnavailable):
+            client.post("/predict", {})
+        assert post.call_count == 2
+        with pytest.raises(UpstreamUnavailable, match="temporarily unavailable"):
+            client.post("/predict", {})
+        assert post.call_count == 2
+
+
+def test_client_retries_retryable_statuses(clock):
+    client = UpstreamClient(base_url="http://space", max_retries=2, backoff_base=0)
+    with mock.patch.object(client.session, "post", side_effect=[_response(503), _response(200)]) as post:
+        assert client.post("/predict", {}).status_code == 200
+    assert post.call_count == 2
+    assert client.breaker.state == "closed"
+
+
+def _tripped_client(**kwargs):
+    """A client whose breaker is open and has just reached its half-open trial."""
+    client = UpstreamClient(base_url="http://space", max_retries=0, backoff_base=0,
+                            breaker=CircuitBreaker(threshold=1, reset_timeout=10), **kwargs)
+    client.breaker.record_failure()
+    return client
+
+
+@pytest.mark.parametrize("error", [
+    requests.exceptions.ChunkedEncodingError("dropped"),
+    requests.TooManyRedirects("loop"),
+    ValueError("not a transport error"),
+])
+def test_any_error_in_the_half_open_trial_reopens_the_breaker(clock, error):
+    client = _tripped_client()
+    clock.now += 10
+    with mock.patch.object(client.session, "post", side_effect=error):
+        with pytest.raises((UpstreamUnavailable, ValueError)):
+            client.post("/predict", {})
+    assert client.breaker.state == "open"  # not stuck half-open with the trial in flight
+
+    clock.now += 10
+    with mock.patch.object(client.session, "post", return_value=_response(200)):
+        assert client.post("/predict", {}).status_code == 200
+    assert client.breaker.state == "closed"
+
+
+def test_exhausted_pool_fails_into_the_breaker(clock):
+    client = UpstreamClient(base_url="http://space", pool_size=1, pool_timeout=0.01,
+                            breaker=CircuitBreaker(threshold=1, reset_timeout=30))
+    client._slots.acquire()  # the only connection slot is busy
+    with mock.patch.object(client.session, "post") as post:
+        with pytest.raises(UpstreamUnavailable, match="pool exhausted"):
+            client.post("/predict", {})
+    post.assert_not_called()
+    assert client.breaker.state == "open"
+
+
+def test_cancelled_async_trial_reopens_the_breaker(clock):
+    httpx = pytest.importorskip("httpx")
+    from upstream_client import AsyncUpstreamClient
+
+    async def scenario():
+        client = AsyncUpstreamClient(base_url="http://space", max_retries=0, backoff_base=0,
+                                     breaker=CircuitBreaker(threshold=1, reset_timeout=10))
+        client.breaker.record_failure()
+        clock.now += 10
+        with mock.patch.object(client.client, "post", side_effect=asyncio.CancelledError):
+            with pytest.raises(asyncio.CancelledError):
+                await client.post("/predict", {})
+        assert client.breaker.state == "open"
+
+        clock.now += 10
+        with mock.patch.object(client.client, "post", return_value=httpx.Response(200)):
+            assert (await client.post("/predict", {})).status_code == 200
+        assert client.breaker.state == "closed"
+        await client.client.aclose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,39 @@
+import pytest
+
+import email_queue
+from email_queue import EmailQueue, LocalTransport
+
+
+class FailingTransport:
+    def send(self, subject, body, recipients):
+        return False, "mailbox unavailable"
+
+
+@pytest.fixture
+def collection():
+    mongomock = pytest.importorskip("mongomock")
+    return mongomock.MongoClient().db.email_jobs
+
+
+def test_sent_jobs_drop_the_body(collection):
+    queue = EmailQueue(collection, transport=LocalTransport(), workers=0)
+    job_id = queue.enqueue("Code", "a@example.com", "Your verification code is 123456")
+    assert queue.process_once() == 1
+    assert queue.transport.outbox
+    job = collection.find_one({"_id": job_id})
+    assert job["status"] == "sent" and "body" not in job
+
+
+def test_retried_jobs_keep_the_body_until_they_fail_for_good(collection, monkeypatch):
+    monkeypatch.setattr(email_queue, "EMAIL_MAX_ATTEMPTS", 2)
+    queue = EmailQueue(collection, transport=FailingTransport(), workers=0)
+    job_id = queue.enqueue("Code", "a@example.com", "Your reset code is 654321")
+
+    queue.process_once()
+    job = collection.find_one({"_id": job_id})
+    assert job["status"] == "pending" and job["body"]
+
+    collection.update_one({"_id": job_id}, {"$set": {"next_attempt_at": job["created_at"]}})
+    queue.process_once()
+    job = collection.find_one({"_id": job_id})
+    assert job["status"] == "failed" and "body" not in job and job["last_error"] == "mailbox unavailable"
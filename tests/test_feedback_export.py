@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+from bson import ObjectId
+
+from feedback_export import (daily_counts, decode_cursor, encode_cursor, export_csv, fetch_page, iter_feedback,
+                             parse_time, rebuild_daily_counts)
+from feedback_pipeline import FeedbackPipeline, feedback_document
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().db
+
+
+def _seed(collection, n, start=datetime(2024, 1, 1, 12)):
+    # Pairs of documents share a timestamp, so page boundaries fall inside ties
+    docs = [{"_id": ObjectId(), "timestamp": start + timedelta(hours=i // 2), "source": "app", "message": str(i)}
+            for i in range(n)]
+    collection.insert_many(docs)
+    return docs
+
+
+def test_keyset_pages_cover_everything_once_in_order(db):
+    docs = _seed(db.feedbacks, 11)
+    seen, after = [], None
+    while True:
+        page, cursor = fetch_page(db.feedbacks, limit=3, after=after)
+        seen.extend(page)
+        if cursor is None:
+            break
+        after = decode_cursor(cursor)
+    expected = sorted(docs, key=lambda d: (d["timestamp"], d["_id"]), reverse=True)
+    assert [d["_id"] for d in seen] == [d["_id"] for d in expected]
+    assert [d["_id"] for d in iter_feedback(db.feedbacks, page_size=4)] == [d["_id"] for d in expected]
+
+
+def test_export_filters_and_csv(db):
+    _seed(db.feedbacks, 6)
+    since, until = parse_time("2024-01-01T13:00:00Z"), parse_time("2024-01-01T14:00:00")
+    rows = list(iter_feedback(db.feedbacks, page_size=2, since=since, until=until))
+    assert len(rows) == 2 and all(r["timestamp"] == since for r in rows)
+    lines = "".join(export_csv(rows)).splitlines()
+    assert lines[0] == "id,timestamp,source,name,email,message" and len(lines) == 3
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    doc = {"_id": ObjectId(), "timestamp": datetime(2024, 5, 1, 8, 30)}
+    assert decode_cursor(encode_cursor(doc)) == (doc["timestamp"], doc["_id"])
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor("not-a-cursor")
+
+
+def test_pipeline_flush_bumps_the_daily_rollup(db):
+    pipeline = FeedbackPipeline(db.feedbacks, rollup=db.feedback_daily, batch_size=3, flush_ms=10_000)
+    for i in range(7):
+        pipeline.submit(feedback_document({"message": f"m{i}"}, "app" if i % 2 else "contact"))
+    pipeline.close(timeout=5)
+    [day] = daily_counts(db.feedback_daily)
+    assert day["total"] == 7 and day["sources"] == {"app": 3, "contact": 4}
+
+
+def test_rebuild_daily_counts_matches_the_raw_data(db):
+    _seed(db.feedbacks, 60)
+    assert rebuild_daily_counts(db.feedbacks, db.feedback_daily) == 2
+    days = daily_counts(db.feedback_daily)
+    assert [d["day"] for d in days] == ["2024-01-01", "2024-01-02"]
+    assert sum(d["total"] for d in days) == 60
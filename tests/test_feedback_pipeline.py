@@ -0,0 +1,54 @@
+import threading
+
+import mongomock
+import pytest
+
+from feedback_pipeline import FeedbackBackpressure, FeedbackPipeline, feedback_document
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().db
+
+
+def test_feedback_document_validation():
+    doc = feedback_document({"message": "  Great app  "}, "app")
+    assert doc["message"] == "Great app" and doc["email"] == "anonymous" and doc["source"] == "app"
+    with pytest.raises(ValueError, match="Missing fields"):
+        feedback_document({"message": "hi"}, "contact", require_contact=True)
+    with pytest.raises(ValueError, match="required"):
+        feedback_document({"message": "   "}, "app")
+    with pytest.raises(ValueError, match="strings"):
+        feedback_document({"message": "hi", "email": 5}, "app")
+
+
+def test_pipeline_batches_and_flushes_on_close(db):
+    pipeline = FeedbackPipeline(db.feedbacks, batch_size=3, flush_ms=10_000)
+    for i in range(7):
+        pipeline.submit(feedback_document({"message": f"m{i}"}, "app"))
+    pipeline.close(timeout=5)
+
+    assert db.feedbacks.count_documents({}) == 7
+    stats = pipeline.stats()
+    assert (stats["accepted"], stats["written"], stats["batches"], stats["buffered"]) == (7, 7, 3, 0)
+    with pytest.raises(FeedbackBackpressure):
+        pipeline.submit(feedback_document({"message": "late"}, "app"))
+
+
+def test_pipeline_pushes_back_when_the_buffer_is_full():
+    writing, release = threading.Event(), threading.Event()
+
+    class SlowCollection:
+        def insert_many(self, docs, ordered):
+            writing.set()
+            release.wait(5)
+
+    pipeline = FeedbackPipeline(SlowCollection(), buffer_size=1, batch_size=1, flush_ms=0)
+    pipeline.submit({"message": "a"})
+    writing.wait(5)
+    pipeline.submit({"message": "b"}, timeout=0)
+    with pytest.raises(FeedbackBackpressure, match="full"):
+        pipeline.submit({"message": "c"}, timeout=0)
+    release.set()
+    pipeline.close(timeout=5)
+    assert pipeline.stats()["rejected"] == 1
@@ -0,0 +1,98 @@
+import pytest
+
+from medication_index import DEFAULT_INTAKE, DEFAULT_TIMING, MedicationIndex, strip_variants
+
+PATTERNS = {
+    "Paracetamol": "1-0-1 after food",
+    "Amlodipine": "1-0-0 after food",
+    "Diclofenac": "1-0-1 after food",
+    "Prednisolone": "1-0-0 after food",
+    "Calcium Carbonate": "1-0-1 after food",
+    "Iron Sulfate": "1-0-1 before food",
+    "Magnesium": "0-0-1 after food",
+    "Cetirizine": "0-0-1 after food",
+    "Levocetirizine": "0-0-1 after food",
+    "Ibuprofen": "1-0-1 after food",
+    "Codeine Phosphate": "0-0-1 after food",
+}
+ALIASES = {"Crocin": "Paracetamol"}
+
+
+@pytest.fixture(scope="module")
+def index():
+    return MedicationIndex(PATTERNS, ALIASES)
+
+
+def canonical(index, name):
+    match = index.lookup(name)
+    return match[2] if match else None
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("Paracetamol", "Paracetamol"),
+    ("PARACETAMOL 500 mg tablet", "Paracetamol"),
+    ("Amlodipine besylate 5mg", "Amlodipine"),
+    ("Diclofenac sodium 50 mg", "Diclofenac"),
+    ("Crocin", "Paracetamol"),
+    ("Paracetomol", "Paracetamol"),
+    ("Tab. Magnesium SR", "Magnesium"),
+    ("Iron sulfate 200mg", "Iron Sulfate"),
+])
+def test_resolves_real_variants(index, name, expected):
+    assert canonical(index, name) == expected
+
+
+@pytest.mark.parametrize("name", [
+    "Sodium bicarbonate",   # salt stripping must not turn it into "carbonate" ~ Calcium Carbonate
+    "Prednisone",           # a different drug two edits from Prednisolone
+    "Iron Sucrose",         # not Iron Sulfate via a leftover "iron" key
+    "Magnesium hydroxide",  # not plain Magnesium via a token prefix
+    "Potassium chloride",
+    "Iron",
+])
+def test_does_not_send_other_drugs_to_a_catalog_entry(index, name):
+    assert index.lookup(name) is None
+
+
+@pytest.mark.parametrize("name", [
+    "Ibuprofen/Paracetamol",
+    "Ibuprofen + Paracetamol 400/325 mg",
+    "paracetamol codeine",
+    "Paracetamol and Codeine Phosphate",
+    "Crocin Ibuprofen",
+])
+def test_combination_products_are_not_their_first_ingredient(index, name):
+    assert index.lookup(name) is None
+    med = index.annotate({"name": name})
+    assert (med["intake"], med["timing"]) == (DEFAULT_INTAKE, DEFAULT_TIMING)
+
+
+def test_prefix_match_with_non_drug_remainder_still_resolves(index):
+    assert canonical(index, "Paracetamol 500 mg dispersible") == "Paracetamol"
+    assert canonical(index, "Ibuprofen sodium 200 mg film coated") == "Ibuprofen"
+    assert canonical(index, "Paracetamol 500 (Crocin)") == "Paracetamol"  # a brand of the same drug
+
+
+def test_salt_tokens_kept_when_they_are_the_active_ingredient():
+    assert strip_variants("sodium bicarbonate") == "sodium bicarbonate"
+    assert strip_variants("iron sulfate") == "iron sulfate"
+    assert strip_variants("amlodipine besylate 5 mg") == "amlodipine"
+
+
+def test_fuzzy_tie_is_ambiguous():
+    index = MedicationIndex({"Abcdefa": "1-0-0 after food", "Abcdefb": "0-0-1 after food"})
+    assert index.lookup("Abcdefc") is None
+    assert index.lookup("Abcdefaa")[2] == "Abcdefa"
+
+
+def test_fuzzy_ignores_salt_stripped_keys():
+    # "metformin" is only indexed as the salt-stripped form of "Metformin HCl": exact hits are fine,
+    # but a misspelling must not be corrected towards it
+    index = MedicationIndex({"Metformin HCl": "1-0-1 after food"})
+    assert index.lookup("Metformin")[2] == "Metformin HCl"
+    assert index.lookup("Metformn") is None
+
+
+def test_annotate_falls_back_to_default(index):
+    med = index.annotate({"name": "Sodium bicarbonate"})
+    assert (med["intake"], med["timing"]) == (DEFAULT_INTAKE, DEFAULT_TIMING)
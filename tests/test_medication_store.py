@@ -0,0 +1,87 @@
+import time
+from datetime import datetime
+
+import pytest
+
+import auth
+from medication_store import MedicationPatternStore
+
+ADMIN = "pharmacist@example.com"
+
+
+@pytest.fixture
+def collection():
+    mongomock = pytest.importorskip("mongomock")
+    return mongomock.MongoClient().db.medication_patterns
+
+
+def _pattern(store, name):
+    match = store.index.lookup(name)
+    return f"{match[0]} {match[1]}" if match else None
+
+
+def test_an_edit_is_picked_up_by_the_next_poll(collection):
+    editor = MedicationPatternStore(collection)
+    worker = MedicationPatternStore(collection, poll_seconds=0.01).start()
+    assert _pattern(worker, "Paracetamol") == "1-0-1 after food"
+
+    editor.set_pattern("Paracetamol", "1-1-1 after food")
+    editor.set_pattern("Zzyzxamab", "0-0-1 before food")
+    deadline = time.monotonic() + 5
+    while _pattern(worker, "Zzyzxamab") is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert _pattern(worker, "Paracetamol") == "1-1-1 after food"
+    assert _pattern(worker, "Zzyzxamab") == "0-0-1 before food"
+
+    assert editor.delete_pattern("Zzyzxamab")
+    while _pattern(worker, "Zzyzxamab") is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert _pattern(worker, "Zzyzxamab") is None
+    assert not editor.delete_pattern("Zzyzxamab")
+
+
+def test_a_hand_written_document_waits_for_a_version_bump(collection):
+    worker = MedicationPatternStore(collection)
+    worker.start()
+    collection.insert_one({"_id": "Zzyzxamab", "pattern": "0-0-1 before food", "updatedAt": datetime.utcnow()})
+    assert not worker.refresh()
+    collection.update_one({"_id": "__version__"}, {"$inc": {"version": 1}}, upsert=True)
+    assert worker.refresh() and _pattern(worker, "Zzyzxamab") == "0-0-1 before food"
+
+
+@pytest.fixture
+def admin_headers(flask_app, monkeypatch):
+    monkeypatch.setattr(auth, "ADMIN_EMAILS", {ADMIN})
+    return {"Authorization": f"Bearer {flask_app.generate_jwt(ADMIN)}"}
+
+
+def test_admin_routes_edit_the_catalog(flask_app, client, admin_headers, monkeypatch):
+    # A store that has not synced the (just wiped) collection yet
+    monkeypatch.setattr(flask_app, "medication_store", MedicationPatternStore(flask_app.db["medication_patterns"]))
+    path = "/api/admin/medication-patterns/Zzyzxamab"
+    assert client.put(path, json={"pattern": "0-0-1 before food"}, headers=admin_headers).get_json() == \
+        {"name": "Zzyzxamab", "pattern": "0-0-1 before food"}
+    assert _pattern(flask_app.medication_store, "Zzyzxamab") == "0-0-1 before food"
+
+    assert client.delete(path, headers=admin_headers).status_code == 200
+    assert _pattern(flask_app.medication_store, "Zzyzxamab") is None
+    assert client.delete(path, headers=admin_headers).status_code == 404
+
+
+def test_admin_routes_validate_and_need_an_admin(flask_app, client, admin_headers):
+    path = "/api/admin/medication-patterns/Paracetamol"
+    assert client.put(path, json={"pattern": "twice a day"}, headers=admin_headers).status_code == 400
+    other = {"Authorization": f"Bearer {flask_app.generate_jwt('doc@example.com')}"}
+    assert client.put(path, json={"pattern": "1-1-1 after food"}, headers=other).status_code == 403
+    assert client.put(path, json={"pattern": "1-1-1 after food"}).status_code == 401
+
+
+def test_asgi_admin_routes_edit_the_catalog(asgi_app, asgi_client, monkeypatch):
+    monkeypatch.setattr(auth, "ADMIN_EMAILS", {ADMIN})
+    monkeypatch.setattr(asgi_app, "medication_store", MedicationPatternStore(asgi_app.db["medication_patterns"]))
+    headers = {"Authorization": f"Bearer {asgi_app.generate_jwt(ADMIN)}"}
+    path = "/api/admin/medication-patterns/Zzyzxamab"
+    assert asgi_client.put(path, json={"pattern": "0-0-1 before food"}, headers=headers).status_code == 200
+    assert _pattern(asgi_app.medication_store, "Zzyzxamab") == "0-0-1 before food"
+    assert asgi_client.delete(path, headers=headers).status_code == 200
+    assert asgi_client.delete(path, headers=headers).status_code == 404
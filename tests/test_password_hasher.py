@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+from werkzeug.security import check_password_hash, generate_password_hash
+
+import password_hasher
+from password_hasher import PasswordHasher, PasswordHashingBusy
+
+METHOD = "pbkdf2:sha256:1000"
+
+
+def test_verify_reports_an_upgrade_only_for_outdated_hashes():
+    hasher = PasswordHasher(method=METHOD, workers=0)
+    current = hasher.hash("secret")
+    assert current.startswith(METHOD + "$")
+    assert hasher.verify(current, "secret") == (True, None)
+
+    outdated = generate_password_hash("secret", method="pbkdf2:sha256:500")
+    matches, upgraded = hasher.verify(outdated, "secret")
+    assert matches and upgraded.startswith(METHOD + "$") and check_password_hash(upgraded, "secret")
+    assert hasher.verify(outdated, "wrong") == (False, None)
+
+
+def test_canonical_method_fills_in_defaults():
+    assert PasswordHasher(method="scrypt", workers=0).current_method() == "scrypt:32768:8:1"
+
+
+def test_async_api_matches_sync():
+    hasher = PasswordHasher(method=METHOD, workers=0)
+    stored = asyncio.run(hasher.ahash("secret"))
+    assert asyncio.run(hasher.averify(stored, "secret")) == (True, None)
+
+
+def test_saturated_pool_raises_busy(monkeypatch):
+    monkeypatch.setattr(password_hasher, "PASSWORD_HASH_QUEUE_TIMEOUT_MS", 10)
+    hasher = PasswordHasher(method=METHOD, workers=1, max_pending=1).start()
+    try:
+        assert hasher._slots.acquire(blocking=False)
+        with pytest.raises(PasswordHashingBusy):
+            hasher.hash("secret")
+        with pytest.raises(PasswordHashingBusy):
+            asyncio.run(hasher.ahash("secret"))
+        hasher._slots.release()
+        assert check_password_hash(hasher.hash("secret"), "secret")
+    finally:
+        hasher.close()
+
+
+def test_pool_never_forks_by_default():
+    assert password_hasher.PASSWORD_HASH_START_METHOD in ("forkserver", "spawn")
+    hasher = PasswordHasher(method=METHOD, workers=1).start()
+    try:
+        assert hasher._executor._mp_context.get_start_method() != "fork"
+        stored = hasher.hash("secret")
+        assert hasher.verify(stored, "secret") == (True, None)
+    finally:
+        hasher.close()
+
+
+def test_login_upgrades_an_outdated_hash(flask_app, client):
+    email = "rehash@example.com"
+    assert client.post("/api/register", json={"email": email, "password": "secret"}).status_code == 201
+    outdated = generate_password_hash("secret", method="pbkdf2:sha256:500")
+    flask_app.user_repo.set_password(email, outdated)
+
+    response = client.post("/api/login-step1", json={"email": email, "password": "secret"})
+    assert response.status_code == 200
+    stored = flask_app.user_repo.get_credentials(email)["password"]
+    assert stored != outdated
+    assert not flask_app.get_password_hasher().needs_rehash(stored)
+    assert check_password_hash(stored, "secret")
+
+
+def test_rehash_never_overwrites_a_concurrent_password_change(flask_app):
+    repo = flask_app.user_repo
+    repo.create("cas@example.com", "old-hash")
+    repo.set_password("cas@example.com", "changed-hash")
+    assert not repo.set_password("cas@example.com", "upgraded-hash", expected_hash="old-hash")
+    assert repo.get_credentials("cas@example.com")["password"] == "changed-hash"
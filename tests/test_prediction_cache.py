@@ -0,0 +1,39 @@
+import mongomock
+
+from prediction_cache import PredictionCache, canonical_prediction_input, prediction_cache_key
+
+
+def test_prediction_key_canonicalizes_symptoms_aliases_and_buckets():
+    key = prediction_cache_key("/predict", {"symptoms": "Fever, cough", "heart_rate": 121, "gender": "F"})
+    assert key == prediction_cache_key("/predict", {"symptoms": ["cough", "fever", "Fever"],
+                                                    "heartRate": "122", "gender": " f "})
+    assert key != prediction_cache_key("/repredict", {"symptoms": ["cough", "fever"], "heart_rate": 121,
+                                                      "gender": "F"})
+    assert key != prediction_cache_key("/predict", {"symptoms": ["cough", "fever"], "heart_rate": 121,
+                                                    "gender": "M"})
+    assert prediction_cache_key("/predict", ["not", "a", "dict"]) is None
+
+
+def test_prediction_input_keeps_unmodelled_fields():
+    canonical = canonical_prediction_input({"symptoms": ["cough"], "temp": "100.1", "notes": "Since  Monday"})
+    assert canonical["Temperature (°F)"] == 100.0
+    assert canonical["extra:notes"] == "since monday"
+
+
+def test_prediction_cache_tiers():
+    collection = mongomock.MongoClient().db.prediction_cache
+    writer = PredictionCache(collection)
+    writer.set("k", {"prediction": "Flu"})
+    writer.set("bad", {"error": "upstream"}, status=200)
+    writer.set("bad2", {"prediction": "Flu"}, status=503)
+
+    reader = PredictionCache(collection)
+    assert reader.get("k") == ({"prediction": "Flu"}, "shared")
+    assert reader.get("k") == ({"prediction": "Flu"}, "local")
+    assert reader.get("bad") == (None, None)
+    assert reader.get("bad2") == (None, None)
+    value, _ = reader.get("k")
+    value["prediction"] = "mutated"
+    assert reader.get("k")[0] == {"prediction": "Flu"}
+    stats = reader.stats()
+    assert (stats["local_hits"], stats["shared_hits"], stats["misses"]) == (3, 1, 2)
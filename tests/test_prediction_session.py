@@ -0,0 +1,119 @@
+import asyncio
+import threading
+
+import pytest
+
+from prediction_session import PredictionSessionStore, parse_session_delta, parse_session_payload
+
+
+def test_default_sessions_use_a_threading_lock():
+    session = PredictionSessionStore().create("user", ["cough"], {})
+    assert isinstance(session.lock, type(threading.Lock()))
+
+
+def test_async_session_lock_does_not_block_the_loop():
+    store = PredictionSessionStore(lock_factory=asyncio.Lock)
+    session = store.create("user", ["cough"], {})
+    order = []
+
+    async def step(name):
+        async with session.lock:
+            order.append(f"{name} in")
+            await asyncio.sleep(0.02)
+            order.append(f"{name} out")
+
+    async def ticker():
+        await asyncio.sleep(0.01)
+        order.append("tick")
+
+    async def main():
+        await asyncio.gather(step("a"), step("b"), ticker())
+
+    asyncio.run(main())
+    assert order == ["a in", "tick", "a out", "b in", "b out"]
+
+
+def test_sessions_are_scoped_to_their_owner():
+    store = PredictionSessionStore()
+    session = store.create("alice", ["cough"], {})
+    assert store.get("alice", session.id) is session
+    assert store.get("bob", session.id) is None
+    assert not store.delete("bob", session.id)
+    assert store.delete("alice", session.id)
+
+
+def test_payload_keeps_extra_fields_and_client_vital_keys():
+    symptoms, vitals, extra = parse_session_payload(
+        {"symptoms": "Cough, fever", "gender": "female", "heart_rate": "92", "temperature": 100.4}
+    )
+    session = PredictionSessionStore().create("user", symptoms, vitals, extra)
+    assert session.payload() == {"gender": "female", "symptoms": ["cough", "fever"],
+                                 "heart_rate": "92", "temperature": 100.4}
+
+    add, remove, delta_vitals = parse_session_delta({"add_symptoms": ["Headache"], "remove_symptoms": ["fever"],
+                                                     "heart_rate": 110})
+    assert session.apply(add, remove, delta_vitals)
+    assert session.payload() == {"gender": "female", "symptoms": ["cough", "headache"],
+                                 "heart_rate": 110.0, "temperature": 100.4}
+    assert session.vitals["Heart Rate (bpm)"] == 110.0
+
+
+def test_unchanged_delta_reports_no_change():
+    symptoms, vitals, extra = parse_session_payload({"symptoms": ["cough"], "heart_rate": 90})
+    session = PredictionSessionStore().create("user", symptoms, vitals, extra)
+    assert not session.apply(*parse_session_delta({"add_symptoms": ["cough"], "heart_rate": 90}))
+
+
+def test_unparsed_vital_text_is_passed_on_until_changed():
+    symptoms, vitals, extra = parse_session_payload({"symptoms": ["cough"], "bp": "120/80"})
+    session = PredictionSessionStore().create("user", symptoms, vitals, extra)
+    session.apply(["fever"])
+    assert session.payload() == {"symptoms": ["cough", "fever"], "bp": "120/80"}
+    session.apply(vitals=parse_session_delta({"blood_pressure": 135})[2])
+    assert session.payload() == {"symptoms": ["cough", "fever"], "bp": 135.0}
+
+
+@pytest.fixture(scope="module")
+def predictor(tmp_path_factory):
+    """A LocalPredictor over small artifacts fitted the way the real ones are laid out."""
+    joblib = pytest.importorskip("joblib")
+    np = pytest.importorskip("numpy")
+    pytest.importorskip("sklearn")
+    from scipy import sparse
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.preprocessing import StandardScaler
+
+    from local_predictor import MODEL_FILES, SCALER_FILE, VECTORIZER_FILE, LocalPredictor
+
+    texts = ["fever cough sore throat", "headache nausea", "chest pain shortness of breath",
+             "fever rash joint pain", "cough wheezing shortness of breath", "nausea vomiting diarrhea"]
+    labels = ["Flu", "Migraine", "Angina", "Dengue", "Asthma", "Gastroenteritis"]
+    rng = np.random.default_rng(0)
+    vitals = rng.normal([120, 80, 40, 98.6, 97], [10, 8, 15, 1, 2], size=(len(texts), 5))
+    vectorizer = TfidfVectorizer().fit(texts)
+    scaler = StandardScaler().fit(vitals)
+    features = sparse.hstack([vectorizer.transform(texts), sparse.csr_matrix(scaler.transform(vitals))])
+    model = LogisticRegression(max_iter=1000).fit(features, labels)
+
+    model_dir = tmp_path_factory.mktemp("models")
+    joblib.dump(vectorizer, model_dir / VECTORIZER_FILE)
+    joblib.dump(scaler, model_dir / SCALER_FILE)
+    joblib.dump(model, model_dir / MODEL_FILES["logistic_regression"])
+    return LocalPredictor(model_dir)
+
+
+def test_incremental_rescore_matches_a_full_prediction(predictor):
+    assert predictor.incremental
+    symptoms, vitals, extra = parse_session_payload({"symptoms": ["Fever", "cough"], "heart_rate": 95})
+    session = PredictionSessionStore().create("user", symptoms, vitals, extra)
+
+    steps = [{}, {"add_symptoms": ["sore throat"]}, {"remove_symptoms": ["cough"], "temperature": 102.5},
+             {"add_symptoms": ["rash", "joint pain"], "remove_symptoms": ["sore throat"]},
+             {"add_symptoms": ["unknown words"], "spo2": 91}]
+    for step in steps:
+        session.apply(*parse_session_delta(step))
+        incremental = session.rescore_local(predictor)
+        full = predictor.predict(session.payload())
+        assert incremental["prediction"] == full["prediction"]
+        assert incremental["confidence"] == pytest.approx(full["confidence"], abs=1e-9)
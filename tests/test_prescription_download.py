@@ -0,0 +1,48 @@
+import pytest
+
+import api_common
+
+PRESCRIPTION = {"disease": "Flu", "treatment": {"medications": [{"name": "Paracetamol"}], "lifestyle": ["Rest"]}}
+
+
+@pytest.fixture
+def auth_headers(flask_app):
+    return {"Authorization": f"Bearer {flask_app.generate_jwt('doc@example.com')}"}
+
+
+@pytest.mark.parametrize("items", [
+    [PRESCRIPTION, 1],
+    [PRESCRIPTION, "text"],
+    [PRESCRIPTION, None],
+    [{"treatment": {}}],
+    [{"disease": "Flu"}],
+    [{"disease": "Flu", "treatment": {"medications": "Paracetamol"}}],
+])
+@pytest.mark.parametrize("output_format", ["pdf", "zip"])
+def test_bulk_download_rejects_malformed_items(client, auth_headers, items, output_format):
+    response = client.post("/api/treatment/download/bulk", json={"prescriptions": items, "format": output_format},
+                           headers=auth_headers)
+    assert response.status_code == 400
+    assert response.get_json()["error"].startswith("prescriptions[")
+
+
+def test_bulk_download_rejects_a_non_object_body(client, auth_headers):
+    response = client.post("/api/treatment/download/bulk", json=[PRESCRIPTION], headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_bulk_download_rejects_too_many_items(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(api_common, "PDF_BULK_MAX_ITEMS", 2)
+    response = client.post("/api/treatment/download/bulk", json={"prescriptions": [PRESCRIPTION] * 3},
+                           headers=auth_headers)
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "At most 2 prescriptions per download"
+
+
+def test_bulk_download_renders_valid_items(client, auth_headers):
+    pytest.importorskip("reportlab")
+    response = client.post("/api/treatment/download/bulk", json={"prescriptions": [PRESCRIPTION, PRESCRIPTION]},
+                           headers=auth_headers)
+    assert response.status_code == 200
+    assert response.mimetype == "application/pdf"
+    assert response.data.startswith(b"%PDF")
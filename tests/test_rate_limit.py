@@ -0,0 +1,55 @@
+from unittest import mock
+
+import pytest
+
+import rate_limit
+from rate_limit import MemoryBackend, parse_budget, resolve_client_ip
+
+
+def test_parse_budget():
+    assert parse_budget("10/60") == (10.0, 10.0 / 60)
+    assert parse_budget("5") == (5.0, 5.0 / 60)
+
+
+def test_bucket_spends_then_refuses_with_retry_after():
+    backend = MemoryBackend()
+    with mock.patch("rate_limit.time.monotonic", return_value=100.0):
+        assert backend.take("k", 2, 1.0) == (True, 0.0)
+        assert backend.take("k", 2, 1.0) == (True, 0.0)
+        allowed, retry_after = backend.take("k", 2, 1.0)
+    assert not allowed
+    assert retry_after == pytest.approx(1.0)
+
+
+def test_bucket_refills_up_to_capacity():
+    backend = MemoryBackend()
+    with mock.patch("rate_limit.time.monotonic", return_value=0.0):
+        backend.take("k", 2, 1.0)
+        backend.take("k", 2, 1.0)
+    with mock.patch("rate_limit.time.monotonic", return_value=1000.0):
+        assert backend.take("k", 2, 1.0)[0]
+        assert backend.take("k", 2, 1.0)[0]
+        assert not backend.take("k", 2, 1.0)[0]
+
+
+def test_buckets_are_lru_bounded():
+    backend = MemoryBackend(max_keys=2)
+    for key in ("a", "b", "c"):
+        backend.take(key, 1, 1.0)
+    assert list(backend._buckets) == ["b", "c"]
+
+
+def test_forwarded_for_is_ignored_without_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_TRUSTED_PROXIES", 0)
+    assert resolve_client_ip("6.6.6.6", "10.0.0.1") == "10.0.0.1"
+
+
+@pytest.mark.parametrize("hops, forwarded, expected", [
+    (1, "1.1.1.1", "1.1.1.1"),
+    (1, "spoofed, 1.1.1.1", "1.1.1.1"),
+    (2, "spoofed, 1.1.1.1, 10.0.0.2", "1.1.1.1"),
+    (2, "1.1.1.1", "10.0.0.1"),
+])
+def test_trusted_proxy_hops(monkeypatch, hops, forwarded, expected):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_TRUSTED_PROXIES", hops)
+    assert resolve_client_ip(forwarded, "10.0.0.1") == expected
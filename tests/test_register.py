@@ -0,0 +1,24 @@
+from db_bootstrap import ensure_indexes
+
+
+def test_duplicate_registration_is_rejected(client):
+    body = {"email": "dup@example.com", "password": "secret"}
+    assert client.post("/api/register", json=body).status_code == 201
+    response = client.post("/api/register", json=body)
+    assert response.status_code == 400
+    assert response.get_json()["message"] == "User already exists"
+
+
+def test_duplicate_rejected_even_without_the_unique_index(flask_app, client):
+    flask_app.db["users"].drop_indexes()
+    try:
+        body = {"email": "noindex@example.com", "password": "secret"}
+        assert client.post("/api/register", json=body).status_code == 201
+        assert client.post("/api/register", json=body).status_code == 400
+        assert flask_app.db["users"].count_documents({"email": "noindex@example.com"}) == 1
+    finally:
+        ensure_indexes(flask_app.db)
+
+
+def test_readiness_waits_for_the_indexes(flask_app):
+    assert flask_app.warmup.status()["steps"]["indexes"]["required"]
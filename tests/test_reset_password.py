@@ -0,0 +1,40 @@
+from unittest import mock
+
+from password_hasher import PasswordHashingBusy
+
+EMAIL = "reset@example.com"
+
+
+def _register(flask_app, client):
+    assert client.post("/api/register", json={"email": EMAIL, "password": "old-password"}).status_code == 201
+    return flask_app.user_repo.issue_code(EMAIL, "reset")
+
+
+def test_busy_hash_keeps_the_reset_code(flask_app, client):
+    code = _register(flask_app, client)
+    with mock.patch.object(flask_app.get_password_hasher(), "hash", side_effect=PasswordHashingBusy()):
+        busy = client.post("/api/reset-password", json={"email": EMAIL, "code": code, "newPassword": "new"})
+    assert busy.status_code == 503
+    assert busy.headers["Retry-After"] == "1"
+
+    retry = client.post("/api/reset-password", json={"email": EMAIL, "code": code, "newPassword": "new"})
+    assert retry.status_code == 200
+    again = client.post("/api/reset-password", json={"email": EMAIL, "code": code, "newPassword": "other"})
+    assert again.status_code == 401
+
+
+def test_wrong_code_is_rejected_without_hashing(flask_app, client):
+    _register(flask_app, client)
+    with mock.patch.object(flask_app.get_password_hasher(), "hash") as hash_:
+        response = client.post("/api/reset-password", json={"email": EMAIL, "code": "000000", "newPassword": "new"})
+    assert response.status_code == 401
+    hash_.assert_not_called()
+
+
+def test_check_code_does_not_consume(flask_app):
+    repo = flask_app.user_repo
+    code = repo.issue_code("otp@example.com", "reset")
+    assert repo.check_code("otp@example.com", "reset", code) == "ok"
+    assert repo.check_code("otp@example.com", "reset", "nope") == "invalid"
+    assert repo.consume_code("otp@example.com", "reset", code) == "ok"
+    assert repo.consume_code("otp@example.com", "reset", code) == "invalid"
@@ -0,0 +1,80 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from single_flight import AsyncSingleFlight, SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return {"value": 42}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("k", slow))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while flight.stats["followers"] < 4:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{"value": 42}] * 5
+    # Every caller gets its own copy
+    assert len({id(r) for r in results}) == 5
+    assert flight.in_flight() == 0
+
+
+def test_errors_are_shared_but_not_cached():
+    flight = SingleFlight()
+    with pytest.raises(ValueError):
+        flight.do("k", lambda: (_ for _ in ()).throw(ValueError("boom")))
+    assert flight.do("k", lambda: "ok") == "ok"
+
+
+def test_follower_timeout():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def leader():
+        started.set()
+        release.wait(5)
+
+    thread = threading.Thread(target=flight.do, args=("k", leader))
+    thread.start()
+    started.wait(5)
+    with pytest.raises(TimeoutError):
+        flight.do("k", lambda: None, timeout=0.01)
+    release.set()
+    thread.join()
+
+
+def test_async_single_flight_shares_and_survives_a_cancelled_waiter():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return ["result"]
+
+    async def main():
+        cancelled = asyncio.ensure_future(flight.do("k", slow))
+        others = [asyncio.ensure_future(flight.do("k", slow)) for _ in range(3)]
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        return await asyncio.gather(*others)
+
+    assert asyncio.run(main()) == [["result"]] * 3
+    assert len(calls) == 1
+    assert flight.in_flight() == 0
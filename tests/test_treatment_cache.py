@@ -0,0 +1,70 @@
+from unittest import mock
+
+import mongomock
+import pytest
+
+from treatment_cache import TreatmentCache, age_band, treatment_cache_key
+from ttl_cache import TTLCache
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    clock = Clock()
+    with mock.patch("ttl_cache.time.monotonic", clock):
+        yield clock
+
+
+def test_ttl_cache_expires_entries(clock):
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=5)
+    clock.now += 10
+    assert cache.get("a") == 1
+    assert cache.get("b", "gone") == "gone"
+    clock.now += 60
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_evicts_least_recently_used(clock):
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.pop("a") == 1 and cache.pop("a") is None
+
+
+def test_treatment_key_ignores_formatting_but_not_content():
+    key = treatment_cache_key("Flu", "30", "O +", ["Cough", "fever"], "3")
+    assert key == treatment_cache_key(" flu ", "30", "o+", ["fever", "cough", "COUGH"], "3")
+    assert key != treatment_cache_key("Flu", "31", "O+", ["cough", "fever"], "3")
+    assert key.startswith("full:")
+
+
+def test_treatment_key_granularities():
+    assert (treatment_cache_key("Flu", 30, "A+", [], 1, granularity="disease_age_band")
+            == treatment_cache_key("flu", 35, "B-", ["x"], 9, granularity="disease_age_band"))
+    assert (treatment_cache_key("Flu", 30, "A+", [], 1, granularity="disease_age_band")
+            != treatment_cache_key("Flu", 70, "A+", [], 1, granularity="disease_age_band"))
+    assert treatment_cache_key("Flu", 1, "", [], 1, granularity="disease") == \
+        treatment_cache_key("FLU", 99, "AB+", ["a"], 2, granularity="disease")
+    assert age_band("70") == "senior" and age_band("n/a") == "n/a"
+
+
+def test_treatment_cache_skips_empty_plans():
+    cache = TreatmentCache(mongomock.MongoClient().db.treatment_cache)
+    cache.set("empty", {"medications": []})
+    cache.set("plan", {"medications": [{"name": "x"}]})
+    assert cache.get("empty") is None
+    assert cache.get("plan") == {"medications": [{"name": "x"}]}
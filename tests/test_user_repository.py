@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+from unittest import mock
+
+import mongomock
+import pytest
+
+from db_bootstrap import ensure_indexes
+from user_repository import UserRepository
+
+EMAIL = "otp@example.com"
+
+
+@pytest.fixture
+def repo():
+    db = mongomock.MongoClient().db
+    ensure_indexes(db)
+    return UserRepository(db)
+
+
+def test_code_is_consumed_exactly_once(repo):
+    code = repo.issue_code(EMAIL, "reset")
+    assert repo.consume_code(EMAIL, "reset", code) == "ok"
+    assert repo.consume_code(EMAIL, "reset", code) == "invalid"
+
+
+def test_codes_are_scoped_by_purpose_and_replaced_on_reissue(repo):
+    with mock.patch("user_repository.random.randint", side_effect=[111111, 222222, 333333]):
+        first, verify, second = (repo.issue_code(EMAIL, "reset"), repo.issue_code(EMAIL, "verify"),
+                                 repo.issue_code(EMAIL, "reset"))
+    assert repo.consume_code(EMAIL, "reset", first) == "invalid"
+    assert repo.consume_code(EMAIL, "reset", verify) == "invalid"
+    assert repo.consume_code(EMAIL, "reset", second) == "ok"
+    assert repo.consume_code(EMAIL, "verify", verify) == "ok"
+
+
+def test_expired_code_is_reported_and_not_consumed():
+    # No TTL index here: the code is past expires_at but Mongo's TTL monitor has not removed it yet
+    repo = UserRepository(mongomock.MongoClient().db)
+    code = repo.issue_code(EMAIL, "reset")
+    repo.otps.update_one({"email": EMAIL}, {"$set": {"expires_at": datetime.utcnow() - timedelta(seconds=1)}})
+    assert repo.check_code(EMAIL, "reset", code) == "expired"
+    assert repo.consume_code(EMAIL, "reset", code) == "expired"
+
+
+def test_check_code_leaves_the_code_in_place(repo):
+    code = repo.issue_code(EMAIL, "reset")
+    assert repo.check_code(EMAIL, "reset", code) == "ok"
+    assert repo.check_code(EMAIL, "reset", "000000" if code != "000000" else "111111") == "invalid"
+    assert repo.consume_code(EMAIL, "reset", code) == "ok"
+
+
+def test_verify_with_code_marks_the_user(repo):
+    assert repo.create(EMAIL, "hash")
+    assert not repo.create(EMAIL, "other-hash")
+    code = repo.issue_code(EMAIL, "verify")
+    assert repo.is_verified(EMAIL) is False
+    assert repo.verify_with_code(EMAIL, code) == "ok"
+    assert repo.is_verified(EMAIL) is True
+    assert repo.verify_with_code("ghost@example.com", repo.issue_code("ghost@example.com", "verify")) == "missing"
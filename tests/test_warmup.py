@@ -0,0 +1,61 @@
+import time
+
+import pytest
+
+import warmup as warmup_module
+from warmup import WarmUp
+
+
+def _flaky(failures):
+    calls = []
+
+    def step():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise RuntimeError("not yet")
+    return step, calls
+
+
+def _wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+@pytest.fixture(autouse=True)
+def background(monkeypatch):
+    monkeypatch.setattr(warmup_module, "WARMUP_MODE", "background")
+
+
+def test_failed_required_step_is_retried_until_ready():
+    step, calls = _flaky(failures=3)
+    warmup = WarmUp(retry_delay=0.01, retry_max_delay=0.02, retry_attempts=1).add("mongo", step, required=True)
+    warmup.start()
+    _wait_for(lambda: warmup.status()["ready"])
+    status = warmup.status()
+    assert status["warmup"] == "finished"
+    assert status["steps"]["mongo"]["attempts"] == 4
+    assert len(calls) == 4
+
+
+def test_optional_step_gives_up_after_the_attempt_limit():
+    step, calls = _flaky(failures=100)
+    warmup = WarmUp(retry_delay=0.01, retry_max_delay=0.01, retry_attempts=3).add("gemini", step)
+    warmup.start()
+    _wait_for(lambda: warmup.status()["warmup"] == "finished")
+    time.sleep(0.05)
+    assert len(calls) == 3
+    status = warmup.status()
+    assert status["ready"]
+    assert status["steps"]["gemini"]["state"] == "failed"
+
+
+def test_blocking_mode_retries_in_the_background(monkeypatch):
+    monkeypatch.setattr(warmup_module, "WARMUP_MODE", "blocking")
+    step, _ = _flaky(failures=1)
+    warmup = WarmUp(retry_delay=0.2).add("mongo", step, required=True)
+    warmup.start()
+    assert not warmup.status()["ready"]
+    _wait_for(lambda: warmup.status()["ready"])
@@ -0,0 +1,134 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+from ttl_cache import TTLCache
+
+# === Treatment Cache Configuration ===
+# TREATMENT_CACHE_KEY controls how coarse the cache key is:
+#   "full"             - disease, age, blood group, symptoms and duration (default)
+#   "disease_age_band" - disease plus age band; the prompt picks medications from the disease alone
+#   "disease"          - disease only
+TREATMENT_CACHE_KEY = os.getenv("TREATMENT_CACHE_KEY", "full").strip().lower()
+TREATMENT_CACHE_SIZE = int(os.getenv("TREATMENT_CACHE_SIZE", "512"))
+TREATMENT_CACHE_TTL = int(os.getenv("TREATMENT_CACHE_TTL", str(6 * 3600)))
+TREATMENT_CACHE_SHARED_TTL = int(os.getenv("TREATMENT_CACHE_SHARED_TTL", str(24 * 3600)))
+TREATMENT_CACHE_ENABLED = os.getenv("TREATMENT_CACHE_ENABLED", "true").lower() == "true"
+
+AGE_BANDS = [(0, 12, "child"), (13, 17, "teen"), (18, 39, "adult"), (40, 64, "middle-aged"), (65, 200, "senior")]
+
+
+def _norm(value):
+    return " ".join(str(value or "").split()).lower()
+
+
+def age_band(age):
+    try:
+        age = int(float(age))
+    except (TypeError, ValueError):
+        return _norm(age)
+    for low, high, label in AGE_BANDS:
+        if low <= age <= high:
+            return label
+    return "unknown"
+
+
+def treatment_cache_key(disease, age, blood_group, symptoms, duration, granularity=TREATMENT_CACHE_KEY):
+    """Stable SHA-256 key over the normalized prompt inputs at the given granularity."""
+    parts = {"disease": _norm(disease)}
+    if granularity == "full":
+        parts.update({
+            "age": _norm(age),
+            "blood_group": _norm(blood_group).replace(" ", ""),
+            "symptoms": sorted({_norm(s) for s in symptoms or [] if _norm(s)}),
+            "duration": _norm(duration),
+        })
+    elif granularity == "disease_age_band":
+        parts["age_band"] = age_band(age)
+    canonical = json.dumps(parts, sort_keys=True, separators=(",", ":"))
+    return f"{granularity}:{hashlib.sha256(canonical.encode('utf-8')).hexdigest()}"
+
+
+def is_cacheable(treatment_data):
+    # fetch_gemini_response returns an empty plan instead of raising; never cache those
+    return bool(treatment_data and treatment_data.get("medications"))
+
+
+class TreatmentCache:
+    """
+    Two-tier treatment-plan cache: an in-process LRU+TTL in front of an optional
+    Mongo collection shared by all workers (expired by a TTL index on `expiresAt`).
+    Values are deep-copied in and out so callers can annotate the result freely.
+    """
+
+    def __init__(self, collection=None, maxsize=TREATMENT_CACHE_SIZE, ttl=TREATMENT_CACHE_TTL,
+                 shared_ttl=TREATMENT_CACHE_SHARED_TTL):
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.collection = collection
+        self.shared_ttl = shared_ttl
+        self._index_ready = False
+        self._stats = {"local_hits": 0, "shared_hits": 0, "misses": 0, "stores": 0, "errors": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def _ensure_index(self):
+        if not self._index_ready:
+            self.collection.create_index("expiresAt", expireAfterSeconds=0)
+            self._index_ready = True
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None:
+            self._count("local_hits")
+            return copy.deepcopy(value)
+
+        if self.collection is not None:
+            try:
+                doc = self.collection.find_one(
+                    {"_id": key, "expiresAt": {"$gt": datetime.utcnow()}}, {"value": 1}
+                )
+            except Exception as e:
+                print(f"⚠️ Treatment cache read failed: {e}")
+                self._count("errors")
+                doc = None
+            if doc:
+                self._count("shared_hits")
+                self.local.set(key, doc["value"])
+                return copy.deepcopy(doc["value"])
+
+        self._count("misses")
+        return None
+
+    def set(self, key, value):
+        if not is_cacheable(value):
+            return
+        value = copy.deepcopy(value)
+        self.local.set(key, value)
+        self._count("stores")
+        if self.collection is not None:
+            try:
+                self._ensure_index()
+                self.collection.update_one(
+                    {"_id": key},
+                    {"$set": {"value": value,
+                              "expiresAt": datetime.utcnow() + timedelta(seconds=self.shared_ttl)}},
+                    upsert=True,
+                )
+            except Exception as e:
+                print(f"⚠️ Treatment cache write failed: {e}")
+                self._count("errors")
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["local_hits"] + stats["shared_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((lookups - stats["misses"]) / lookups, 4) if lookups else 0.0
+        stats["local_entries"] = len(self.local)
+        stats["key_granularity"] = TREATMENT_CACHE_KEY
+        return stats
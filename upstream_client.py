@@ -0,0 +1,261 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import observe_upstream
+
+# === Upstream (Hugging Face Space) Configuration ===
+HF_BASE_URL = os.getenv("HF_BASE_URL", "https://sampath563-medica-backend.hf.space").rstrip("/")
+HF_POOL_SIZE = int(os.getenv("HF_POOL_SIZE", "20"))
+# Seconds a request waits for one of the HF_POOL_SIZE connection slots before failing (into the breaker)
+HF_POOL_TIMEOUT = float(os.getenv("HF_POOL_TIMEOUT", "5"))
+HF_CONNECT_TIMEOUT = float(os.getenv("HF_CONNECT_TIMEOUT", "3.05"))
+HF_READ_TIMEOUT = float(os.getenv("HF_READ_TIMEOUT", "30"))
+HF_MAX_RETRIES = int(os.getenv("HF_MAX_RETRIES", "2"))
+HF_BACKOFF_BASE = float(os.getenv("HF_BACKOFF_BASE", "0.2"))
+HF_BACKOFF_MAX = float(os.getenv("HF_BACKOFF_MAX", "2.0"))
+HF_BREAKER_THRESHOLD = int(os.getenv("HF_BREAKER_THRESHOLD", "5"))
+HF_BREAKER_RESET = float(os.getenv("HF_BREAKER_RESET", "30"))
+
+# Status codes worth another attempt: the Space is waking up or overloaded.
+RETRY_STATUSES = {502, 503, 504}
+# Transport failures worth another attempt (a dropped keep-alive connection surfaces as any of these)
+RETRY_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+
+class UpstreamUnavailable(Exception):
+    """Raised when the circuit is open or every attempt to reach the upstream failed."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+    closed -> open after `threshold` failures; open -> half-open after `reset_timeout`
+    seconds, where a single trial call decides whether to close again or re-open.
+    """
+
+    def __init__(self, threshold=HF_BREAKER_THRESHOLD, reset_timeout=HF_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state_locked()
+
+    def _state_locked(self):
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self._state_locked()
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+
+
+class UpstreamClient:
+    """
+    Shared keep-alive client for the Hugging Face Space.
+    One pooled `requests.Session` per worker, bounded retries with jittered
+    exponential backoff, and a circuit breaker that fails fast while the Space is down.
+    Every call that passes the breaker ends in exactly one record_success/record_failure,
+    whatever it raises, so a half-open trial can never be left hanging.
+    """
+
+    def __init__(self, base_url=HF_BASE_URL, pool_size=HF_POOL_SIZE,
+                 connect_timeout=HF_CONNECT_TIMEOUT, read_timeout=HF_READ_TIMEOUT,
+                 max_retries=HF_MAX_RETRIES, backoff_base=HF_BACKOFF_BASE,
+                 backoff_max=HF_BACKOFF_MAX, breaker=None, pool_timeout=HF_POOL_TIMEOUT):
+        self.base_url = base_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        # urllib3's blocking pool waits without a deadline, so the wait for a slot is bounded here
+        # and the pool itself never blocks
+        self.pool_timeout = pool_timeout
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _backoff(self, attempt):
+        # "Full jitter": sleep a random amount up to the capped exponential delay
+        cap = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        time.sleep(random.uniform(0, cap))
+
+    def post(self, path, payload):
+        """
+        POST `payload` as JSON to `base_url + path` and return the `requests.Response`.
+        Raises UpstreamUnavailable when the breaker is open or all attempts failed.
+        """
+        if not self.breaker.allow():
+            observe_upstream("huggingface", path, None, "circuit_open")
+            raise UpstreamUnavailable("Prediction service temporarily unavailable")
+        try:
+            if not self._slots.acquire(timeout=self.pool_timeout):
+                observe_upstream("huggingface", path, None, "pool_timeout")
+                raise UpstreamUnavailable("Prediction service connection pool exhausted")
+            try:
+                response = self._attempts(path, payload)
+            finally:
+                self._slots.release()
+        except BaseException:
+            self.breaker.record_failure()
+            raise
+        if response.status_code in RETRY_STATUSES:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def _attempts(self, path, payload):
+        url = f"{self.base_url}{path}"
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._backoff(attempt - 1)
+            started = time.perf_counter()
+            try:
+                response = self.session.post(url, json=payload, timeout=self.timeout)
+            except RETRY_ERRORS as e:
+                observe_upstream("huggingface", path, time.perf_counter() - started, "error")
+                last_error = e
+                continue
+            except requests.RequestException as e:
+                # Not transient (e.g. TooManyRedirects): no point retrying
+                observe_upstream("huggingface", path, time.perf_counter() - started, "error")
+                raise UpstreamUnavailable(f"Prediction service request failed: {e}")
+            observe_upstream("huggingface", path, time.perf_counter() - started, str(response.status_code))
+
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                last_error = f"HTTP {response.status_code}"
+                response.close()
+                continue
+            return response
+
+        print(f"❌ Upstream {url} failed after {self.max_retries + 1} attempts: {last_error}")
+        raise UpstreamUnavailable(f"Prediction service unreachable: {last_error}")
+
+
+class AsyncUpstreamClient:
+    """
+    asyncio counterpart of UpstreamClient for the ASGI app: one pooled httpx.AsyncClient,
+    the same timeouts, retry/backoff policy and circuit-breaker semantics.
+    """
+
+    def __init__(self, base_url=HF_BASE_URL, pool_size=HF_POOL_SIZE,
+                 connect_timeout=HF_CONNECT_TIMEOUT, read_timeout=HF_READ_TIMEOUT,
+                 max_retries=HF_MAX_RETRIES, backoff_base=HF_BACKOFF_BASE,
+                 backoff_max=HF_BACKOFF_MAX, breaker=None, pool_timeout=HF_POOL_TIMEOUT):
+        import httpx  # only the ASGI app needs it; keeps the WSGI import path light
+
+        self.base_url = base_url
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout, pool=pool_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    async def post(self, path, payload):
+        """Async POST; returns an httpx.Response or raises UpstreamUnavailable."""
+        if not self.breaker.allow():
+            observe_upstream("huggingface", path, None, "circuit_open")
+            raise UpstreamUnavailable("Prediction service temporarily unavailable")
+        try:
+            response = await self._attempts(path, payload)
+        except BaseException:
+            # Includes CancelledError: the half-open trial must still be settled
+            self.breaker.record_failure()
+            raise
+        if response.status_code in RETRY_STATUSES:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    async def _attempts(self, path, payload):
+        import httpx
+
+        url = f"{self.base_url}{path}"
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                cap = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+                await asyncio.sleep(random.uniform(0, cap))
+            started = time.perf_counter()
+            try:
+                response = await self.client.post(url, json=payload)
+            except httpx.PoolTimeout:
+                observe_upstream("huggingface", path, None, "pool_timeout")
+                raise UpstreamUnavailable("Prediction service connection pool exhausted")
+            except httpx.TransportError as e:
+                # TimeoutException and the protocol/read errors of a dropped connection
+                observe_upstream("huggingface", path, time.perf_counter() - started, "error")
+                last_error = e
+                continue
+            except httpx.HTTPError as e:
+                observe_upstream("huggingface", path, time.perf_counter() - started, "error")
+                raise UpstreamUnavailable(f"Prediction service request failed: {e}")
+            observe_upstream("huggingface", path, time.perf_counter() - started, str(response.status_code))
+
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                last_error = f"HTTP {response.status_code}"
+                continue
+            return response
+
+        print(f"❌ Upstream {url} failed after {self.max_retries + 1} attempts: {last_error}")
+        raise UpstreamUnavailable(f"Prediction service unreachable: {last_error}")
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_upstream_client():
+    """Return the per-process shared UpstreamClient, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = UpstreamClient()
+    return _client
@@ -0,0 +1,169 @@
+import random
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+OTP_TTL_MINUTES = 10
+
+
+class UserRepository:
+    """
+    Data access for the auth routes.
+    Reads project only the fields a route needs, and one-time codes are validated and
+    consumed in a single atomic find_one_and_delete whose filter carries the code and expiry,
+    so a code can never be used twice and no check-then-act window exists.
+    """
+
+    def __init__(self, db):
+        self.users = db["users"]
+        self.otps = db["otp_codes"]
+
+    # --- Users ---
+    def create(self, email, password_hash):
+        """Insert a new unverified user; returns False if the email is already registered."""
+        try:
+            self.users.insert_one({"email": email, "password": password_hash, "is_verified": False})
+            return True
+        except DuplicateKeyError:
+            return False
+
+    def get_credentials(self, email):
+        return self.users.find_one({"email": email}, {"_id": 0, "password": 1, "is_verified": 1})
+
+    def exists(self, email):
+        return self.users.find_one({"email": email}, {"_id": 1}) is not None
+
+    def is_verified(self, email):
+        """True / False for an existing user, None when the user does not exist."""
+        user = self.users.find_one({"email": email}, {"_id": 0, "is_verified": 1})
+        return None if user is None else bool(user.get("is_verified", False))
+
+    def mark_verified(self, email):
+        return self.users.update_one({"email": email}, {"$set": {"is_verified": True}}).matched_count == 1
+
+    def set_password(self, email, password_hash, expected_hash=None):
+        """
+        Store a new hash. With `expected_hash`, only replaces that exact hash (compare-and-set),
+        so a concurrent password change is never overwritten.
+        """
+        query = {"email": email}
+        if expected_hash is not None:
+            query["password"] = expected_hash
+        return self.users.update_one(query, {"$set": {"password": password_hash}}).matched_count == 1
+
+    def count(self):
+        return self.users.count_documents({})
+
+    # --- One-time codes ---
+    def issue_code(self, email, purpose):
+        """Create or replace the `purpose` ("verify" / "reset") code for `email` and return it."""
+        code = str(random.randint(100000, 999999))
+        self.otps.update_one(
+            {"email": email, "purpose": purpose},
+            {"$set": {"code": code, "expires_at": datetime.utcnow() + timedelta(minutes=OTP_TTL_MINUTES)}},
+            upsert=True
+        )
+        return code
+
+    def check_code(self, email, purpose, code):
+        """Like consume_code but leaves the code in place: "ok", "expired" or "invalid"."""
+        doc = self.otps.find_one({"email": email, "purpose": purpose, "code": code}, {"expires_at": 1})
+        if doc is None:
+            return "invalid"
+        return "ok" if doc["expires_at"] > datetime.utcnow() else "expired"
+
+    def consume_code(self, email, purpose, code):
+        """
+        Validate and delete a code in one round trip.
+        Returns "ok", or "expired" / "invalid" when nothing matching and unexpired was consumed.
+        """
+        now = datetime.utcnow()
+        consumed = self.otps.find_one_and_delete(
+            {"email": email, "purpose": purpose, "code": code, "expires_at": {"$gt": now}},
+            projection={"_id": 1},
+        )
+        if consumed:
+            return "ok"
+        # Failure path only: tell an expired code (not yet swept by the TTL monitor) from a wrong one
+        stale = self.otps.find_one(
+            {"email": email, "purpose": purpose, "code": code}, {"_id": 1}
+        )
+        return "expired" if stale else "invalid"
+
+    def verify_with_code(self, email, code):
+        """Consume a verification code and mark the user verified; returns the consume status."""
+        status = self.consume_code(email, "verify", code)
+        if status == "ok" and not self.mark_verified(email):
+            return "missing"
+        return status
+
+
+class AsyncUserRepository:
+    """Motor (asyncio) counterpart of UserRepository with the same queries and semantics."""
+
+    def __init__(self, db):
+        self.users = db["users"]
+        self.otps = db["otp_codes"]
+
+    async def create(self, email, password_hash):
+        try:
+            await self.users.insert_one({"email": email, "password": password_hash, "is_verified": False})
+            return True
+        except DuplicateKeyError:
+            return False
+
+    async def get_credentials(self, email):
+        return await self.users.find_one({"email": email}, {"_id": 0, "password": 1, "is_verified": 1})
+
+    async def exists(self, email):
+        return await self.users.find_one({"email": email}, {"_id": 1}) is not None
+
+    async def is_verified(self, email):
+        user = await self.users.find_one({"email": email}, {"_id": 0, "is_verified": 1})
+        return None if user is None else bool(user.get("is_verified", False))
+
+    async def mark_verified(self, email):
+        result = await self.users.update_one({"email": email}, {"$set": {"is_verified": True}})
+        return result.matched_count == 1
+
+    async def set_password(self, email, password_hash, expected_hash=None):
+        query = {"email": email}
+        if expected_hash is not None:
+            query["password"] = expected_hash
+        result = await self.users.update_one(query, {"$set": {"password": password_hash}})
+        return result.matched_count == 1
+
+    async def count(self):
+        return await self.users.count_documents({})
+
+    async def issue_code(self, email, purpose):
+        code = str(random.randint(100000, 999999))
+        await self.otps.update_one(
+            {"email": email, "purpose": purpose},
+            {"$set": {"code": code, "expires_at": datetime.utcnow() + timedelta(minutes=OTP_TTL_MINUTES)}},
+            upsert=True
+        )
+        return code
+
+    async def check_code(self, email, purpose, code):
+        doc = await self.otps.find_one({"email": email, "purpose": purpose, "code": code}, {"expires_at": 1})
+        if doc is None:
+            return "invalid"
+        return "ok" if doc["expires_at"] > datetime.utcnow() else "expired"
+
+    async def consume_code(self, email, purpose, code):
+        now = datetime.utcnow()
+        consumed = await self.otps.find_one_and_delete(
+            {"email": email, "purpose": purpose, "code": code, "expires_at": {"$gt": now}},
+            projection={"_id": 1},
+        )
+        if consumed:
+            return "ok"
+        stale = await self.otps.find_one({"email": email, "purpose": purpose, "code": code}, {"_id": 1})
+        return "expired" if stale else "invalid"
+
+    async def verify_with_code(self, email, code):
+        status = await self.consume_code(email, "verify", code)
+        if status == "ok" and not await self.mark_verified(email):
+            return "missing"
+        return status
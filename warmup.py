@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+
+# === Warm-up Configuration ===
+# WARMUP_MODE: "background" (default) runs the steps in a thread after start(); "blocking" runs
+# them inside start(), i.e. the old import-time behaviour, for scripts that need a settled app.
+WARMUP_MODE = os.getenv("WARMUP_MODE", "background").strip().lower()
+# Failed steps are retried after WARMUP_RETRY_DELAY seconds, doubling up to WARMUP_RETRY_MAX_DELAY.
+# Required steps retry until they succeed; optional ones give up after WARMUP_RETRY_ATTEMPTS runs.
+WARMUP_RETRY_DELAY = float(os.getenv("WARMUP_RETRY_DELAY", "1"))
+WARMUP_RETRY_MAX_DELAY = float(os.getenv("WARMUP_RETRY_MAX_DELAY", "60"))
+WARMUP_RETRY_ATTEMPTS = int(os.getenv("WARMUP_RETRY_ATTEMPTS", "5"))
+
+
+class WarmUp:
+    """
+    Runs slow start-up steps (heavy imports, client construction, Mongo bootstrap) one after
+    another in a background thread, so a fresh worker answers requests while they load.
+    Steps must be idempotent: they run again in each forked worker process.
+    A failing step is recorded and the rest still run, then it is retried with capped exponential
+    backoff, so a dependency that was down at boot (e.g. Mongo) does not leave the worker unready
+    for good. Readiness only waits on `required` steps.
+    """
+
+    def __init__(self, retry_delay=WARMUP_RETRY_DELAY, retry_max_delay=WARMUP_RETRY_MAX_DELAY,
+                 retry_attempts=WARMUP_RETRY_ATTEMPTS):
+        self.retry_delay = retry_delay
+        self.retry_max_delay = retry_max_delay
+        self.retry_attempts = retry_attempts
+        self.steps = []
+        self._status = {}
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+
+    def add(self, name, fn, required=False):
+        self.steps.append((name, fn, required))
+        self._status[name] = {"state": "pending", "required": required}
+        return self
+
+    def start(self):
+        """Start the warm-up thread once per process (restarted after a fork)."""
+        if self._thread_pid == os.getpid():
+            return self
+        with self._start_lock:
+            if self._thread_pid == os.getpid():
+                return self
+            with self._lock:
+                for name, _, required in self.steps:
+                    self._status[name] = {"state": "pending", "required": required}
+            self._thread_pid = os.getpid()
+            if WARMUP_MODE == "blocking":
+                # The first pass runs inline; only retries of failed steps go to the thread
+                self._run_steps(self.steps)
+                target = self._retry_failed
+            else:
+                target = self._run
+            self._thread = threading.Thread(target=target, name="warmup", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        self._run_steps(self.steps)
+        self._retry_failed()
+
+    def _run_steps(self, steps):
+        started = time.perf_counter()
+        for name, fn, required in steps:
+            attempts = self._status[name].get("attempts", 0) + 1
+            self._set(name, state="running", attempts=attempts)
+            step_started = time.perf_counter()
+            try:
+                fn()
+            except Exception as e:
+                print(f"⚠️ Warm-up step {name} failed (attempt {attempts}): {e}")
+                self._set(name, state="failed", error=str(e))
+            else:
+                self._set(name, state="done", error=None)
+            self._set(name, seconds=round(time.perf_counter() - step_started, 3))
+        print(f"🔥 Warm-up pass finished in {time.perf_counter() - started:.2f}s")
+
+    def _retry_failed(self):
+        """Re-run failed steps with capped exponential backoff until nothing is left to retry."""
+        delay = self.retry_delay
+        while True:
+            with self._lock:
+                pending = [step for step in self.steps
+                           if self._status[step[0]]["state"] == "failed"
+                           and (step[2] or self._status[step[0]]["attempts"] < self.retry_attempts)]
+                for name, _, _ in pending:
+                    self._status[name]["state"] = "retrying"
+            if not pending:
+                return
+            time.sleep(delay)
+            self._run_steps(pending)
+            delay = min(delay * 2, self.retry_max_delay)
+
+    def _set(self, name, **fields):
+        with self._lock:
+            self._status[name] = {**self._status[name], **fields}
+
+    def status(self):
+        """Readiness snapshot: ready once every required step is done."""
+        with self._lock:
+            steps = {name: dict(info) for name, info in self._status.items()}
+        ready = all(info["state"] == "done" for info in steps.values() if info["required"])
+        finished = all(info["state"] in ("done", "failed") for info in steps.values())
+        return {"ready": ready, "warmup": "finished" if finished else "running", "steps": steps}
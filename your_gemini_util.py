@@ -1,18 +1,204 @@
+import asyncio
 import os
+import re
 import json
+import threading
 from pathlib import Path
 from dotenv import load_dotenv
-import google.generativeai as genai
+
+from metrics import upstream_timer
+from single_flight import AsyncSingleFlight, SingleFlight
 
 # Load environment variables
 env_path = Path(__file__).parent / ".env"
 load_dotenv(dotenv_path=env_path)
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY not set in .env file")
+# === Gemini Configuration ===
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-pro")
+GEMINI_TEMPERATURE = float(os.getenv("GEMINI_TEMPERATURE", "0.4"))
+GEMINI_MAX_OUTPUT_TOKENS = int(os.getenv("GEMINI_MAX_OUTPUT_TOKENS", "2048"))
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "60"))
+
+
+class GeminiClient:
+    """
+    Per-worker Gemini client. The API key is read and the GenerativeModel is built once,
+    on first use, instead of at import time and on every request. Safe to share across threads.
+    """
+
+    def __init__(self, model_name=GEMINI_MODEL, temperature=GEMINI_TEMPERATURE,
+                 max_output_tokens=GEMINI_MAX_OUTPUT_TOKENS, timeout=GEMINI_TIMEOUT):
+        self.model_name = model_name
+        self.temperature = temperature
+        self.max_output_tokens = max_output_tokens
+        self.timeout = timeout
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    # google.generativeai takes most of a second to import; defer it to first use
+                    import google.generativeai as genai
+
+                    api_key = os.getenv("GEMINI_API_KEY")
+                    if not api_key:
+                        raise ValueError("GEMINI_API_KEY not set in .env file")
+                    genai.configure(api_key=api_key)
+                    self._model = genai.GenerativeModel(
+                        self.model_name,
+                        generation_config=genai.GenerationConfig(
+                            response_mime_type="application/json",
+                            temperature=self.temperature,
+                            max_output_tokens=self.max_output_tokens,
+                        )
+                    )
+        return self._model
+
+    async def amodel(self):
+        """`model` for coroutines: the first use (import + configure) runs in a worker thread, not on the loop."""
+        if self._model is None:
+            return await asyncio.get_running_loop().run_in_executor(None, lambda: self.model)
+        return self._model
+
+    def generate(self, prompt: str, timeout=None):
+        """Run one generation with a per-call deadline (seconds)."""
+        with upstream_timer("gemini", "generate"):
+            return self.model.generate_content(
+                prompt, request_options={"timeout": timeout or self.timeout}
+            )
+
+    def generate_stream(self, prompt: str, timeout=None):
+        """Streamed generation; yields text fragments as Gemini produces them."""
+        # Timed until the last chunk arrives, i.e. the full generation
+        with upstream_timer("gemini", "generate_stream"):
+            response = self.model.generate_content(
+                prompt, stream=True, request_options={"timeout": timeout or self.timeout}
+            )
+            for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks without text parts (e.g. safety metadata) raise on .text
+                    continue
+                if text:
+                    yield text
+
+    async def agenerate(self, prompt: str, timeout=None):
+        """asyncio variant of generate() for the ASGI app."""
+        model = await self.amodel()
+        with upstream_timer("gemini", "generate"):
+            return await model.generate_content_async(
+                prompt, request_options={"timeout": timeout or self.timeout}
+            )
+
+    async def agenerate_stream(self, prompt: str, timeout=None):
+        """asyncio variant of generate_stream()."""
+        model = await self.amodel()
+        with upstream_timer("gemini", "generate_stream"):
+            response = await model.generate_content_async(
+                prompt, stream=True, request_options={"timeout": timeout or self.timeout}
+            )
+            async for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    continue
+                if text:
+                    yield text
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_gemini_client():
+    """Return the per-process GeminiClient."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = GeminiClient()
+    return _client
+
+
+# Shared by every request in this worker; identical in-flight prompts wait on one call
+gemini_flight = SingleFlight()
+gemini_async_flight = AsyncSingleFlight()
+
+
+def build_treatment_prompt(disease, age, blood_group, symptoms, duration):
+    """Construct the Gemini prompt for a treatment plan."""
+    return f"""
+You are an AI medical assistant.
+
+Patient Details:
+- Disease: {disease}
+- Age: {age}
+- Blood Group: {blood_group}
+- Symptoms: {', '.join(symptoms)}
+- Duration: {duration} days
+
+Instructions:
+1. Generate exactly 3 medications strictly based on the disease (ignore symptoms).
+2. Return a JSON ONLY with the format:
+{{
+  "medications": ["Medicine1", "Medicine2", "Medicine3"],
+  "lifestyle": ["point1", "point2", "point3"],
+  "followup": "short sentence about follow-up"
+}}
+3. Do NOT include any explanations or extra text.
+"""
+
+
+def extract_text(response) -> str:
+    """Pull the raw text out of a Gemini response and strip markdown fences."""
+    raw_text = ""
+    if response.candidates and response.candidates[0].content.parts:
+        raw_text = response.candidates[0].content.parts[0].text.strip()
+    elif hasattr(response, "text"):
+        raw_text = response.text.strip()
+
+    # Remove markdown fences if present
+    if raw_text.startswith("```json"):
+        raw_text = raw_text[7:].strip()
+    if raw_text.endswith("```"):
+        raw_text = raw_text[:-3].strip()
+    return raw_text
+
+
+def parse_treatment_json(raw_text: str) -> dict:
+    """
+    Parse Gemini's JSON into a treatment plan.
+    Ensures medications are dicts with names and lifestyle/followup keys exist.
+    """
+    try:
+        treatment_data = json.loads(raw_text)
+
+        # Ensure medications are dictionaries
+        if isinstance(treatment_data.get("medications"), list):
+            treatment_data["medications"] = [
+                med if isinstance(med, dict) and "name" in med else {"name": str(med)}
+                for med in treatment_data["medications"]
+            ]
+
+        # Ensure lifestyle and followup keys exist
+        treatment_data.setdefault("lifestyle", [])
+        treatment_data.setdefault("followup", "Consult a doctor for follow-up.")
+
+    except json.JSONDecodeError as e:
+        print("⚠️ Failed to parse Gemini output as JSON:", e)
+        print("Raw output:", raw_text)
+        treatment_data = {
+            "medications": [],
+            "lifestyle": [],
+            "followup": "Could not generate a structured plan. Please consult a doctor."
+        }
+
+    return treatment_data
 
-genai.configure(api_key=GEMINI_API_KEY)
 
 def fetch_gemini_response(prompt: str) -> dict:
     """
@@ -20,55 +206,23 @@ def fetch_gemini_response(prompt: str) -> dict:
     Ensures the response is valid JSON and medications are dicts with names.
     """
     try:
-        model = genai.GenerativeModel(
-            'gemini-2.5-pro',
-            generation_config=genai.GenerationConfig(
-                response_mime_type="application/json",
-                temperature=0.4,
-                max_output_tokens=2048,
-            )
-        )
-
-        response = model.generate_content(prompt)
-        raw_text = ""
-
-        # Extract text safely
-        if response.candidates and response.candidates[0].content.parts:
-            raw_text = response.candidates[0].content.parts[0].text.strip()
-        elif hasattr(response, "text"):
-            raw_text = response.text.strip()
-
-        # Remove markdown fences if present
-        if raw_text.startswith("```json"):
-            raw_text = raw_text[7:].strip()
-        if raw_text.endswith("```"):
-            raw_text = raw_text[:-3].strip()
-
-        # Attempt JSON parsing
-        try:
-            treatment_data = json.loads(raw_text)
-
-            # Ensure medications are dictionaries
-            if isinstance(treatment_data.get("medications"), list):
-                treatment_data["medications"] = [
-                    med if isinstance(med, dict) and "name" in med else {"name": str(med)}
-                    for med in treatment_data["medications"]
-                ]
-
-            # Ensure lifestyle and followup keys exist
-            treatment_data.setdefault("lifestyle", [])
-            treatment_data.setdefault("followup", "Consult a doctor for follow-up.")
-
-        except json.JSONDecodeError as e:
-            print("⚠️ Failed to parse Gemini output as JSON:", e)
-            print("Raw output:", raw_text)
-            treatment_data = {
-                "medications": [],
-                "lifestyle": [],
-                "followup": "Could not generate a structured plan. Please consult a doctor."
-            }
+        response = get_gemini_client().generate(prompt)
+        return parse_treatment_json(extract_text(response))
+
+    except Exception as e:
+        print(f"❌ Gemini API error: {e}")
+        return {
+            "medications": [],
+            "lifestyle": [],
+            "followup": "Error communicating with the AI. Please consult a doctor."
+        }
 
-        return treatment_data
+
+async def afetch_gemini_response(prompt: str) -> dict:
+    """asyncio variant of fetch_gemini_response()."""
+    try:
+        response = await get_gemini_client().agenerate(prompt)
+        return parse_treatment_json(extract_text(response))
 
     except Exception as e:
         print(f"❌ Gemini API error: {e}")
@@ -77,3 +231,113 @@ def fetch_gemini_response(prompt: str) -> dict:
             "lifestyle": [],
             "followup": "Error communicating with the AI. Please consult a doctor."
         }
+
+
+def fetch_gemini_response_coalesced(key: str, prompt: str, on_result=None) -> dict:
+    """
+    Single-flight wrapper around fetch_gemini_response.
+    Concurrent callers with the same normalized `key` share one upstream call;
+    `on_result` runs once, in the leading caller, with the parsed plan (e.g. to cache it).
+    """
+    def call():
+        treatment_data = fetch_gemini_response(prompt)
+        if on_result:
+            on_result(treatment_data)
+        return treatment_data
+
+    return gemini_flight.do(key, call)
+
+
+async def afetch_gemini_response_coalesced(key: str, prompt: str, on_result=None) -> dict:
+    """asyncio single-flight wrapper; `on_result` may be sync or a coroutine function."""
+    async def call():
+        treatment_data = await afetch_gemini_response(prompt)
+        if on_result:
+            result = on_result(treatment_data)
+            if hasattr(result, "__await__"):
+                await result
+        return treatment_data
+
+    return await gemini_async_flight.do(key, call)
+
+
+class JSONArrayStreamParser:
+    """
+    Incrementally extracts the elements of one top-level JSON array field
+    (e.g. "medications") from text that arrives in fragments.
+    `feed` returns the elements completed by the new fragment.
+    """
+
+    def __init__(self, field: str):
+        self._field_re = re.compile(r'"%s"\s*:\s*\[' % re.escape(field))
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = None
+        self.done = False
+
+    def feed(self, text: str) -> list:
+        self._buf += text
+        items = []
+        if self._pos is None:
+            match = self._field_re.search(self._buf)
+            if not match:
+                return items
+            self._pos = match.end()
+
+        buf = self._buf
+        while not self.done:
+            i = self._pos
+            while i < len(buf) and buf[i] in " \t\r\n,":
+                i += 1
+            self._pos = i
+            if i >= len(buf):
+                break
+            if buf[i] == "]":
+                self.done = True
+                self._pos = i + 1
+                break
+            try:
+                item, end = self._decoder.raw_decode(buf, i)
+            except ValueError:
+                break  # element not complete yet
+            items.append(item)
+            self._pos = end
+        return items
+
+    @property
+    def text(self) -> str:
+        return self._buf
+
+
+def stream_treatment_plan(prompt: str):
+    """
+    Streams a treatment plan from Gemini.
+    Yields ("medication", {"name": ...}) as soon as each medication is parsed,
+    then ("plan", treatment_data) with the full normalized plan once generation ends.
+    """
+    parser = JSONArrayStreamParser("medications")
+    for fragment in get_gemini_client().generate_stream(prompt):
+        for med in parser.feed(fragment):
+            yield "medication", med if isinstance(med, dict) and "name" in med else {"name": str(med)}
+
+    raw_text = parser.text.strip()
+    if raw_text.startswith("```json"):
+        raw_text = raw_text[7:].strip()
+    if raw_text.endswith("```"):
+        raw_text = raw_text[:-3].strip()
+    yield "plan", parse_treatment_json(raw_text)
+
+
+async def astream_treatment_plan(prompt: str):
+    """asyncio variant of stream_treatment_plan()."""
+    parser = JSONArrayStreamParser("medications")
+    async for fragment in get_gemini_client().agenerate_stream(prompt):
+        for med in parser.feed(fragment):
+            yield "medication", med if isinstance(med, dict) and "name" in med else {"name": str(med)}
+
+    raw_text = parser.text.strip()
+    if raw_text.startswith("```json"):
+        raw_text = raw_text[7:].strip()
+    if raw_text.endswith("```"):
+        raw_text = raw_text[:-3].strip()
+    yield "plan", parse_treatment_json(raw_text)